@@ -3,399 +3,3627 @@ import os
 import uuid
 import subprocess
 import platform
-import requests
-from bs4 import BeautifulSoup
-from urllib.parse import urljoin, quote
-from PyQt5.QtWidgets import QApplication, QMainWindow, QTextEdit, QLineEdit, QVBoxLayout, QWidget, QInputDialog, \
-    QMessageBox, QFileDialog
-from PyQt5.QtGui import QFont, QColor, QTextCursor, QPalette
-from PyQt5.QtCore import Qt
+import threading
+import itertools
+import hashlib
+import json
+import io
+import sqlite3
+import select
+import struct
+import errno
+import time
+import fnmatch
+import re
+import bisect
+import heapq
+import math
+import queue
+import shlex
+import argparse
+import functools
+from collections import defaultdict, Counter, deque
+from datetime import datetime
+from email.utils import parsedate_to_datetime
+import ctypes
+import ctypes.util
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait, FIRST_COMPLETED
+from urllib.parse import urljoin, quote, urlparse
+import mimetypes
+import csv
+import cProfile
+import pstats
+import importlib.util
+from contextlib import contextmanager
+from PyQt5.QtWidgets import QApplication, QMainWindow, QListView, QLineEdit, QVBoxLayout, QWidget, QInputDialog, \
+    QMessageBox, QFileDialog, QAbstractItemView, QShortcut
+from PyQt5.QtGui import QFont, QColor, QPalette, QKeySequence
+from PyQt5.QtCore import Qt, QEvent, QObject, QRunnable, QThreadPool, QTimer, pyqtSignal, QAbstractListModel, QModelIndex
 import shutil
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
 
 
-class TerminalFileApp(QMainWindow):
-    def __init__(self):
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+}
+HTTP_TIMEOUT = (5, 10)  # (connect, read) seconds
+HTTP_RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+def create_http_session(pool_size=16, retries=3, backoff=0.5):
+    # One keep-alive session shared by every network command; pool_size is the per-host connection limit.
+    # requests is imported here so sessions that never touch the network don't pay for it at startup.
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+
+    session = requests.Session()
+    session.headers.update(HEADERS)
+    retry = Retry(total=retries, connect=retries, read=retries, backoff_factor=backoff,
+                  status_forcelist=HTTP_RETRY_STATUSES, allowed_methods=("GET", "HEAD"),
+                  respect_retry_after_header=True, raise_on_status=False)
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+class CachedResponse:
+    # What HttpCache hands out: the cached body from disk, or the live response streamed through
+    # (and written to the cache on the way when it is cacheable)
+    def __init__(self, cache, url, status_code, content_type="", path=None, live=None, entry=None):
+        self.cache = cache
+        self.url = url
+        self.status_code = status_code
+        self.content_type = content_type
+        self.headers = {"Content-Type": content_type} if content_type else {}
+        self.path = path
+        self.live = live
+        self.entry = entry  # (etag, last_modified, expires) to record once the body is complete
+        self.body = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self.live is not None:
+            self.live.close()
+
+    def iter_content(self, chunk_size=8192):
+        if self.live is None:
+            with open(self.path, "rb") as f:
+                while True:
+                    chunk = f.read(chunk_size)
+                    if not chunk:
+                        break
+                    self.cache.count("bytes_from_cache", len(chunk))
+                    yield chunk
+            return
+        tmp = None
+        size = 0
+        try:
+            if self.entry is not None:
+                tmp = open(os.path.join(self.cache.cache_dir, f".tmp-{uuid.uuid4().hex}"), "wb")
+            for chunk in self.live.iter_content(chunk_size=chunk_size):
+                size += len(chunk)
+                self.cache.count("bytes_downloaded", len(chunk))
+                if tmp is not None:
+                    tmp.write(chunk)
+                yield chunk
+            if tmp is not None:
+                tmp.close()
+                self.cache.store(self.url, tmp.name, size, self.content_type, *self.entry)
+                tmp = None
+        finally:
+            # A consumer that stops early (cancel, error) leaves nothing half-written in the cache
+            if tmp is not None:
+                tmp.close()
+                os.remove(tmp.name)
+
+    @property
+    def content(self):
+        if self.body is None:
+            self.body = b"".join(self.iter_content(64 * 1024))
+        return self.body
+
+    @property
+    def text(self):
+        charset = re.search(r"charset=([\w-]+)", self.content_type or "")
+        try:
+            return self.content.decode(charset.group(1) if charset else "utf-8", errors="replace")
+        except LookupError:
+            return self.content.decode("utf-8", errors="replace")
+
+
+class HttpCache:
+    # On-disk HTTP cache for boot/ fetches, keyed by URL. Fresh entries (Cache-Control max-age,
+    # Expires) are served without a request; stale ones are revalidated with If-None-Match /
+    # If-Modified-Since, so an unchanged page or image costs one 304. Evicts least recently used
+    # entries once the bodies pass max_bytes.
+    MAX_HEURISTIC_AGE = 24 * 3600  # Cap on the freshness guessed from Last-Modified
+
+    def __init__(self, cache_dir, max_bytes=256 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+        self.lock = threading.RLock()
+        self.conn = sqlite3.connect(os.path.join(cache_dir, "index.sqlite3"), check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("""CREATE TABLE IF NOT EXISTS entries (
+            url TEXT PRIMARY KEY,
+            size INTEGER NOT NULL,
+            content_type TEXT,
+            etag TEXT,
+            last_modified TEXT,
+            expires REAL NOT NULL,
+            last_used REAL NOT NULL)""")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used)")
+        self.conn.commit()
+        self.total = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        # Counters for this session, shown by cache stats
+        self.stats = dict.fromkeys(("hits", "revalidated", "misses", "uncached", "bytes_downloaded",
+                                    "bytes_from_cache"), 0)
+
+    def count(self, key, amount=1):
+        with self.lock:
+            self.stats[key] += amount
+
+    def body_path(self, url):
+        key = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, key[:2], key)
+
+    def freshness(self, headers, now):
+        # Returns (storable, expires) from Cache-Control, Expires and Last-Modified
+        directives = {}
+        for part in headers.get("Cache-Control", "").lower().split(","):
+            key, _, value = part.strip().partition("=")
+            directives[key] = value.strip('"')
+        if "no-store" in directives:
+            return False, 0
+        if "no-cache" in directives:
+            return True, 0
+        try:
+            if "max-age" in directives:
+                return True, now + max(0, int(directives["max-age"]) - int(headers.get("Age", 0)))
+            if headers.get("Expires"):
+                return True, parsedate_to_datetime(headers["Expires"]).timestamp()
+            if headers.get("Last-Modified"):
+                # Heuristic freshness: a tenth of the time since the last change
+                age = now - parsedate_to_datetime(headers["Last-Modified"]).timestamp()
+                return True, now + min(max(0, age) / 10, self.MAX_HEURISTIC_AGE)
+        except (ValueError, TypeError):
+            pass
+        return True, 0
+
+    def get(self, session, url, timeout=HTTP_TIMEOUT):
+        now = time.time()
+        path = self.body_path(url)
+        with self.lock:
+            row = self.conn.execute("SELECT content_type, etag, last_modified, expires FROM entries WHERE url = ?",
+                                    (url,)).fetchone()
+            if row and not os.path.exists(path):
+                row = None
+            if row and row[3] > now:
+                self.conn.execute("UPDATE entries SET last_used = ? WHERE url = ?", (now, url))
+                self.conn.commit()
+                self.stats["hits"] += 1
+                return CachedResponse(self, url, 200, row[0], path=path)
+        headers = {}
+        if row and row[1]:
+            headers["If-None-Match"] = row[1]
+        if row and row[2]:
+            headers["If-Modified-Since"] = row[2]
+        response = session.get(url, headers=headers, stream=True, timeout=timeout)
+        storable, expires = self.freshness(response.headers, now)
+        if response.status_code == 304 and row:
+            response.close()
+            with self.lock, self.conn:
+                self.conn.execute("UPDATE entries SET etag = ?, last_modified = ?, expires = ?, last_used = ? "
+                                  "WHERE url = ?", (response.headers.get("ETag", row[1]),
+                                                    response.headers.get("Last-Modified", row[2]), expires, now, url))
+                self.stats["revalidated"] += 1
+            return CachedResponse(self, url, 200, row[0], path=path)
+        content_type = response.headers.get("Content-Type", "")
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+        if response.status_code == 200 and storable and (etag or last_modified or expires > now):
+            self.count("misses")
+            return CachedResponse(self, url, 200, content_type, live=response, entry=(etag, last_modified, expires))
+        self.count("uncached")
+        return CachedResponse(self, url, response.status_code, content_type, live=response)
+
+    def store(self, url, tmp_path, size, content_type, etag, last_modified, expires):
+        path = self.body_path(url)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self.lock, self.conn:
+            os.replace(tmp_path, path)
+            old = self.conn.execute("SELECT size FROM entries WHERE url = ?", (url,)).fetchone()
+            self.conn.execute("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?)",
+                              (url, size, content_type, etag, last_modified, expires, time.time()))
+            self.total += size - (old[0] if old else 0)
+            self.evict()
+
+    def evict(self):
+        # Oldest-used first until the bodies fit in max_bytes
+        if self.total <= self.max_bytes:
+            return
+        removed = []
+        for url, size in self.conn.execute("SELECT url, size FROM entries ORDER BY last_used"):
+            if self.total <= self.max_bytes:
+                break
+            removed.append((url,))
+            self.total -= size
+            try:
+                os.remove(self.body_path(url))
+            except OSError:
+                pass
+        self.conn.executemany("DELETE FROM entries WHERE url = ?", removed)
+
+    def summary(self):
+        with self.lock:
+            entries = self.conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+            return entries, self.total, dict(self.stats)
+
+    def clear(self):
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM entries")
+            self.total = 0
+            for entry in os.scandir(self.cache_dir):
+                if entry.is_dir(follow_symlinks=False):
+                    shutil.rmtree(entry.path, ignore_errors=True)
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+COPY_CHUNK_SIZE = 64 * 1024 * 1024  # Bytes per copy_file_range/sendfile call, so progress and cancel stay responsive
+COPY_BUFFER_SIZE = 8 * 1024 * 1024  # Buffer for the plain read/write fallback
+FICLONE = 0x40049409  # Linux ioctl that clones one file's extents into another
+ZERO_COPY_UNSUPPORTED = {errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.ENOTSUP, errno.ENOTSOCK}
+
+
+def is_pattern(name):
+    # Glob selectors such as *.png or image_?? select several files at once
+    return any(char in name for char in "*?[")
+
+
+def format_size(num_bytes):
+    if num_bytes < 1024:
+        return f"{int(num_bytes)} B"
+    for unit in ("KB", "MB", "GB", "TB"):
+        num_bytes /= 1024
+        if num_bytes < 1024 or unit == "TB":
+            return f"{num_bytes:.2f} {unit}"
+
+
+def stream_copy(src, dst, progress=None, cancel_event=None):
+    # Copy src to dst chunk by chunk, in the kernel with copy_file_range or sendfile where the platform and
+    # filesystem allow it, otherwise through a large buffer. progress(bytes_copied) is called after every
+    # chunk. Returns False if canceled part-way; raises OSError if fewer bytes than the source's size arrived.
+    zero_copy = [name for name in ("copy_file_range", "sendfile") if hasattr(os, name)]
+    buffer = None
+    copied = 0
+    # Unbuffered file objects, so the zero-copy calls and the fallback share the same file offsets
+    with open(src, "rb", buffering=0) as fin, open(dst, "wb", buffering=0) as fout:
+        in_fd, out_fd = fin.fileno(), fout.fileno()
+        size = os.fstat(in_fd).st_size
+        while True:
+            if cancel_event is not None and cancel_event.is_set():
+                return False
+            count = None
+            while zero_copy and count is None:
+                try:
+                    if zero_copy[0] == "copy_file_range":
+                        count = os.copy_file_range(in_fd, out_fd, COPY_CHUNK_SIZE)
+                    else:
+                        count = os.sendfile(out_fd, in_fd, None, COPY_CHUNK_SIZE)
+                except OSError as e:
+                    if e.errno not in ZERO_COPY_UNSUPPORTED:
+                        raise
+                    zero_copy.pop(0)
+                else:
+                    # Some filesystems (FUSE, network mounts, older kernels across devices) report an
+                    # unsupported call as 0 bytes copied rather than an error, so 0 short of the size
+                    # isn't trusted as EOF
+                    if count == 0 and copied < size:
+                        zero_copy.pop(0)
+                        count = None
+            if count is None:
+                if buffer is None:
+                    buffer = bytearray(COPY_BUFFER_SIZE)
+                    view = memoryview(buffer)
+                count = fin.readinto(buffer)
+                fout.write(view[:count])
+            if not count:
+                if copied != os.fstat(in_fd).st_size:
+                    raise OSError(errno.EIO, f"Copied {copied} of {os.fstat(in_fd).st_size} bytes", src)
+                return True
+            copied += count
+            if progress is not None:
+                progress(copied)
+
+
+class CommandRecord:
+    # Timing and counters for one command, including any background job it started. Phases are
+    # exclusive: time in a nested phase (output inside a listing, network inside a download) is not
+    # also counted in the enclosing one. Phase times from worker threads add up, so they can exceed
+    # the wall time of a parallel job.
+    COUNTERS = ("bytes_in", "bytes_out", "files", "lines")
+
+    def __init__(self, command, name="", instrumentation=None):
+        self.command = command
+        self.name = name  # Command stem, e.g. "boot/" or "filer chart"; "unknown" when nothing matched
+        self.instrumentation = instrumentation
+        self.started = time.time()
+        self.clock = time.perf_counter()
+        self.seconds = 0.0
+        self.job_seconds = None  # Seconds from the command's start until its background job finished
+        self.counters = Counter()
+        self.phases = Counter()
+        self.lock = threading.Lock()
+        self.local = threading.local()  # Per-thread stack of nested phase times
+
+    def add(self, counter, amount=1):
+        with self.lock:
+            self.counters[counter] += amount
+
+    @contextmanager
+    def phase(self, name):
+        stack = self.local.__dict__.setdefault("stack", [])
+        stack.append(0.0)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            nested = stack.pop()
+            if stack:
+                stack[-1] += elapsed
+            with self.lock:
+                self.phases[name] += elapsed - nested
+
+    def metered(self, chunks, phase="network"):
+        # Passes chunks through, timing the wait for each one and counting its bytes
+        chunks = iter(chunks)
+        while True:
+            with self.phase(phase):
+                chunk = next(chunks, None)
+            if chunk is None:
+                return
+            self.add("bytes_in", len(chunk))
+            yield chunk
+
+    @contextmanager
+    def profiled(self):
+        profile = self.instrumentation.start_profile() if self.instrumentation is not None else None
+        try:
+            yield
+        finally:
+            if profile is not None:
+                self.instrumentation.finish_profile(profile)
+
+    def as_dict(self):
+        with self.lock:
+            return {"started": datetime.fromtimestamp(self.started).isoformat(timespec="seconds"),
+                    "name": self.name, "command": self.command, "seconds": round(self.seconds, 6),
+                    "job_seconds": None if self.job_seconds is None else round(self.job_seconds, 6),
+                    **{counter: self.counters[counter] for counter in self.COUNTERS},
+                    "phases": {name: round(seconds, 6) for name, seconds in self.phases.most_common()}}
+
+
+class UntrackedRecord(CommandRecord):
+    # Stands in for work done outside any command (startup, watcher events, jobs with no command
+    # behind them). It records nothing, so it can't grow for the life of the process.
+    def add(self, counter, amount=1):
+        pass
+
+    @contextmanager
+    def phase(self, name):
+        yield
+
+
+UNTRACKED = UntrackedRecord("")
+
+
+class Instrumentation:
+    # Keeps a CommandRecord per executed command for the stats command and its exports. The record
+    # of the command running on the current thread is what handlers and print_to_output report to.
+    # With profiling on, each command and each job runs under its own cProfile.Profile; the results
+    # are merged when profiling is switched off.
+    def __init__(self, keep=1000):
+        self.records = deque(maxlen=keep)
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.profiling = False
+        self.profiles = []
+
+    def current(self):
+        return getattr(self.local, "record", None) or UNTRACKED
+
+    @contextmanager
+    def command(self, text, name):
+        record = CommandRecord(text, name, self)
+        self.local.record = record
+        try:
+            yield record
+        finally:
+            record.seconds = time.perf_counter() - record.clock
+            self.local.record = None
+            with self.lock:
+                self.records.append(record)
+
+    def start_profile(self):
+        if not self.profiling:
+            return None
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            return None  # Another profiler is already active on this thread
+        return profile
+
+    def finish_profile(self, profile):
+        profile.disable()
+        with self.lock:
+            self.profiles.append(profile)
+
+    def start_profiling(self):
+        # Drops what finished after the last stop (jobs that outlived it, the stopping command itself)
+        with self.lock:
+            self.profiling = True
+            self.profiles = []
+
+    def stop_profiling(self):
+        # Returns the merged pstats.Stats, or None if nothing ran while profiling was on
+        with self.lock:
+            self.profiling = False
+            profiles, self.profiles = self.profiles, []
+        if not profiles:
+            return None
+        stats = pstats.Stats(profiles[0])
+        for profile in profiles[1:]:
+            stats.add(profile)
+        return stats
+
+    def snapshot(self):
+        with self.lock:
+            return [record.as_dict() for record in self.records]
+
+    def clear(self):
+        with self.lock:
+            self.records.clear()
+
+    def export(self, path):
+        # JSON (a list of records) or, for a .csv path, one row per command with a column per phase
+        rows = self.snapshot()
+        if path.lower().endswith(".csv"):
+            phases = sorted({phase for row in rows for phase in row["phases"]})
+            fields = [field for field in rows[0] if field != "phases"] if rows else []
+            with open(path, "w", newline="", encoding="utf-8") as f:
+                writer = csv.writer(f)
+                writer.writerow(fields + [f"phase_{phase}" for phase in phases])
+                for row in rows:
+                    writer.writerow([row[field] for field in fields] + [row["phases"].get(phase, 0) for phase in phases])
+        else:
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(rows, f, indent=2)
+        return len(rows)
+
+
+class FolderLayout:
+    # Where folder entries live on disk. The folders are listed in folders.json and may be nested
+    # ("photos/2024" is the directory photos/2024). A folder holding more than shard_threshold files
+    # is spread over hash-prefix subdirectories (a/3f/<name>) so no single directory grows huge;
+    # commands and indexes only ever see (folder, name) and ask the layout for the path.
+    DEFAULT_FOLDERS = ['a', 'b', 'c', 'd']
+    NAME_PART = re.compile(r"[A-Za-z0-9_][\w.-]*")
+    SHARD = re.compile(r"[0-9a-f]{2}")
+    # Top-level names the storage directory already uses (history.log also rotates to history.log.N)
+    RESERVED = re.compile(r"plugins|folders\.json(\.tmp)?|history\.log(\.\d+)?")
+
+    def __init__(self, storage_dir, shard_threshold=5000):
+        self.storage_dir = storage_dir
+        self.config_path = os.path.join(storage_dir, "folders.json")
+        self.shard_threshold = shard_threshold
+        self.folders = []  # Shared with the engine and kept in place, so everyone sees additions
+        self.sharded = set()
+        self.made = set()  # Shard directories known to exist
+        self.lock = threading.RLock()  # Jobs finishing on several threads may save or spread at once
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.config_path, "r", encoding="utf-8") as f:
+                config = json.load(f)
+        except FileNotFoundError:
+            config = {}
+        self.folders[:] = config.get("folders", self.DEFAULT_FOLDERS)
+        self.sharded = set(config.get("sharded", ())) & set(self.folders)
+        self.shard_threshold = config.get("shard_threshold", self.shard_threshold)
+        for folder in self.folders:
+            os.makedirs(self.folder_path(folder), exist_ok=True)
+
+    def save(self):
+        with self.lock:
+            tmp_path = self.config_path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"folders": self.folders, "sharded": sorted(self.sharded),
+                           "shard_threshold": self.shard_threshold}, f, indent=2)
+            os.replace(tmp_path, self.config_path)
+
+    def check_name(self, folder):
+        # Returns an error message, or None if folder can be created
+        parts = folder.split("/")
+        if folder in self.folders:
+            return f"Folder '{folder}' already exists"
+        if not all(self.NAME_PART.fullmatch(part) and not self.SHARD.fullmatch(part) for part in parts):
+            return ("Folder names are letters, digits, '_', '-' and '.', separated by '/' "
+                    "(two hex digits like '3f' are kept for shards)")
+        if self.RESERVED.fullmatch(parts[0]):
+            return f"'{parts[0]}' is reserved"
+        for depth in range(1, len(parts) + 1):
+            path = self.folder_path("/".join(parts[:depth]))
+            if os.path.lexists(path) and not os.path.isdir(path):
+                return f"'{'/'.join(parts[:depth])}' already exists as a file"
+        return None
+
+    def add(self, folder):
+        # Adds folder and any missing parents; returns the folders created
+        parts = folder.split("/")
+        created = []
+        for depth in range(1, len(parts) + 1):
+            path = "/".join(parts[:depth])
+            if path not in self.folders:
+                os.makedirs(self.folder_path(path), exist_ok=True)
+                self.folders.append(path)
+                created.append(path)
+        self.folders.sort()
+        self.save()
+        return created
+
+    def children(self, folder):
+        return [other for other in self.folders if other.startswith(folder + "/")]
+
+    def remove(self, folder):
+        # Only empty folders without subfolders are removed
+        for directory in self.directories(folder)[1:]:
+            os.rmdir(directory)
+        os.rmdir(self.folder_path(folder))
+        with self.lock:
+            self.folders.remove(folder)
+            self.sharded.discard(folder)
+            self.made = {made for made in self.made if os.path.dirname(made) != self.folder_path(folder)}
+            self.save()
+
+    def folder_path(self, folder):
+        return os.path.join(self.storage_dir, *folder.split("/"))
+
+    @staticmethod
+    def shard(name):
+        return hashlib.md5(os.fsencode(name)).hexdigest()[:2]
+
+    def path(self, folder, name):
+        if folder in self.sharded:
+            return os.path.join(self.folder_path(folder), self.shard(name), name)
+        return os.path.join(self.folder_path(folder), name)
+
+    def target(self, folder, name):
+        # Path for a new entry, creating its shard directory if needed
+        path = self.path(folder, name)
+        if folder in self.sharded:
+            directory = os.path.dirname(path)
+            if directory not in self.made:
+                os.makedirs(directory, exist_ok=True)
+                with self.lock:
+                    self.made.add(directory)
+        return path
+
+    def directories(self, folder):
+        # The folder's own directory, then its shard subdirectories (child folders are left out)
+        root = self.folder_path(folder)
+        directories = [root]
+        with os.scandir(root) as entries:
+            for entry in entries:
+                if self.SHARD.fullmatch(entry.name) and entry.is_dir(follow_symlinks=False):
+                    directories.append(entry.path)
+        return directories
+
+    def scan(self, folder):
+        # os.DirEntry for every file of folder, wherever in the layout it sits
+        for directory in self.directories(folder):
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.is_file(follow_symlinks=False):
+                        yield entry
+
+    def needs_spread(self, folder, count):
+        if folder in self.sharded:
+            return any(True for _ in self.flat_files(folder))  # Strays dropped in by other programs
+        return count > self.shard_threshold or len(self.directories(folder)) > 1
+
+    def settle(self, folder, name):
+        # Move a file another program dropped into a sharded folder's own directory to its shard
+        if folder in self.sharded:
+            flat = os.path.join(self.folder_path(folder), name)
+            if os.path.isfile(flat) and not os.path.lexists(self.path(folder, name)):
+                os.rename(flat, self.target(folder, name))
+
+    def flat_files(self, folder):
+        with os.scandir(self.folder_path(folder)) as entries:
+            return [entry.name for entry in entries if entry.is_file(follow_symlinks=False)]
+
+    def spread(self, folder):
+        # Move the folder's top-level files into their shard directories. Safe to rerun after an
+        # interruption; the folder counts as sharded once every file has moved.
+        root = self.folder_path(folder)
+        moved = 0
+        with self.lock:
+            for name in self.flat_files(folder):
+                directory = os.path.join(root, self.shard(name))
+                if directory not in self.made:
+                    os.makedirs(directory, exist_ok=True)
+                    self.made.add(directory)
+                try:
+                    os.rename(os.path.join(root, name), os.path.join(directory, name))
+                    moved += 1
+                except FileNotFoundError:
+                    pass
+            if folder not in self.sharded:
+                self.sharded.add(folder)
+                self.save()
+        return moved
+
+
+class MetadataIndex:
+    # SQLite index of every folder entry (name, size, mtime, content hash, original name), so list,
+    # search and filer chart answer without touching the disk. Kept current by each command and
+    # reconciled against the folders with os.scandir on startup.
+    def __init__(self, storage_dir, layout):
+        self.storage_dir = storage_dir
+        self.layout = layout
+        self.path = layout.path
+        self.db_path = os.path.join(storage_dir, ".index.sqlite3")
+        self.lock = threading.RLock()
+        self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("""CREATE TABLE IF NOT EXISTS files (
+            folder TEXT NOT NULL,
+            name TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            mtime REAL NOT NULL,
+            hash TEXT,
+            original TEXT,
+            PRIMARY KEY (folder, name))""")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS files_hash ON files (hash)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS files_name ON files (name)")
+        self.conn.execute("""CREATE TABLE IF NOT EXISTS snapshots (
+            taken REAL NOT NULL,
+            folder TEXT NOT NULL,
+            count INTEGER NOT NULL,
+            size INTEGER NOT NULL)""")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS snapshots_taken ON snapshots (taken)")
+        self.conn.commit()
+        # Per-folder [count, bytes], adjusted on every change instead of summed on every query
+        self.totals = {}
+        self.load_totals()
+        # Callbacks told about every change: ("put", folder, name, size, mtime, original),
+        # ("remove", folder, name), ("rename", old_folder, old_name, new_folder, new_name) and ("reload",)
+        self.listeners = []
+
+    def notify(self, *event):
+        for listener in self.listeners:
+            listener(event)
+
+    def load_totals(self):
+        with self.lock:
+            self.totals = {folder: [count, size] for folder, count, size in self.conn.execute(
+                "SELECT folder, COUNT(*), SUM(size) FROM files GROUP BY folder")}
+
+    def adjust_totals(self, folder, count, size):
+        totals = self.totals.setdefault(folder, [0, 0])
+        totals[0] += count
+        totals[1] += size
+
+    def add(self, folder, name, digest=None, original=None):
+        st = os.stat(self.path(folder, name))
+        with self.lock, self.conn:
+            row = self.conn.execute("SELECT size FROM files WHERE folder = ? AND name = ?", (folder, name)).fetchone()
+            if row is None:
+                self.adjust_totals(folder, 1, st.st_size)
+            else:
+                self.adjust_totals(folder, 0, st.st_size - row[0])
+            self.conn.execute("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?)",
+                              (folder, name, st.st_size, st.st_mtime, digest, original))
+            self.notify("put", folder, name, st.st_size, st.st_mtime, original)
+
+    def touch(self, folder, name):
+        # Record a change seen on disk: keeps hash and original name unless the content changed
+        try:
+            st = os.stat(self.path(folder, name))
+        except FileNotFoundError:
+            return self.remove([(folder, name)])
+        with self.lock, self.conn:
+            row = self.conn.execute("SELECT size, mtime, original FROM files WHERE folder = ? AND name = ?",
+                                    (folder, name)).fetchone()
+            if row is None:
+                self.adjust_totals(folder, 1, st.st_size)
+                self.conn.execute("INSERT INTO files (folder, name, size, mtime) VALUES (?, ?, ?, ?)",
+                                  (folder, name, st.st_size, st.st_mtime))
+                self.notify("put", folder, name, st.st_size, st.st_mtime, None)
+            elif row[:2] != (st.st_size, st.st_mtime):
+                self.adjust_totals(folder, 0, st.st_size - row[0])
+                self.conn.execute("UPDATE files SET size = ?, mtime = ?, hash = NULL WHERE folder = ? AND name = ?",
+                                  (st.st_size, st.st_mtime, folder, name))
+                self.notify("put", folder, name, st.st_size, st.st_mtime, row[2])
+        return set()
+
+    def remove(self, entries):
+        # Returns the content hashes of the removed entries
+        digests = set()
+        with self.lock, self.conn:
+            for folder, name in entries:
+                row = self.conn.execute("SELECT hash, size FROM files WHERE folder = ? AND name = ?",
+                                        (folder, name)).fetchone()
+                if row is None:
+                    continue
+                if row[0]:
+                    digests.add(row[0])
+                self.adjust_totals(folder, -1, -row[1])
+                self.conn.execute("DELETE FROM files WHERE folder = ? AND name = ?", (folder, name))
+                self.notify("remove", folder, name)
+        return digests
+
+    def move(self, name, old_folder, new_folder):
+        self.rename(old_folder, name, new_folder, name)
+
+    def rename(self, old_folder, old_name, new_folder, new_name):
+        # Returns the content hashes of the entry the rename replaced (for BlobStore.collect), or None
+        # when there was nothing to rename
+        with self.lock, self.conn:
+            row = self.conn.execute("SELECT size FROM files WHERE folder = ? AND name = ?",
+                                    (old_folder, old_name)).fetchone()
+            if row is None:
+                return None
+            replaced = self.remove([(new_folder, new_name)])
+            self.adjust_totals(old_folder, -1, -row[0])
+            self.adjust_totals(new_folder, 1, row[0])
+            self.conn.execute("UPDATE files SET folder = ?, name = ? WHERE folder = ? AND name = ?",
+                              (new_folder, new_name, old_folder, old_name))
+            self.notify("rename", old_folder, old_name, new_folder, new_name)
+        return replaced
+
+    def rename_many(self, moves):
+        # moves: iterable of (old_folder, old_name, new_folder, new_name), applied in one transaction
+        with self.lock, self.conn:
+            for old_folder, old_name, new_folder, new_name in moves:
+                row = self.conn.execute("SELECT size FROM files WHERE folder = ? AND name = ?",
+                                        (old_folder, old_name)).fetchone()
+                if row is None:
+                    continue
+                self.adjust_totals(old_folder, -1, -row[0])
+                self.adjust_totals(new_folder, 1, row[0])
+                self.conn.execute("UPDATE files SET folder = ?, name = ? WHERE folder = ? AND name = ?",
+                                  (new_folder, new_name, old_folder, old_name))
+                self.notify("rename", old_folder, old_name, new_folder, new_name)
+
+    def find_by_hash(self, digest, folder):
+        with self.lock:
+            rows = self.conn.execute("SELECT name FROM files WHERE hash = ? AND folder = ? ORDER BY name",
+                                     (digest, folder)).fetchall()
+        for (name,) in rows:
+            if os.path.exists(self.path(folder, name)):
+                return name
+        return None
+
+    def has_hash(self, digest):
+        with self.lock:
+            return self.conn.execute("SELECT 1 FROM files WHERE hash = ? LIMIT 1", (digest,)).fetchone() is not None
+
+    def set_hashes(self, rows):
+        # rows: iterable of (digest, folder, name)
+        with self.lock, self.conn:
+            self.conn.executemany("UPDATE files SET hash = ? WHERE folder = ? AND name = ?", rows)
+
+    def files(self, folder=None):
+        with self.lock:
+            if folder is None:
+                return self.conn.execute("SELECT folder, name, size FROM files ORDER BY folder, name").fetchall()
+            return self.conn.execute("SELECT folder, name, size FROM files WHERE folder = ? ORDER BY name",
+                                     (folder,)).fetchall()
+
+    def all_files(self):
+        with self.lock:
+            return self.conn.execute("SELECT folder, name, size, mtime, original FROM files").fetchall()
+
+    def locate(self, name):
+        with self.lock:
+            return [row[0] for row in self.conn.execute(
+                "SELECT folder FROM files WHERE name = ? ORDER BY folder", (name,))]
+
+    def folder_sizes(self):
+        with self.lock:
+            return {folder: size for folder, (_, size) in self.totals.items()}
+
+    def snapshot(self, min_interval):
+        # Record per-folder totals for growth reports, at most once per min_interval seconds
+        now = time.time()
+        with self.lock, self.conn:
+            last = self.conn.execute("SELECT MAX(taken) FROM snapshots").fetchone()[0]
+            if last is not None and now - last < min_interval:
+                return False
+            self.conn.executemany("INSERT INTO snapshots VALUES (?, ?, ?, ?)",
+                                  [(now, folder, count, size) for folder, (count, size) in self.totals.items()])
+        return True
+
+    def snapshots(self, folders, limit):
+        # The latest limit snapshots, oldest first: [(taken, files, bytes)] summed over folders
+        marks = ", ".join("?" * len(folders))
+        with self.lock:
+            rows = self.conn.execute(f"""SELECT taken, SUM(count), SUM(size) FROM snapshots
+                                         WHERE folder IN ({marks}) GROUP BY taken
+                                         ORDER BY taken DESC LIMIT ?""", list(folders) + [limit]).fetchall()
+        return rows[::-1]
+
+    def reconcile(self, folders):
+        # Bring the index in line with what is actually on disk; returns (added, updated, removed hashes)
+        inserts, updates, deletes = [], [], []
+        with self.lock:
+            known = {}
+            for folder, name, size, mtime in self.conn.execute("SELECT folder, name, size, mtime FROM files"):
+                known[(folder, name)] = (size, mtime)
+            for folder in folders:
+                for entry in self.layout.scan(folder):
+                    st = entry.stat(follow_symlinks=False)
+                    previous = known.pop((folder, entry.name), None)
+                    if previous is None:
+                        inserts.append((folder, entry.name, st.st_size, st.st_mtime))
+                    elif previous != (st.st_size, st.st_mtime):
+                        # Content changed behind our back, so the stored hash no longer applies
+                        updates.append((st.st_size, st.st_mtime, folder, entry.name))
+            deletes = list(known)
+            digests = self.remove(deletes)
+            with self.conn:
+                self.conn.executemany("INSERT INTO files (folder, name, size, mtime) VALUES (?, ?, ?, ?)", inserts)
+                self.conn.executemany("UPDATE files SET size = ?, mtime = ?, hash = NULL WHERE folder = ? AND name = ?",
+                                      updates)
+            self.load_totals()
+            self.notify("reload")
+        return len(inserts), len(updates), digests
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+class FilenameSearchIndex:
+    # In-memory filename search over the metadata index, kept current through its change listener.
+    # Original names (and stored names with the generated UUID removed) get a bigram and trigram index
+    # for substring, glob and fuzzy queries; the UUIDs themselves are kept sorted for prefix lookups.
+    # Extensions, folders, sizes and mtimes are indexed too, so filter-only queries and *.ext globs
+    # only look at the entries that can match.
+    UUID_PATTERN = re.compile(r"[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}")
+    UUID_CHARS = frozenset("0123456789abcdef-")  # A glob's literal n-grams using these may straddle a UUID
+    EXTENSION_GLOB = re.compile(r"\*\.([^*?\[\]./]+)")
+    GLOB_SPECIALS = re.compile(r"\[[^\]]*\]|[*?]")
+    FUZZY_THRESHOLD = 0.4  # Share of the query's trigrams a name must contain to count as a fuzzy match
+
+    def __init__(self, source):
+        self.source = source  # Returns (folder, name, size, mtime, original) rows for a full rebuild
+        self.lock = threading.Lock()
+        self.reload()
+
+    def reload(self):
+        with self.lock:
+            self.entries = {}  # id -> (folder, name, original, size, mtime, text)
+            self.ids = {}  # (folder, name) -> id
+            self.postings = defaultdict(list)  # bigram or trigram -> ids; removed ids are skipped on read
+            self.prefixes = []  # sorted (UUID or lowercase name, id)
+            self.names = []  # sorted (lowercase stored name, id) for tab completion
+            self.extensions = defaultdict(set)  # lowercase extension of the stored or original name -> ids
+            self.folder_ids = defaultdict(set)  # folder -> ids
+            self.originals = defaultdict(set)  # lowercase original name -> ids, for exact matches
+            self.by_size = []  # sorted (size, id)
+            self.by_mtime = []  # sorted (mtime, id)
+            self.order = None  # id -> position in names, built on demand
+            self.next_id = 0
+            self.dead = 0
+            for folder, name, size, mtime, original in self.source():
+                self.insert(folder, name, size, mtime, original, keep_sorted=False)
+            # Once, rather than an insort per file
+            for sorted_list in (self.prefixes, self.names, self.by_size, self.by_mtime):
+                sorted_list.sort()
+
+    @staticmethod
+    def trigrams(text):
+        return {text[i:i + 3] for i in range(len(text) - 2)}
+
+    @staticmethod
+    def grams(text):
+        # Bigrams serve two-character queries, trigrams everything longer
+        return {text[i:i + 2] for i in range(len(text) - 1)} | {text[i:i + 3] for i in range(len(text) - 2)}
+
+    @staticmethod
+    def extension(name):
+        return os.path.splitext(name)[1][1:].lower()
+
+    def insert(self, folder, name, size, mtime, original, keep_sorted=True):
+        entry_id = self.next_id
+        self.next_id += 1
+        lowered = name.lower()
+        match = self.UUID_PATTERN.search(lowered)
+        prefix_key = match.group(0) if match else lowered
+        # Text searched for substrings: original name plus the stored name without its random part
+        text = f"{(original or '').lower()}\n{self.UUID_PATTERN.sub('', lowered)}"
+        self.entries[entry_id] = (folder, name, original, size, mtime, text)
+        self.ids[(folder, name)] = entry_id
+        for gram in self.grams(text):
+            self.postings[gram].append(entry_id)
+        self.extensions[self.extension(name)].add(entry_id)
+        if original:
+            self.extensions[self.extension(original)].add(entry_id)
+            self.originals[original.lower()].add(entry_id)
+        self.folder_ids[folder].add(entry_id)
+        add = bisect.insort if keep_sorted else list.append
+        self.order = None
+        add(self.prefixes, (prefix_key, entry_id))
+        add(self.names, (lowered, entry_id))
+        add(self.by_size, (size, entry_id))
+        add(self.by_mtime, (mtime, entry_id))
+
+    def delete(self, folder, name):
+        entry_id = self.ids.pop((folder, name), None)
+        if entry_id is None:
+            return None
+        entry = self.entries.pop(entry_id)
+        lowered = name.lower()
+        match = self.UUID_PATTERN.search(lowered)
+        key = (match.group(0) if match else lowered, entry_id)
+        position = bisect.bisect_left(self.prefixes, key)
+        if position < len(self.prefixes) and self.prefixes[position] == key:
+            del self.prefixes[position]
+        for sorted_list, key in ((self.names, (lowered, entry_id)), (self.by_size, (entry[3], entry_id)),
+                                 (self.by_mtime, (entry[4], entry_id))):
+            position = bisect.bisect_left(sorted_list, key)
+            if position < len(sorted_list) and sorted_list[position] == key:
+                del sorted_list[position]
+        self.extensions[self.extension(name)].discard(entry_id)
+        if entry[2]:
+            self.extensions[self.extension(entry[2])].discard(entry_id)
+            self.originals[entry[2].lower()].discard(entry_id)
+        self.folder_ids[folder].discard(entry_id)
+        self.order = None
+        self.dead += 1
+        return entry
+
+    def apply(self, event):
+        # MetadataIndex listener
+        if event[0] == "reload":
+            self.reload()
+            return
+        with self.lock:
+            if event[0] == "put":
+                _, folder, name, size, mtime, original = event
+                self.delete(folder, name)
+                self.insert(folder, name, size, mtime, original)
+            elif event[0] == "remove":
+                self.delete(event[1], event[2])
+            elif event[0] == "rename":
+                entry = self.delete(event[1], event[2])
+                if entry:
+                    self.delete(event[3], event[4])
+                    self.insert(event[3], event[4], entry[3], entry[4], entry[2])
+            if self.dead > max(1000, len(self.entries)):
+                self.compact()
+
+    def compact(self):
+        # Drop removed ids from the posting lists
+        for trigram in list(self.postings):
+            alive = [entry_id for entry_id in self.postings[trigram] if entry_id in self.entries]
+            if alive:
+                self.postings[trigram] = alive
+            else:
+                del self.postings[trigram]
+        self.dead = 0
+
+    @staticmethod
+    def passes(entry, filters):
+        folder, name, _, size, mtime, _ = entry
+        return (("folder" not in filters or folder == filters["folder"])
+                and ("ext" not in filters or name.lower().endswith("." + filters["ext"]))
+                and ("min_size" not in filters or size >= filters["min_size"])
+                and ("max_size" not in filters or size <= filters["max_size"])
+                and ("after" not in filters or mtime >= filters["after"])
+                and ("before" not in filters or mtime < filters["before"]))
+
+    def search(self, term, filters=None, limit=20):
+        # Returns (ranked matches, total match count); a match is (kind, folder, name, original, size, mtime)
+        # where kind is "exact", "prefix", "substring", "glob" or "fuzzy". Exact and fuzzy matches are
+        # ranked one by one. Prefix matches and the bulk of a result (every substring, glob or filter
+        # match) each share one rank, so they are counted with set operations and only their first
+        # names in order are looked at.
+        filters = filters or {}
+        term = term.lower()
+        with self.lock:
+            ranked, tiers = {}, []
+            if not term:
+                tiers.append(((3, "all", 1), None))
+            elif is_pattern(term):
+                tiers.append(((2, "glob", 1), self.entries.keys() & self.glob_hits(term)))
+            else:
+                ranked, prefixed, contained = self.substring_hits(term)
+                prefixed = self.entries.keys() & prefixed
+                prefixed.difference_update(ranked)
+                contained = self.entries.keys() & contained
+                contained.difference_update(ranked, prefixed)
+                tiers += [((1, "prefix", 1), prefixed), ((2, "substring", 1), contained)]
+            if filters:
+                ranked = {entry_id: rank for entry_id, rank in ranked.items()
+                          if self.passes(self.entries[entry_id], filters)}
+                tiers = [(rank, self.filtered(ids, filters)) for rank, ids in tiers]
+            elif tiers[0][1] is None:
+                tiers = [(tiers[0][0], self.entries.keys())]
+            total = len(ranked) + sum(len(ids) for _, ids in tiers)
+            if term and not is_pattern(term) and len(term) >= 3 and total < limit and not ranked:
+                fuzzy = self.fuzzy_hits(term, set().union(*(ids for _, ids in tiers)))
+                if filters:
+                    fuzzy = {entry_id: rank for entry_id, rank in fuzzy.items()
+                             if self.passes(self.entries[entry_id], filters)}
+                ranked.update(fuzzy)
+                total += len(fuzzy)
+            order = self.positions()
+            matches = [(ranked[entry_id], self.entries[entry_id]) for entry_id in heapq.nsmallest(
+                limit, ranked, key=lambda entry_id: (ranked[entry_id][0], -ranked[entry_id][2], order[entry_id]))]
+            for rank, ids in tiers:
+                matches += [(rank, self.entries[entry_id]) for entry_id in self.first_names(ids, limit)]
+        top = heapq.nsmallest(limit, matches, key=lambda match: (match[0][0], -match[0][2], match[1][1].lower()))
+        return [(rank[1],) + entry[:5] for rank, entry in top], total
+
+    def positions(self):
+        # id -> position in the sorted name list, worked out again on the first search after a change
+        if self.order is None:
+            self.order = {entry_id: position for position, (_, entry_id) in enumerate(self.names)}
+        return self.order
+
+    def first_names(self, ids, limit):
+        # The limit ids with the smallest stored names
+        if len(ids) == len(self.entries):
+            return [entry_id for _, entry_id in self.names[:limit]]
+        return heapq.nsmallest(limit, ids, key=self.positions().__getitem__)
+
+    def filtered(self, ids, filters):
+        # The ids (None for all) that pass filters. Folder, size and date filters are answered by
+        # intersecting with their indexes, smallest first, while that is cheaper than checking ids one
+        # by one; whatever filters remain, and the extension filter (whose index also holds original
+        # names), go through passes().
+        options = []
+        if "folder" in filters:
+            folder_ids = self.folder_ids.get(filters["folder"], set())
+            options.append((len(folder_ids), ("folder",), lambda: folder_ids))
+        if "ext" in filters and "." not in filters["ext"]:
+            ext_ids = self.extensions.get(filters["ext"], set())
+            options.append((len(ext_ids), (), lambda: ext_ids))
+        for sorted_list, low, high, high_key in ((self.by_size, "min_size", "max_size", math.inf),
+                                                 (self.by_mtime, "after", "before", -1)):
+            if low in filters or high in filters:
+                start = bisect.bisect_left(sorted_list, (filters[low], -1)) if low in filters else 0
+                end = (bisect.bisect_left(sorted_list, (filters[high], high_key)) if high in filters
+                       else len(sorted_list))
+                options.append((max(0, end - start), (low, high), functools.partial(
+                    lambda sorted_list, start, end: [entry_id for _, entry_id in sorted_list[start:end]],
+                    sorted_list, start, end)))
+        options.sort(key=lambda option: option[0])
+        remaining = dict(filters)
+        for size, decided, make in options:
+            if ids is None:
+                ids = set(make())
+            elif len(ids) > size:
+                ids = ids.intersection(make())
+            else:
+                break
+            for key in decided:
+                remaining.pop(key, None)
+        if ids is None:
+            ids = self.entries.keys()
+        if remaining:
+            ids = {entry_id for entry_id in ids if self.passes(self.entries[entry_id], remaining)}
+        return ids
+
+    def complete(self, prefix, limit=100):
+        # Distinct stored names starting with prefix (case-insensitive), in order
+        prefix = prefix.lower()
+        names = []
+        with self.lock:
+            position = bisect.bisect_left(self.names, (prefix, -1))
+            while position < len(self.names) and self.names[position][0].startswith(prefix) and len(names) < limit:
+                name = self.entries[self.names[position][1]][1]
+                if not names or names[-1] != name:
+                    names.append(name)
+                position += 1
+        return names
+
+    def substring_hits(self, term):
+        # Returns (exact matches by rank, ids whose stored name or UUID starts with term, ids whose text
+        # contains term); the last two may hold removed ids
+        end = bisect.bisect_left(self.prefixes, (term + "\U0010ffff",))
+        prefixed = [entry_id for _, entry_id in self.prefixes[bisect.bisect_left(self.prefixes, (term, -1)):end]]
+        if len(term) <= 3:
+            # The text was indexed by every bigram and trigram, so its posting list is exactly the matches;
+            # a single character narrows nothing and checks every name
+            bulk = self.postings.get(term, ()) if len(term) > 1 else [
+                entry_id for entry_id, entry in self.entries.items() if term in entry[5]]
+        else:
+            # Only names containing the query's rarest trigram can contain the query
+            candidates = min((self.postings.get(trigram, ()) for trigram in self.trigrams(term)), key=len)
+            bulk = [entry_id for entry_id in candidates
+                    if entry_id in self.entries and term in self.entries[entry_id][5]]
+        # Exact stored names, including ones whose UUID is not in the n-gram text, and exact original names
+        ranked = {entry_id: (0, "exact", 1) for entry_id in self.originals.get(term, ())}
+        position = bisect.bisect_left(self.names, (term, -1))
+        while position < len(self.names) and self.names[position][0] == term:
+            ranked[self.names[position][1]] = (0, "exact", 1)
+            position += 1
+        return ranked, prefixed, bulk
+
+    def glob_hits(self, pattern):
+        # Ids matching pattern. *.ext comes straight from the extension index. Other globs only check
+        # names holding the rarest n-gram of their literal parts, counting only n-grams that can't
+        # overlap a stored name's UUID (which the n-gram text leaves out): any n-gram of a part that
+        # starts and ends outside the UUID alphabet, else only n-grams with no UUID character. Globs
+        # without one check every name.
+        extension = self.EXTENSION_GLOB.fullmatch(pattern)
+        if extension:
+            return self.extensions.get(extension.group(1), ())
+        literal = []
+        for part in self.GLOB_SPECIALS.split(pattern):
+            if part[:1] in self.UUID_CHARS or part[-1:] in self.UUID_CHARS or self.UUID_PATTERN.search(part):
+                literal += [gram for gram in self.grams(part) if not self.UUID_CHARS.intersection(gram)]
+            else:
+                literal += self.grams(part)
+        candidates = min((self.postings.get(gram, ()) for gram in literal), key=len) if literal else self.entries
+        matcher = re.compile(fnmatch.translate(pattern)).match
+        return [entry_id for entry_id in candidates if entry_id in self.entries
+                and (matcher(self.entries[entry_id][1].lower())
+                     or (self.entries[entry_id][2] and matcher(self.entries[entry_id][2].lower())))]
+
+    def fuzzy_hits(self, term, exclude):
+        # A name matches when it shares enough of the query's trigrams. Trigrams shared by many names
+        # (".png", "inv") count towards that but weigh less in the ranking score, which is the share
+        # of the query's inverse-document-frequency weight the name holds.
+        query = self.trigrams(term)
+        total = len(self.entries) + 1
+        weights = {trigram: math.log(total / (len(self.postings.get(trigram, ())) + 1)) + 1 for trigram in query}
+        query_weight = sum(weights.values())
+        shared, scores = Counter(), Counter()
+        for trigram in query:
+            postings = self.postings.get(trigram, ())
+            shared.update(postings)
+            scores.update(dict.fromkeys(postings, weights[trigram] / query_weight))
+        needed = self.FUZZY_THRESHOLD * len(query)
+        return {entry_id: (4, "fuzzy", scores[entry_id]) for entry_id, count in shared.items()
+                if count >= needed and entry_id not in exclude and entry_id in self.entries}
+
+
+class StorageStats:
+    # Storage analytics kept current from MetadataIndex change events, so filer chart answers from
+    # memory however big the tree: per-folder counts and bytes, size histograms, counts and bytes per
+    # extension, and every entry ordered by size for largest-N queries.
+    BUCKET_LIMITS = [1024, 10 * 1024, 100 * 1024, 1024 ** 2, 10 * 1024 ** 2, 100 * 1024 ** 2, 1024 ** 3]
+
+    def __init__(self, source):
+        self.source = source  # Returns (folder, name, size, mtime, original) rows for a full rebuild
+        self.lock = threading.Lock()
+        self.reload()
+
+    def reload(self):
+        with self.lock:
+            self.sizes = {}  # (folder, name) -> size
+            self.by_size = []  # sorted (size, folder, name)
+            self.counts = Counter()  # folder -> files
+            self.bytes = Counter()  # folder -> bytes
+            self.histograms = defaultdict(lambda: [0] * (len(self.BUCKET_LIMITS) + 1))  # folder -> files per bucket
+            self.types = defaultdict(Counter)  # folder -> extension -> files
+            self.type_bytes = defaultdict(Counter)  # folder -> extension -> bytes
+            for folder, name, size, _, _ in self.source():
+                self.sizes[(folder, name)] = size
+                self.by_size.append((size, folder, name))
+                self.adjust(folder, name, size, 1)
+            self.by_size.sort()  # Once, rather than an insort per file
+
+    @staticmethod
+    def extension(name):
+        return os.path.splitext(name)[1].lower() or "(none)"
+
+    def insert(self, folder, name, size):
+        self.sizes[(folder, name)] = size
+        bisect.insort(self.by_size, (size, folder, name))
+        self.adjust(folder, name, size, 1)
+
+    def delete(self, folder, name):
+        size = self.sizes.pop((folder, name), None)
+        if size is None:
+            return None
+        position = bisect.bisect_left(self.by_size, (size, folder, name))
+        if position < len(self.by_size) and self.by_size[position] == (size, folder, name):
+            del self.by_size[position]
+        self.adjust(folder, name, size, -1)
+        return size
+
+    def adjust(self, folder, name, size, sign):
+        extension = self.extension(name)
+        self.counts[folder] += sign
+        self.bytes[folder] += sign * size
+        self.histograms[folder][bisect.bisect_right(self.BUCKET_LIMITS, size)] += sign
+        self.types[folder][extension] += sign
+        self.type_bytes[folder][extension] += sign * size
+
+    def apply(self, event):
+        # MetadataIndex listener
+        if event[0] == "reload":
+            self.reload()
+            return
+        with self.lock:
+            if event[0] == "put":
+                self.delete(event[1], event[2])
+                self.insert(event[1], event[2], event[3])
+            elif event[0] == "remove":
+                self.delete(event[1], event[2])
+            elif event[0] == "rename":
+                size = self.delete(event[1], event[2])
+                if size is not None:
+                    self.delete(event[3], event[4])
+                    self.insert(event[3], event[4], size)
+
+    def histogram(self, folders):
+        with self.lock:
+            return [sum(self.histograms[folder][bucket] for folder in folders if folder in self.histograms)
+                    for bucket in range(len(self.BUCKET_LIMITS) + 1)]
+
+    def breakdown(self, folders):
+        # [(extension, files, bytes)], largest share first
+        files, total = Counter(), Counter()
+        with self.lock:
+            for folder in folders:
+                files.update(self.types.get(folder, {}))
+                total.update(self.type_bytes.get(folder, {}))
+        return sorted(((extension, count, total[extension]) for extension, count in files.items() if count > 0),
+                      key=lambda row: (-row[2], -row[1], row[0]))
+
+    def largest(self, limit, folders):
+        # [(size, folder, name)] for the biggest files in folders
+        wanted = set(folders)
+        rows = []
+        if limit <= 0:
+            return rows
+        with self.lock:
+            for row in reversed(self.by_size):
+                if row[1] in wanted:
+                    rows.append(row)
+                    if len(rows) == limit:
+                        break
+        return rows
+
+
+class ContentIndex(threading.Thread):
+    # Full-text index over the text files in the storage folders (search results, notes), persisted
+    # in SQLite FTS5 with one row per line. A background thread applies metadata index changes and
+    # only re-reads a file when its size or mtime differs from what was indexed.
+    TEXT_EXTENSIONS = (".txt", ".md", ".csv", ".log", ".json", ".html")
+    MAX_FILE_SIZE = 16 * 1024 * 1024  # Larger files are left out of the index
+    LINE_BITS = 20  # Line rowids are doc_id << LINE_BITS | line number, so a file's lines delete as a range
+
+    def __init__(self, storage_dir, source, path):
+        super().__init__(daemon=True)
+        self.storage_dir = storage_dir
+        self.source = source  # Returns (folder, name, size, mtime, original) rows for a full sync
+        self.path = path  # (folder, name) -> file path
+        self.db_path = os.path.join(storage_dir, ".content.sqlite3")
+        self.events = queue.Queue()
+        self.events.put(("reload",))
+        self.idle = threading.Event()  # Set whenever the queue drains
+        self.idle_lock = threading.Lock()
+        self.indexed_files = 0
+        self.failures = 0  # Changes that could not be indexed; look/ reports them
+        self.last_error = None
+        self.conn = self.connect()
+        try:
+            self.conn.execute("""CREATE TABLE IF NOT EXISTS docs (
+                id INTEGER PRIMARY KEY,
+                folder TEXT NOT NULL,
+                name TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                mtime REAL NOT NULL,
+                UNIQUE (folder, name))""")
+            self.conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS lines USING fts5(text, tokenize='unicode61')")
+            self.conn.commit()
+        except sqlite3.Error:
+            self.conn.close()  # e.g. SQLite built without FTS5
+            raise
+        self.reader = self.connect()  # Queries come from the GUI thread while this thread writes
+
+    @property
+    def busy(self):
+        return not self.idle.is_set()
+
+    def connect(self):
+        conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def is_text(self, name):
+        return name.lower().endswith(self.TEXT_EXTENSIONS)
+
+    def apply(self, event):
+        # MetadataIndex listener; the work happens on the indexing thread
+        names = (event[2], event[4]) if event[0] == "rename" else event[2:3]
+        if event[0] == "reload" or any(self.is_text(name) for name in names):
+            with self.idle_lock:
+                self.idle.clear()
+                self.events.put(event)
+
+    def stop(self):
+        self.events.put(None)
+
+    def run(self):
+        try:
+            while True:
+                event = self.events.get()
+                if event is None:
+                    break
+                try:
+                    if event[0] == "reload":
+                        self.sync()
+                    elif event[0] == "put":
+                        self.update(event[1], event[2], event[3], event[4])
+                    elif event[0] == "remove":
+                        self.drop(event[1], event[2])
+                    elif event[0] == "rename":
+                        self.rename(*event[1:])
+                except FileNotFoundError:
+                    pass  # Gone before it was read; its remove event follows
+                except (OSError, sqlite3.Error) as e:
+                    self.failures += 1
+                    self.last_error = str(e)
+                with self.idle_lock:
+                    if self.events.empty():
+                        self.idle.set()
+        finally:
+            self.conn.close()
+            self.reader.close()
+
+    def sync(self):
+        # Bring the whole index in line with the metadata index
+        indexed = {(folder, name): (size, mtime) for folder, name, size, mtime in
+                   self.conn.execute("SELECT folder, name, size, mtime FROM docs")}
+        for folder, name, size, mtime, _ in self.source():
+            if self.is_text(name):
+                if indexed.pop((folder, name), None) != (size, mtime):
+                    self.update(folder, name, size, mtime)
+        for folder, name in indexed:
+            self.drop(folder, name)
+
+    def update(self, folder, name, size, mtime):
+        row = self.conn.execute("SELECT id, size, mtime FROM docs WHERE folder = ? AND name = ?",
+                                (folder, name)).fetchone()
+        if row and (row[1], row[2]) == (size, mtime):
+            return
+        lines = []
+        if size <= self.MAX_FILE_SIZE:
+            with open(self.path(folder, name), encoding="utf-8", errors="replace") as f:
+                lines = [line.rstrip("\n") for line in itertools.islice(f, (1 << self.LINE_BITS) - 1)]
+        with self.conn:
+            if row:
+                doc_id = row[0]
+                self.delete_lines(doc_id)
+                self.conn.execute("UPDATE docs SET size = ?, mtime = ? WHERE id = ?", (size, mtime, doc_id))
+            else:
+                doc_id = self.conn.execute("INSERT INTO docs (folder, name, size, mtime) VALUES (?, ?, ?, ?)",
+                                           (folder, name, size, mtime)).lastrowid
+            base = doc_id << self.LINE_BITS
+            self.conn.executemany("INSERT INTO lines (rowid, text) VALUES (?, ?)",
+                                  ((base | number, line) for number, line in enumerate(lines, 1) if line.strip()))
+        self.indexed_files += 1
+
+    def delete_lines(self, doc_id):
+        self.conn.execute("DELETE FROM lines WHERE rowid BETWEEN ? AND ?",
+                          (doc_id << self.LINE_BITS, ((doc_id + 1) << self.LINE_BITS) - 1))
+
+    def drop(self, folder, name):
+        row = self.conn.execute("SELECT id FROM docs WHERE folder = ? AND name = ?", (folder, name)).fetchone()
+        if row:
+            with self.conn:
+                self.delete_lines(row[0])
+                self.conn.execute("DELETE FROM docs WHERE id = ?", row)
+
+    def rename(self, old_folder, old_name, new_folder, new_name):
+        # Content is unchanged, so only the document's location moves
+        with self.conn:
+            self.conn.execute("DELETE FROM docs WHERE folder = ? AND name = ? AND NOT (folder = ? AND name = ?)",
+                              (new_folder, new_name, old_folder, old_name))
+            if not self.is_text(new_name):
+                self.conn.execute("DELETE FROM docs WHERE folder = ? AND name = ?", (old_folder, old_name))
+                return
+            moved = self.conn.execute("UPDATE docs SET folder = ?, name = ? WHERE folder = ? AND name = ?",
+                                      (new_folder, new_name, old_folder, old_name)).rowcount
+        if not moved:
+            st = os.stat(self.path(new_folder, new_name))
+            self.update(new_folder, new_name, st.st_size, st.st_mtime)
+
+    def search(self, words, folder=None, limit=20):
+        # Returns ([(folder, name, line number, text)], total) ranked by BM25, all words required
+        query = " ".join('"' + word.replace('"', '""') + '"' for word in words)
+        sql = """SELECT docs.folder, docs.name, lines.rowid & ?, lines.text FROM lines
+                 JOIN docs ON docs.id = lines.rowid >> ?
+                 WHERE lines MATCH ?""" + (" AND docs.folder = ?" if folder else "")
+        params = [(1 << self.LINE_BITS) - 1, self.LINE_BITS, query] + ([folder] if folder else [])
+        rows = self.reader.execute(sql + " ORDER BY bm25(lines) LIMIT ?", params + [limit]).fetchall()
+        total = self.reader.execute(f"SELECT COUNT(*) FROM ({sql})", params).fetchone()[0]
+        return rows, total
+
+
+def remove_entry(path):
+    # Windows refuses to delete read-only files, which hardlinked folder entries are
+    try:
+        os.remove(path)
+    except PermissionError:
+        if os.name != "nt":
+            raise
+        os.chmod(path, 0o644)
+        os.remove(path)
+
+
+def reflink(src, dst):
+    # Copy-on-write clone of src as a new file dst (Btrfs, XFS, bcachefs and others). Raises OSError
+    # where the platform or filesystem can't clone.
+    if fcntl is None:
+        raise OSError(errno.EOPNOTSUPP, "reflinks are not supported on this platform")
+    with open(src, "rb") as fin, open(dst, "xb") as fout:
+        try:
+            fcntl.ioctl(fout.fileno(), FICLONE, fin.fileno())
+        except OSError:
+            fout.close()
+            os.remove(dst)
+            raise
+
+
+class BlobStore:
+    # Content-addressed storage: each unique file is kept once under .store/<2 hex>/<digest>, read-only.
+    # Folder entries are copy-on-write clones of it where the filesystem supports them, otherwise
+    # hardlinks. Which entries use which digest lives in the MetadataIndex.
+    CHUNK_SIZE = 1024 * 1024
+    SPILL_SIZE = 4 * 1024 * 1024  # Streamed content is buffered in memory up to this size
+    BLOB_MODE = 0o444
+
+    def __init__(self, storage_dir, index):
+        self.storage_dir = storage_dir
+        self.index = index
+        self.root = os.path.join(storage_dir, ".store")
+        self.tmp_dir = os.path.join(self.root, "tmp")
+        os.makedirs(self.tmp_dir, exist_ok=True)
+        self.link_lock = threading.Lock()
+        # digest -> (size, mtime_ns) of blobs whose content was last seen to match their name
+        self.verified = {}
+        self.migrate_refs()
+
+    def migrate_refs(self):
+        # Older versions kept digest -> entries in .store/refs.json
+        refs_file = os.path.join(self.root, "refs.json")
+        if not os.path.exists(refs_file):
+            return
+        with open(refs_file, "r", encoding="utf-8") as f:
+            refs = json.load(f)
+        self.index.set_hashes([(digest, *rel.split("/", 1)) for digest, paths in refs.items() for rel in paths])
+        os.remove(refs_file)
+
+    @staticmethod
+    def new_hasher():
+        return hashlib.blake2b(digest_size=32)
+
+    def blob_path(self, digest):
+        return os.path.join(self.root, digest[:2], digest)
+
+    def has(self, digest):
+        # True if an intact blob exists. A blob changed since it was last verified (someone wrote
+        # through a hardlink despite the read-only mode, e.g. as root) is hashed again, and dropped
+        # if it no longer matches so the caller stores the content afresh.
+        blob = self.blob_path(digest)
+        try:
+            st = os.stat(blob)
+        except FileNotFoundError:
+            return False
+        if self.verified.get(digest) != (st.st_size, st.st_mtime_ns):
+            if self.hash_file(blob) != digest:
+                self.verified.pop(digest, None)
+                os.remove(blob)  # Entries linked to it keep their (changed) content
+                return False
+            self.verified[digest] = (st.st_size, st.st_mtime_ns)
+        if st.st_mode & 0o777 != self.BLOB_MODE:
+            # Blobs from before they were made read-only, or made writable by remove_entry on Windows
+            os.chmod(blob, self.BLOB_MODE)
+        return True
+
+    def hash_file(self, path, progress=None, cancel_event=None):
+        # Returns None if canceled
+        hasher = self.new_hasher()
+        done = 0
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(self.CHUNK_SIZE), b""):
+                if cancel_event is not None and cancel_event.is_set():
+                    return None
+                hasher.update(chunk)
+                done += len(chunk)
+                if progress is not None:
+                    progress(done)
+        return hasher.hexdigest()
+
+    def import_file(self, src, digest, progress=None, cancel_event=None):
+        # Copy a file whose digest is already known into a temp file, then rename it into place.
+        # Returns True if the blob was written, False if it already existed and None if canceled.
+        if self.has(digest):
+            return False
+        tmp_path = os.path.join(self.tmp_dir, uuid.uuid4().hex)
+        try:
+            if not stream_copy(src, tmp_path, progress, cancel_event):
+                return None
+            return self.commit(digest, tmp_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def put_chunks(self, chunks, cancel_event=None):
+        # Hash while streaming; small payloads never touch the disk if they turn out to be duplicates.
+        # Returns (digest, size), or (None, size) when canceled.
+        hasher = self.new_hasher()
+        buffer = io.BytesIO()
+        tmp_file = None
+        tmp_path = None
+        size = 0
+        try:
+            for chunk in chunks:
+                if cancel_event is not None and cancel_event.is_set():
+                    return None, size
+                hasher.update(chunk)
+                size += len(chunk)
+                if tmp_file is None:
+                    buffer.write(chunk)
+                    if buffer.tell() > self.SPILL_SIZE:
+                        tmp_path = os.path.join(self.tmp_dir, uuid.uuid4().hex)
+                        tmp_file = open(tmp_path, "wb")
+                        tmp_file.write(buffer.getvalue())
+                        buffer = None
+                else:
+                    tmp_file.write(chunk)
+            digest = hasher.hexdigest()
+            if tmp_file is not None:
+                tmp_file.close()
+                tmp_file = None
+                self.commit(digest, tmp_path)
+            elif not self.has(digest):
+                tmp_path = os.path.join(self.tmp_dir, uuid.uuid4().hex)
+                with open(tmp_path, "wb") as f:
+                    f.write(buffer.getvalue())
+                self.commit(digest, tmp_path)
+            return digest, size
+        finally:
+            if tmp_file is not None:
+                tmp_file.close()
+            if tmp_path and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def commit(self, digest, tmp_path):
+        blob = self.blob_path(digest)
+        if os.path.exists(blob):
+            return False
+        os.makedirs(os.path.dirname(blob), exist_ok=True)
+        os.chmod(tmp_path, self.BLOB_MODE)
+        os.replace(tmp_path, blob)
+        st = os.stat(blob)
+        self.verified[digest] = (st.st_size, st.st_mtime_ns)
+        return True
+
+    def link(self, digest, folder, name, original=None):
+        # A clone is a writable file of its own; a hardlink shares the read-only blob, so editing the
+        # entry in place fails instead of changing every entry with the same content
+        blob = self.blob_path(digest)
+        dest_path = self.index.layout.target(folder, name)
+        try:
+            reflink(blob, dest_path)
+        except OSError:
+            try:
+                os.link(blob, dest_path)
+            except OSError:
+                # Filesystems without hardlinks get a plain copy
+                shutil.copyfile(blob, dest_path)
+        self.index.add(folder, name, digest, original)
+
+    def find(self, digest, folder):
+        # Name of an existing entry in folder with this content, if any
+        return self.index.find_by_hash(digest, folder)
+
+    def link_unless_present(self, digest, folder, name, original=None):
+        # Check-and-link in one step so parallel workers can't both add the same content to a folder.
+        # Returns the name of the existing entry, or None after linking name.
+        with self.link_lock:
+            existing = self.find(digest, folder)
+            if existing:
+                return existing
+            self.link(digest, folder, name, original)
+            return None
+
+    def release(self, entries):
+        # Forget deleted folder entries and drop blobs nothing links to anymore
+        self.collect(self.index.remove(entries))
+
+    def collect(self, digests):
+        # Clones don't raise the blob's link count, so a blob is only dropped once no entry in the
+        # index names its digest either
+        for digest in digests:
+            blob = self.blob_path(digest)
+            try:
+                if os.stat(blob).st_nlink <= 1 and not self.index.has_hash(digest):
+                    os.remove(blob)
+                    self.verified.pop(digest, None)
+            except FileNotFoundError:
+                pass
+
+
+class FolderWatcher(threading.Thread):
+    # Reports files created, changed, deleted or renamed in the storage folders by anyone, including
+    # other programs. Uses inotify on Linux (one watch per folder and shard directory) and falls back
+    # to diffing os.scandir snapshots elsewhere.
+    # Events are batches of tuples: ("changed", folder, name), ("deleted", folder, name),
+    # ("moved", folder, name, new_folder, new_name) and ("rescan",) when events were lost.
+    IN_MODIFY = 0x00000002
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_FROM = 0x00000040
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+    IN_Q_OVERFLOW = 0x00004000
+    IN_ISDIR = 0x40000000
+    WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+    EVENT_HEADER = struct.Struct("iIII")
+    MOVE_PAIR_TIMEOUT = 0.2  # Seconds an IN_MOVED_FROM waits for its IN_MOVED_TO, which may come in the next read
+
+    def __init__(self, layout, callback, poll_interval=2.0):
+        super().__init__(daemon=True)
+        self.layout = layout
+        self.folders = list(layout.folders)
+        self.callback = callback
+        self.poll_interval = poll_interval
+        self.stop_event = threading.Event()
+        self.mode = None
+        self.libc = None
+        self.fd = None
+        self.watches = {}  # inotify watch descriptor -> folder
+        self.roots = set()  # Watch descriptors of folder directories (shard directories appear in these)
+        self.moved_from = {}  # cookie -> (folder, name, seen), paired with the matching IN_MOVED_TO
+        self.lock = threading.Lock()  # Folders are added and dropped from the engine's thread while this one runs
+
+    def stop(self):
+        self.stop_event.set()
+
+    def run(self):
+        fd = self.open_inotify()
+        if fd is None:
+            with self.lock:
+                self.mode = "scandir"
+            self.poll_loop()
+        else:
+            try:
+                self.inotify_loop(fd)
+            finally:
+                os.close(fd)
+
+    def open_inotify(self):
+        if not sys.platform.startswith("linux"):
+            return None
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+            fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+            if fd < 0:
+                return None
+            self.libc, self.fd = libc, fd
+            with self.lock:
+                for folder in self.folders:
+                    if not self.watch_folder(folder):
+                        os.close(fd)
+                        return None
+                self.mode = "inotify"
+            return fd
+        except (OSError, AttributeError):
+            return None
+
+    def watch_folder(self, folder):
+        for index, path in enumerate(self.layout.directories(folder)):
+            wd = self.add_watch(path, folder)
+            if wd < 0:
+                return False
+            if index == 0:
+                self.roots.add(wd)
+        return True
+
+    def add_folder(self, folder):
+        # A folder created while running: watched from now on, without restarting the watcher
+        with self.lock:
+            if folder in self.folders:
+                return
+            self.folders.append(folder)
+            if self.mode == "inotify":
+                self.watch_folder(folder)
+
+    def remove_folder(self, folder):
+        # The kernel drops the watches of a removed directory by itself; forget them here
+        with self.lock:
+            if folder in self.folders:
+                self.folders.remove(folder)
+            for wd in [wd for wd, watched in self.watches.items() if watched == folder]:
+                if self.libc is not None:
+                    self.libc.inotify_rm_watch(self.fd, wd)
+                del self.watches[wd]
+                self.roots.discard(wd)
+
+    def add_watch(self, path, folder):
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(path), self.WATCH_MASK)
+        if wd >= 0:
+            self.watches[wd] = folder
+        return wd
+
+    def inotify_loop(self, fd):
+        while not self.stop_event.is_set():
+            readable, _, _ = select.select([fd], [], [], self.MOVE_PAIR_TIMEOUT if self.moved_from else 0.5)
+            events = []
+            if readable:
+                try:
+                    events = self.parse_events(os.read(fd, 64 * 1024))
+                except BlockingIOError:
+                    pass
+            events.extend(self.expire_moves())
+            if events:
+                self.callback(events)
+
+    def expire_moves(self):
+        # A move whose IN_MOVED_TO never came went out of the watched folders entirely
+        now = time.monotonic()
+        expired = [cookie for cookie, (_, _, seen) in self.moved_from.items() if now - seen >= self.MOVE_PAIR_TIMEOUT]
+        return [("deleted", *self.moved_from.pop(cookie)[:2]) for cookie in expired]
+
+    def parse_events(self, data):
+        events = []
+        changed = set()  # Writes to one file arrive as a burst of IN_MODIFY; report it once per batch
+        offset = 0
+        while offset < len(data):
+            wd, mask, cookie, length = self.EVENT_HEADER.unpack_from(data, offset)
+            offset += self.EVENT_HEADER.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b"\0"))
+            offset += length
+            if mask & self.IN_Q_OVERFLOW:
+                self.moved_from.clear()
+                return [("rescan",)]
+            folder = self.watches.get(wd)
+            if folder is None:
+                continue
+            if mask & self.IN_ISDIR:
+                if wd in self.roots and mask & (self.IN_CREATE | self.IN_MOVED_TO) and FolderLayout.SHARD.fullmatch(name):
+                    # A new shard directory: watch it, and report what landed before the watch existed
+                    path = os.path.join(self.layout.folder_path(folder), name)
+                    with self.lock:
+                        self.add_watch(path, folder)
+                    try:
+                        with os.scandir(path) as entries:
+                            events.extend(("changed", folder, entry.name) for entry in entries
+                                          if entry.is_file(follow_symlinks=False))
+                    except FileNotFoundError:
+                        pass
+                continue
+            if mask & self.IN_MOVED_FROM:
+                self.moved_from[cookie] = (folder, name, time.monotonic())
+            elif mask & self.IN_MOVED_TO:
+                source = self.moved_from.pop(cookie, None)
+                if source:
+                    events.append(("moved", source[0], source[1], folder, name))
+                else:
+                    events.append(("changed", folder, name))
+            elif mask & self.IN_DELETE:
+                changed.discard((folder, name))
+                events.append(("deleted", folder, name))
+            elif (folder, name) not in changed:
+                changed.add((folder, name))
+                events.append(("changed", folder, name))
+        return events
+
+    def snapshot(self):
+        entries = {}
+        with self.lock:
+            folders = list(self.folders)
+        for folder in folders:
+            try:
+                for entry in self.layout.scan(folder):
+                    st = entry.stat(follow_symlinks=False)
+                    entries[(folder, entry.name)] = (st.st_size, st.st_mtime_ns, st.st_ino)
+            except FileNotFoundError:
+                pass
+        return entries
+
+    def poll_loop(self):
+        previous = self.snapshot()
+        while not self.stop_event.wait(self.poll_interval):
+            current = self.snapshot()
+            events = []
+            gone = {key: value for key, value in previous.items() if key not in current}
+            by_inode = {value[2]: key for key, value in gone.items()}
+            for key, value in current.items():
+                if key not in previous:
+                    source = by_inode.pop(value[2], None)
+                    if source and gone.pop(source, None) is not None:
+                        events.append(("moved", source[0], source[1], key[0], key[1]))
+                    else:
+                        events.append(("changed", key[0], key[1]))
+                elif previous[key] != value:
+                    events.append(("changed", key[0], key[1]))
+            events.extend(("deleted", folder, name) for folder, name in gone)
+            previous = current
+            if events:
+                self.callback(events)
+
+
+class HistoryWriter:
+    # Buffers history lines and appends them in batches (when the buffer fills or on the app's flush
+    # timer) instead of reopening history.log per line. The log rotates to history.log.1..N past max_bytes.
+    def __init__(self, path, max_bytes=5 * 1024 * 1024, backups=3, batch_lines=1000):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.batch_lines = batch_lines
+        self.buffer = []
+        self.rotations = 0  # Lets readers follow files as they shift to .1, .2, ...
+
+    def write(self, text):
+        self.buffer.append(text + "\n")
+        if len(self.buffer) >= self.batch_lines:
+            self.flush()
+
+    def flush(self):
+        if not self.buffer:
+            return
+        data = "".join(self.buffer)
+        self.buffer = []
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(data)
+            size = f.tell()
+        if size > self.max_bytes:
+            self.rotate()
+
+    def rotate(self):
+        for i in range(self.backups - 1, 0, -1):
+            older = f"{self.path}.{i}"
+            if os.path.exists(older):
+                os.replace(older, f"{self.path}.{i + 1}")
+        if self.backups > 0:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+        self.rotations += 1
+
+    def clear(self):
+        self.buffer = []
+        with open(self.path, "w", encoding="utf-8") as f:
+            f.write("")  # Empty the file
+        for i in range(1, self.backups + 1):
+            if os.path.exists(f"{self.path}.{i}"):
+                os.remove(f"{self.path}.{i}")
+
+
+class HistoryReader:
+    # Pages backwards through history.log and then its rotated backups, so startup shows only the
+    # newest slice of the log and older pages are read on demand with a reverse seek.
+    def __init__(self, writer):
+        self.writer = writer
+        self.file_index = 0  # 0 is history.log, n is history.log.n
+        self.offset = None  # Start of the part of the current file that has been read
+        self.rotations = writer.rotations
+        self.exhausted = False
+
+    def current_path(self):
+        # Files shift one step older every time the writer rotates
+        self.file_index += self.writer.rotations - self.rotations
+        self.rotations = self.writer.rotations
+        if self.file_index == 0:
+            return self.writer.path
+        return f"{self.writer.path}.{self.file_index}"
+
+    def reset(self):
+        # Treat everything currently on disk as already read
+        self.file_index = 0
+        self.rotations = self.writer.rotations
+        path = self.current_path()
+        self.offset = os.path.getsize(path) if os.path.exists(path) else 0
+        self.exhausted = True
+
+    def mark(self):
+        return self.file_index, self.offset, self.rotations, self.exhausted
+
+    def restore(self, mark):
+        # Back to an earlier mark, so pages released from the console are read again on the way up
+        self.file_index, self.offset, self.rotations, self.exhausted = mark
+
+    def read_previous(self, max_bytes):
+        while not self.exhausted:
+            path = self.current_path()
+            if self.file_index > self.writer.backups or not os.path.exists(path):
+                self.exhausted = True
+                break
+            with open(path, "rb") as f:
+                if self.offset is None:
+                    self.offset = f.seek(0, os.SEEK_END)
+                if self.offset == 0:
+                    self.file_index += 1
+                    self.offset = None
+                    continue
+                start = max(0, self.offset - max_bytes)
+                f.seek(start)
+                data = f.read(self.offset - start)
+            if start > 0:
+                # Begin on a line boundary; the cut-off part is returned by the next call
+                newline = data.find(b"\n")
+                if newline != -1:
+                    start += newline + 1
+                    data = data[newline + 1:]
+            self.offset = start
+            return data.decode("utf-8", errors="replace")
+        return ""
+
+
+class OutputModel(QAbstractListModel):
+    # Console lines in a capped list; the oldest lines are dropped once capacity is reached. History
+    # scrolled in at the top may use up to history_capacity rows on top of that, until it is released.
+    def __init__(self, capacity, history_capacity=None):
         super().__init__()
-        self.setWindowTitle("File Storage Terminal")
-        self.setGeometry(100, 100, 800, 600)
+        self.capacity = capacity
+        self.history_capacity = capacity if history_capacity is None else history_capacity
+        self.extra = 0  # Rows allowed beyond capacity for history prepended since the last release
+        self.lines = []
 
-        # Password check
-        self.password = "mysecret"  # Change this to your desired password
-        if not self.check_password():
-            sys.exit()
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.lines)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and index.isValid():
+            return self.lines[index.row()]
+        return None
+
+    def append_lines(self, lines):
+        lines = lines[-self.capacity:]
+        overflow = len(self.lines) + len(lines) - self.capacity - self.extra
+        if overflow > 0:
+            self.beginRemoveRows(QModelIndex(), 0, overflow - 1)
+            del self.lines[:overflow]
+            self.endRemoveRows()
+        first = len(self.lines)
+        self.beginInsertRows(QModelIndex(), first, first + len(lines) - 1)
+        self.lines.extend(lines)
+        self.endInsertRows()
+
+    def history_full(self):
+        return self.extra >= self.history_capacity
+
+    def releasable_rows(self):
+        # Rows above the cap, dropped by release_history
+        return max(0, len(self.lines) - self.capacity) if self.extra else 0
+
+    def prepend_lines(self, lines):
+        # Scrolled-in history counts against history_capacity, not the cap, or it would be trimmed right
+        # back off. Past history_capacity only the newest part of lines is kept.
+        lines = lines[max(0, len(lines) - (self.history_capacity - self.extra)):]
+        if not lines:
+            return
+        self.beginInsertRows(QModelIndex(), 0, len(lines) - 1)
+        self.lines[:0] = lines
+        self.endInsertRows()
+        self.extra += len(lines)
+
+    def release_history(self):
+        # Trim back to the cap, dropping the oldest rows
+        release = self.releasable_rows()
+        if release:
+            self.beginRemoveRows(QModelIndex(), 0, release - 1)
+            del self.lines[:release]
+            self.endRemoveRows()
+        self.extra = 0
+
+    def clear(self):
+        self.beginResetModel()
+        self.lines = []
+        self.extra = 0
+        self.endResetModel()
+
+
+class OutputConsole(QListView):
+    # Virtualized terminal output: only the visible rows are painted, and everything appended during
+    # one event-loop tick is inserted into the model as a single batch. Long lines are wrapped to the
+    # view width when they are inserted, like a terminal.
+    scrolled_to_top = pyqtSignal()
+    history_released = pyqtSignal()  # Scrolled-in history dropped after returning to the bottom
 
+    def __init__(self, capacity):
+        super().__init__()
+        self.output_model = OutputModel(capacity)
+        self.setModel(self.output_model)
+        self.setUniformItemSizes(True)
+        self.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.setSelectionMode(QAbstractItemView.ExtendedSelection)
+        self.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
+        self.pending = []
+        self.flush_scheduled = False
+        self.prepending = False
+        self.verticalScrollBar().valueChanged.connect(self.check_top)
+        self.verticalScrollBar().valueChanged.connect(self.check_bottom)
+        copy_shortcut = QShortcut(QKeySequence.Copy, self)
+        copy_shortcut.setContext(Qt.WidgetShortcut)
+        copy_shortcut.activated.connect(self.copy_selection)
+
+    def append(self, text):
+        self.pending.extend(text.split("\n"))
+        if not self.flush_scheduled:
+            self.flush_scheduled = True
+            QTimer.singleShot(0, self.flush)
+
+    def wrap(self, lines):
+        columns = 80
+        if self.isVisible():
+            columns = max(20, self.viewport().width() // max(1, self.fontMetrics().horizontalAdvance("M")) - 1)
+        wrapped = []
+        for line in lines:
+            if len(line) <= columns:
+                wrapped.append(line)
+            else:
+                wrapped.extend(line[i:i + columns] for i in range(0, len(line), columns))
+        return wrapped
+
+    def flush(self):
+        self.flush_scheduled = False
+        if not self.pending:
+            return
+        lines = self.wrap(self.pending)
+        self.pending = []
+        scrollbar = self.verticalScrollBar()
+        at_bottom = scrollbar.value() >= scrollbar.maximum()
+        self.output_model.append_lines(lines)
+        if at_bottom:
+            self.scrollToBottom()
+
+    def prepend(self, text):
+        scrollbar = self.verticalScrollBar()
+        old_maximum = scrollbar.maximum()
+        self.prepending = True
+        try:
+            self.output_model.prepend_lines(self.wrap(text.split("\n")))
+            # Keep the line that was at the top in view
+            self.executeDelayedItemsLayout()
+            scrollbar.setValue(scrollbar.maximum() - old_maximum)
+        finally:
+            self.prepending = False
+
+    def clear(self):
+        self.pending = []
+        self.output_model.clear()
+
+    def check_top(self, value):
+        if value == self.verticalScrollBar().minimum():
+            self.scrolled_to_top.emit()
+
+    def check_bottom(self, value):
+        # Back at the bottom with every row above the cap out of sight: release them
+        if self.prepending or not self.output_model.extra or value < self.verticalScrollBar().maximum():
+            return
+        if self.indexAt(self.viewport().rect().topLeft()).row() >= self.output_model.releasable_rows():
+            self.output_model.release_history()
+            self.history_released.emit()
+
+    def copy_selection(self):
+        rows = sorted(index.row() for index in self.selectedIndexes())
+        QApplication.clipboard().setText("\n".join(self.output_model.lines[row] for row in rows))
+
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.gif', '.webp', '.svg', '.bmp', '.avif', '.ico')
+
+
+def parse_srcset(value):
+    # "small.jpg 480w, large.jpg 1080w" or "a.png 1x, b.png 2x" -> URLs, largest candidate first
+    candidates = []
+    for part in value.split(","):
+        fields = part.split()
+        if fields:
+            try:
+                weight = float(fields[1][:-1]) if len(fields) > 1 else 1.0
+            except ValueError:
+                weight = 1.0
+            candidates.append((weight, fields[0]))
+    return [url for _, url in sorted(candidates, key=lambda candidate: -candidate[0])]
+
+
+class PageScanner:
+    # Pulls image and link URLs out of HTML fed in chunks as it arrives, without building a document
+    # tree. Each <img> yields one image: the largest srcset candidate of its <picture> sources or its
+    # own srcset, else src/data-src. Uses lxml's pull parser when installed, html.parser otherwise.
+    def __init__(self, base_url, on_image=None, on_link=None, encoding=None):
+        self.base_url = base_url
+        parsed = urlparse(base_url)
+        self.origin = f"{parsed.scheme}://{parsed.netloc}"
+        self.on_image = on_image
+        self.on_link = on_link
+        self.images = {}  # Ordered sets of absolute URLs
+        self.links = {}
+        self.picture = None  # Candidates from the <source> tags of the open <picture>
+        try:
+            from lxml import etree
+            self.parser = etree.HTMLPullParser(events=("start", "end"), encoding=encoding)
+            self.lxml = True
+        except ImportError:
+            import codecs
+            from html.parser import HTMLParser
+            scanner = self
+
+            class TagParser(HTMLParser):
+                def handle_starttag(self, tag, attrs):
+                    scanner.start(tag, dict(attrs))
+
+                def handle_endtag(self, tag):
+                    if tag == "picture":
+                        scanner.picture = None
+
+            self.parser = TagParser(convert_charrefs=True)
+            try:
+                self.decoder = codecs.getincrementaldecoder(encoding or "utf-8")(errors="replace")
+            except LookupError:
+                self.decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+            self.lxml = False
+
+    def feed(self, chunk):
+        if not self.lxml:
+            self.parser.feed(self.decoder.decode(chunk))
+            return
+        self.parser.feed(chunk)
+        self.drain()
+
+    def close(self):
+        if not self.lxml:
+            self.parser.feed(self.decoder.decode(b"", final=True))
+            self.parser.close()
+            return
+        try:
+            self.parser.close()
+        except Exception:
+            pass  # lxml raises on empty or hopeless documents; whatever was found still counts
+        self.drain()
+
+    def drain(self):
+        for event, element in self.parser.read_events():
+            if not isinstance(element.tag, str):
+                continue  # Comments and processing instructions
+            if event == "start":
+                self.start(element.tag, element.attrib)
+            else:
+                if element.tag == "picture":
+                    self.picture = None
+                # Drop finished elements so memory stays flat however large the page is
+                element.clear()
+                while element.getprevious() is not None:
+                    del element.getparent()[0]
+
+    def start(self, tag, attrs):
+        if tag == "a":
+            if attrs.get("href"):
+                self.found(self.links, self.resolve(attrs["href"].split("#", 1)[0]), self.on_link)
+        elif tag == "picture":
+            self.picture = []
+        elif tag == "source" and self.picture is not None:
+            self.picture += parse_srcset(attrs.get("srcset") or attrs.get("data-srcset") or "")[:1]
+        elif tag == "img":
+            candidates = list(self.picture or ())
+            candidates += parse_srcset(attrs.get("srcset") or attrs.get("data-srcset") or "")[:1]
+            candidates += [attrs[attr] for attr in ("src", "data-src", "data-fallback-src") if attrs.get(attr)]
+            for src in candidates:
+                if not src.startswith("data:"):
+                    self.found(self.images, self.resolve(src), self.on_image)
+                    break
+
+    def resolve(self, url):
+        # urljoin is most of the cost on big pages; absolute and root-relative URLs don't need it
+        url = url.strip()
+        if url.startswith(("http://", "https://")):
+            return url
+        if url.startswith("/") and not url.startswith("//") and "/." not in url:
+            return self.origin + url
+        return urljoin(self.base_url, url)
+
+    @staticmethod
+    def found(seen, url, callback):
+        if url not in seen:
+            seen[url] = None
+            if callback is not None:
+                callback(url)
+
+
+def scan_page(response, base_url, on_image=None, on_link=None, stop=None, keep_rest=False, chunk_size=64 * 1024,
+              record=UNTRACKED):
+    # Streams a response through a PageScanner. stop() returning True ends parsing early; with
+    # keep_rest the unread rest of the body is left in scanner.rest for the caller to finish with
+    # drain(), e.g. so HttpCache can store the complete page. The caller closes the response either way.
+    # record gets the time spent waiting for the body ("network") and parsing it ("parse").
+    charset = re.search(r"charset=([\w-]+)", response.headers.get("Content-Type", ""))
+    scanner = PageScanner(base_url, on_image, on_link, charset.group(1) if charset else None)
+    scanner.rest = None
+    chunks = record.metered(response.iter_content(chunk_size=chunk_size))
+    for chunk in chunks:
+        with record.phase("parse"):
+            scanner.feed(chunk)
+        if stop is not None and stop():
+            if keep_rest:
+                scanner.rest = chunks
+            else:
+                chunks.close()
+            return scanner
+    with record.phase("parse"):
+        scanner.close()
+    return scanner
+
+
+def drain(chunks, canceled=None):
+    # Reads the rest of a body left by scan_page(keep_rest=True), unless canceled() turns True first
+    try:
+        for _ in chunks:
+            if canceled is not None and canceled():
+                break
+    finally:
+        chunks.close()
+
+
+def has_image_extension(url):
+    return os.path.splitext(urlparse(url).path)[1].lower() in IMAGE_EXTENSIONS
+
+
+def image_extension(url, content_type):
+    # Extension for a downloaded image: the URL's own, else one derived from Content-Type.
+    # None when the response is not an image.
+    mime = content_type.split(";")[0].strip().lower()
+    extension = os.path.splitext(urlparse(url).path)[1].lower()
+    if mime.startswith("image/"):
+        if extension in IMAGE_EXTENSIONS:
+            return extension
+        guessed = mimetypes.guess_extension(mime) or "." + mime[6:].split("+")[0]
+        return ".jpg" if guessed in (".jpe", ".jfif") else guessed
+    if mime in ("", "application/octet-stream", "binary/octet-stream") and extension in IMAGE_EXTENSIONS:
+        return extension
+    return None
+
+
+class HostLimiter:
+    # Per-host politeness for crawls: at most `concurrency` requests in flight and one new
+    # request every `delay` seconds to the same host
+    def __init__(self, concurrency=4, delay=0.25):
+        self.concurrency = concurrency
+        self.delay = delay
+        self.lock = threading.Lock()
+        self.slots = {}  # host -> Semaphore
+        self.next_start = {}  # host -> earliest time the next request may start
+
+    @contextmanager
+    def slot(self, url, cancel_event):
+        host = urlparse(url).netloc
+        with self.lock:
+            semaphore = self.slots.setdefault(host, threading.Semaphore(self.concurrency))
+        semaphore.acquire()
+        try:
+            with self.lock:
+                start = max(time.monotonic(), self.next_start.get(host, 0))
+                self.next_start[host] = start + self.delay
+            cancel_event.wait(max(0, start - time.monotonic()))
+            yield
+        finally:
+            semaphore.release()
+
+
+class CrawlState:
+    # Visited pages and images of a crawl, persisted in .crawls.sqlite3 so an interrupted crawl
+    # resumes where it stopped. Rows are dropped when the crawl completes, so running it again starts
+    # over; the HTTP cache and the dedup of stored images keep that cheap.
+    def __init__(self, storage_dir, key):
+        self.key = key
+        self.conn = sqlite3.connect(os.path.join(storage_dir, ".crawls.sqlite3"))
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("""CREATE TABLE IF NOT EXISTS visited (
+            crawl TEXT NOT NULL,
+            url TEXT NOT NULL,
+            kind TEXT NOT NULL,
+            depth INTEGER NOT NULL,
+            done INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (crawl, url))""")
+        self.conn.commit()
+
+    def load(self):
+        return self.conn.execute("SELECT url, kind, depth, done FROM visited WHERE crawl = ? ORDER BY rowid",
+                                 (self.key,)).fetchall()
+
+    def add(self, kind, urls, depth=0):
+        with self.conn:
+            self.conn.executemany("INSERT OR IGNORE INTO visited (crawl, url, kind, depth) VALUES (?, ?, ?, ?)",
+                                  [(self.key, url, kind, depth) for url in urls])
+
+    def mark_done(self, url):
+        with self.conn:
+            self.conn.execute("UPDATE visited SET done = 1 WHERE crawl = ? AND url = ?", (self.key, url))
+
+    def finish(self):
+        with self.conn:
+            self.conn.execute("DELETE FROM visited WHERE crawl = ?", (self.key,))
+
+    def close(self):
+        self.conn.close()
+
+
+class WorkerSignals(QObject):
+    # Worker threads never touch widgets; everything goes back to the GUI thread through these
+    message = pyqtSignal(str)
+    finished = pyqtSignal(int)
+    fs_events = pyqtSignal(list)
+
+
+class JobRunnable(QRunnable):
+    def __init__(self, job, signals):
+        super().__init__()
+        self.job = job
+        self.signals = signals
+
+    def run(self):
+        try:
+            with self.job.record.profiled():
+                self.job.run()
+        except Exception as e:
+            self.signals.message.emit(f"Error in job #{self.job.job_id}: {str(e)}")
+        finally:
+            self.signals.finished.emit(self.job.job_id)
+
+
+class ImageDownloadJob:
+    record = UNTRACKED  # CommandRecord of the boot/ command, set when the job starts
+
+    def __init__(self, job_id, url, folder, store, max_images, concurrency, emit, session,
+                 timeout=HTTP_TIMEOUT, cache=None):
+        self.job_id = job_id
+        self.url = url
+        self.folder = folder
+        self.store = store
+        self.max_images = max_images
+        self.concurrency = concurrency
+        self.emit = emit
+        self.session = session
+        self.timeout = timeout
+        self.cache = cache  # HttpCache; repeat fetches of unchanged pages and images cost a 304 or nothing
+        self.cancel_event = threading.Event()
+
+    def describe(self):
+        return f"boot/{self.url} in fold {self.folder} max {self.max_images}"
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    def fetch(self, url):
+        if self.cache is not None:
+            return self.cache.get(self.session, url, self.timeout)
+        return self.session.get(url, stream=True, timeout=self.timeout)
+
+    def run(self):
+        executor = ThreadPoolExecutor(max_workers=self.concurrency)
+        futures = []
+
+        def found_image(img_url):
+            # Downloads start while the rest of the page is still arriving
+            if len(futures) < self.max_images:
+                futures.append(executor.submit(self.fetch_image, img_url))
+
+        count = 0
+        duplicates = 0
+        done = 0
+        response = rest = None
+        try:
+            try:
+                response = self.fetch(self.url)
+                if response.status_code != 200:
+                    self.emit(f"Error: Failed to access {self.url} (Status code: {response.status_code})")
+                    return
+                # A page being written to the cache is read to the end once the downloads are reported,
+                # so it still lands in the cache; anything else is closed as soon as max is reached
+                scanner = scan_page(response, self.url, found_image,
+                                    keep_rest=getattr(response, "entry", None) is not None,
+                                    stop=lambda: len(futures) >= self.max_images or self.cancel_event.is_set(),
+                                    record=self.record)
+                rest = scanner.rest
+            except Exception as e:
+                self.emit(f"Error accessing {self.url}: {str(e)}")
+                if not futures:
+                    return
+
+            if not futures:
+                self.emit("No images found on the website.")
+                return
+
+            total = len(futures)
+            for future in as_completed(futures):
+                done += 1
+                filename, duplicate = future.result()
+                if filename and duplicate:
+                    duplicates += 1
+                    self.emit(f"[#{self.job_id}] Skipped duplicate, already stored as '{filename}' ({done}/{total})")
+                elif filename:
+                    count += 1
+                    self.emit(f"[#{self.job_id}] Downloaded '{filename}' to '{self.folder}' ({done}/{total})")
+                if self.cancel_event.is_set():
+                    break
+            if rest is not None:
+                try:
+                    drain(rest, self.cancel_event.is_set)
+                except Exception:
+                    pass  # The page just doesn't get cached
+                rest = None
+        finally:
+            # Drop anything still queued; in-flight fetches notice the cancel flag between chunks
+            executor.shutdown(wait=True, cancel_futures=True)
+            if rest is not None:
+                rest.close()
+            if response is not None:
+                response.close()
+
+        if self.cancel_event.is_set():
+            self.emit(f"[#{self.job_id}] Canceled: {count} of {total} images downloaded to '{self.folder}'.")
+        else:
+            skipped = f" ({duplicates} duplicates skipped)" if duplicates else ""
+            self.emit(f"[#{self.job_id}] Completed: {count} images downloaded to '{self.folder}' without opening the website.{skipped}")
+
+    def fetch_image(self, img_url):
+        # Returns (filename, duplicate); filename is None when nothing was stored
+        if self.cancel_event.is_set():
+            return None, False
+        try:
+            with self.fetch(img_url) as img_response:
+                if img_response.status_code != 200:
+                    self.emit(f"Failed to download {img_url} (Status code: {img_response.status_code})")
+                    return None, False
+                extension = image_extension(img_url, img_response.headers.get("Content-Type", ""))
+                if extension is None:
+                    self.emit(f"Skipped {img_url}: not an image")
+                    return None, False
+                with self.record.phase("store"):
+                    digest, _ = self.store.put_chunks(self.record.metered(img_response.iter_content(chunk_size=8192)),
+                                                      self.cancel_event)
+            if digest is None:
+                return None, False
+            filename = f"image_{uuid.uuid4()}{extension}"
+            with self.record.phase("store"):
+                existing = self.store.link_unless_present(digest, self.folder, filename,
+                                                          os.path.basename(urlparse(img_url).path))
+            if existing:
+                return existing, True
+            self.record.add("files")
+            return filename, False
+        except Exception as e:
+            self.emit(f"Error downloading {img_url}: {str(e)}")
+            return None, False
+
+
+class CrawlJob(ImageDownloadJob):
+    # boot/<link> depth N: breadth-first crawl of the pages on the start URL's host, up to N links
+    # away, downloading the images they show or link to (from any host) until max images are queued.
+    # At most max_pages pages are queued, which bounds the frontier and the seen set on large sites.
+    def __init__(self, job_id, url, folder, store, max_images, concurrency, emit, session, timeout, cache,
+                 depth, storage_dir, limiter, max_pages):
+        super().__init__(job_id, url, folder, store, max_images, concurrency, emit, session, timeout, cache)
+        self.depth = depth
+        self.max_pages = max_pages
+        self.storage_dir = storage_dir
+        self.limiter = limiter
+        self.host = urlparse(url).netloc
+
+    def describe(self):
+        return f"boot/{self.url} depth {self.depth} pages {self.max_pages} in fold {self.folder} max {self.max_images}"
+
+    def run(self):
+        state = CrawlState(self.storage_dir, f"{self.url} depth {self.depth} in fold {self.folder}")
+        try:
+            self.crawl(state)
+        finally:
+            state.close()
+
+    def crawl(self, state):
+        frontier = deque()  # (url, depth) of pages still to fetch
+        images = deque()  # image URLs still to fetch
+        seen = set()  # every page and image URL already queued
+        pages_done = pages_queued = images_queued = 0
+        rows = state.load()
+        for url, kind, depth, done in rows:
+            seen.add(url)
+            if kind == "image":
+                images_queued += 1
+                if not done:
+                    images.append(url)
+                continue
+            pages_queued += 1
+            if done:
+                pages_done += 1
+            else:
+                frontier.append((url, depth))
+        if rows:
+            self.emit(f"[#{self.job_id}] Resuming crawl: {pages_done} pages visited, {len(frontier)} queued, "
+                      f"{images_queued - len(images)} images done")
+        else:
+            seen.add(self.url)
+            frontier.append((self.url, 0))
+            state.add("page", [self.url])
+            pages_queued = 1
+
+        count = duplicates = 0
+        page_limit_hit = False
+        images_finished = images_queued - len(images)
+        pending = {}  # future -> (kind, url, depth)
+        executor = ThreadPoolExecutor(max_workers=self.concurrency)
+        try:
+            while not self.cancel_event.is_set():
+                # Images first so downloads start as soon as the first page is parsed
+                while len(pending) < self.concurrency and (images or (frontier and images_queued < self.max_images)):
+                    if images:
+                        url = images.popleft()
+                        pending[executor.submit(self.fetch_image, url)] = ("image", url, 0)
+                    else:
+                        url, depth = frontier.popleft()
+                        pending[executor.submit(self.fetch_page, url)] = ("page", url, depth)
+                if not pending:
+                    break
+                finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    kind, url, depth = pending.pop(future)
+                    if self.cancel_event.is_set():
+                        break  # Left undone in the state, so a resumed crawl fetches it again
+                    if kind == "image":
+                        filename, duplicate = future.result()
+                        images_finished += 1
+                        if filename and duplicate:
+                            duplicates += 1
+                            self.emit(f"[#{self.job_id}] Skipped duplicate, already stored as '{filename}' "
+                                      f"({images_finished}/{images_queued})")
+                        elif filename:
+                            count += 1
+                            self.emit(f"[#{self.job_id}] Downloaded '{filename}' to '{self.folder}' "
+                                      f"({images_finished}/{images_queued})")
+                        state.mark_done(url)
+                        continue
+                    page_images, links = future.result()
+                    pages_done += 1
+                    new_images = []
+                    for link in page_images + [link for link in links if has_image_extension(link)]:
+                        if link not in seen and images_queued + len(new_images) < self.max_images:
+                            seen.add(link)
+                            new_images.append(link)
+                    new_pages = []
+                    if depth < self.depth and not page_limit_hit:
+                        for link in links:
+                            parsed = urlparse(link)
+                            if (link not in seen and parsed.scheme in ("http", "https") and parsed.netloc == self.host
+                                    and not has_image_extension(link)):
+                                if pages_queued + len(new_pages) >= self.max_pages:
+                                    page_limit_hit = True
+                                    self.emit(f"[#{self.job_id}] Reached the limit of {self.max_pages} pages; "
+                                              f"no more pages are queued")
+                                    break
+                                seen.add(link)
+                                new_pages.append(link)
+                    state.add("image", new_images)
+                    state.add("page", new_pages, depth + 1)
+                    state.mark_done(url)
+                    images_queued += len(new_images)
+                    pages_queued += len(new_pages)
+                    images.extend(new_images)
+                    frontier.extend((link, depth + 1) for link in new_pages)
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+        skipped = f" ({duplicates} duplicates skipped)" if duplicates else ""
+        if self.cancel_event.is_set():
+            self.emit(f"[#{self.job_id}] Canceled: {count} images downloaded to '{self.folder}' from {pages_done} pages."
+                      f"{skipped} Run the same command again to resume.")
+        else:
+            state.finish()
+            self.emit(f"[#{self.job_id}] Completed: {count} images downloaded to '{self.folder}' from {pages_done} pages."
+                      f"{skipped}")
+
+    def fetch_page(self, url):
+        # Returns (image URLs, link URLs); empty for failures and non-HTML responses
+        if self.cancel_event.is_set():
+            return [], []
+        try:
+            with self.limiter.slot(url, self.cancel_event), self.fetch(url) as response:
+                if response.status_code != 200:
+                    self.emit(f"Failed to access {url} (Status code: {response.status_code})")
+                    return [], []
+                content_type = response.headers.get("Content-Type", "text/html").lower()
+                if "html" not in content_type:
+                    return [], []
+                scanner = scan_page(response, url, record=self.record)
+            return list(scanner.images), list(scanner.links)
+        except Exception as e:
+            self.emit(f"Error accessing {url}: {str(e)}")
+            return [], []
+
+    def fetch_image(self, img_url):
+        with self.limiter.slot(img_url, self.cancel_event):
+            return super().fetch_image(img_url)
+
+
+class UploadJob:
+    PROGRESS_INTERVAL = 0.5  # Seconds between progress lines per file
+    record = UNTRACKED
+
+    def __init__(self, job_id, paths, folder, store, concurrency, emit):
+        self.job_id = job_id
+        self.paths = paths
+        self.folder = folder
+        self.store = store
+        self.concurrency = concurrency
+        self.emit = emit
+        self.cancel_event = threading.Event()
+
+    def describe(self):
+        return f"add up {len(self.paths)} file(s) in fold {self.folder}"
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    def run(self):
+        results = {"uploaded": 0, "duplicate": 0, "canceled": 0, "failed": 0}
+        with ThreadPoolExecutor(max_workers=min(self.concurrency, len(self.paths))) as executor:
+            for result in executor.map(self.upload, self.paths):
+                results[result] += 1
+        summary = f"{results['uploaded']} of {len(self.paths)} file(s) uploaded to '{self.folder}'"
+        extras = [f"{results[key]} {label}" for key, label in
+                  (("duplicate", "duplicates skipped"), ("failed", "failed"), ("canceled", "canceled"))
+                  if results[key]]
+        if extras:
+            summary += f" ({', '.join(extras)})"
+        state = "Canceled" if self.cancel_event.is_set() else "Completed"
+        self.emit(f"[#{self.job_id}] {state}: {summary}")
+
+    def progress_reporter(self, name, phase, total):
+        start = time.monotonic()
+        last = [start]
+
+        def report(done):
+            now = time.monotonic()
+            if now - last[0] < self.PROGRESS_INTERVAL:
+                return
+            last[0] = now
+            rate = done / max(now - start, 1e-6)
+            percent = done * 100 // max(total, 1)
+            self.emit(f"[#{self.job_id}] {phase} '{name}': {percent}% "
+                      f"({format_size(done)} of {format_size(total)}, {format_size(rate)}/s)")
+        return report
+
+    def upload(self, file_path):
+        name = os.path.basename(file_path)
+        if self.cancel_event.is_set():
+            return "canceled"
+        try:
+            size = os.path.getsize(file_path)
+            start = time.monotonic()
+            # Hash first so duplicates are detected before anything is written
+            with self.record.phase("hash"):
+                digest = self.store.hash_file(file_path, self.progress_reporter(name, "Hashing", size),
+                                              self.cancel_event)
+            if digest is None:
+                return "canceled"
+            existing = self.store.find(digest, self.folder)
+            if existing:
+                self.emit(f"[#{self.job_id}] Skipped '{name}': identical file already stored as '{existing}' in '{self.folder}'")
+                return "duplicate"
+            with self.record.phase("copy"):
+                copied = self.store.import_file(file_path, digest, self.progress_reporter(name, "Copying", size),
+                                                self.cancel_event)
+            if copied is None:
+                return "canceled"
+            random_name = str(uuid.uuid4()) + os.path.splitext(file_path)[1]
+            with self.record.phase("copy"):
+                existing = self.store.link_unless_present(digest, self.folder, random_name, name)
+            if existing:
+                self.emit(f"[#{self.job_id}] Skipped '{name}': identical file already stored as '{existing}' in '{self.folder}'")
+                return "duplicate"
+            elapsed = max(time.monotonic() - start, 1e-6)
+            self.record.add("files")
+            if copied:
+                self.record.add("bytes_out", size)
+            dedup = "" if copied else ", deduplicated, no new data written"
+            self.emit(f"[#{self.job_id}] Uploaded file as '{random_name}' to '{self.folder}' "
+                      f"({format_size(size)} in {elapsed:.2f}s, {format_size(size / elapsed)}/s{dedup})")
+            return "uploaded"
+        except Exception as e:
+            self.emit(f"[#{self.job_id}] Error uploading '{name}': {str(e)}")
+            return "failed"
+
+
+class BulkJob:
+    # Deletes or moves every file matching a glob pattern in the given folders. Matches are found with
+    # os.scandir entry types (no per-file stat), split into batches that a thread pool works through,
+    # and the index is updated once per batch. Progress is reported per batch rather than per file.
+    BATCH_SIZE = 2000
+    record = UNTRACKED
+
+    def __init__(self, job_id, action, folders, pattern, store, concurrency, emit, target=None):
+        self.job_id = job_id
+        self.action = action  # "delete" or "move"
+        self.folders = folders
+        self.pattern = pattern
+        self.store = store
+        self.layout = store.index.layout
+        self.concurrency = concurrency
+        self.emit = emit
+        self.target = target
+        self.cancel_event = threading.Event()
+
+    def describe(self):
+        where = ", ".join(self.folders)
+        if self.action == "move":
+            return f"move {self.pattern} to {self.target} in fold {where}"
+        return f"del {self.pattern} in fold {where}"
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    def select(self):
+        matches = []
+        with self.record.phase("scan"):
+            for folder in self.folders:
+                for entry in self.layout.scan(folder):
+                    if fnmatch.fnmatchcase(entry.name, self.pattern):
+                        matches.append((folder, entry.name))
+        return matches
+
+    def run(self):
+        start = time.monotonic()
+        matches = self.select()
+        verb = "Deleted" if self.action == "delete" else "Moved"
+        if not matches:
+            self.emit(f"[#{self.job_id}] No files matching '{self.pattern}' in {', '.join(self.folders)}.")
+            return
+        total = len(matches)
+        batches = [matches[i:i + self.BATCH_SIZE] for i in range(0, total, self.BATCH_SIZE)]
+        done = failed = skipped = 0
+        with ThreadPoolExecutor(max_workers=min(self.concurrency, len(batches))) as executor:
+            futures = [executor.submit(self.process_batch, batch) for batch in batches]
+            for future in as_completed(futures):
+                batch_done, batch_failed, batch_skipped = future.result()
+                done += batch_done
+                failed += batch_failed
+                skipped += batch_skipped
+                if len(batches) > 1 and batch_done:
+                    self.emit(f"[#{self.job_id}] {verb} {done} of {total} files ({done * 100 // total}%)")
+        elapsed = time.monotonic() - start
+        destination = f" to '{self.target}'" if self.action == "move" else ""
+        summary = f"{verb.lower()} {done} of {total} files{destination} in {elapsed:.2f}s"
+        extras = []
+        if skipped:
+            extras.append(f"{skipped} skipped, name already exists in '{self.target}'")
+        if failed:
+            extras.append(f"{failed} failed")
+        if extras:
+            summary += f" ({'; '.join(extras)})"
+        state = "Canceled" if self.cancel_event.is_set() else "Completed"
+        self.emit(f"[#{self.job_id}] {state}: {summary}")
+
+    def process_batch(self, batch):
+        if self.cancel_event.is_set():
+            return 0, 0, 0
+        with self.record.phase("disk"):
+            return self.apply_batch(batch)
+
+    def apply_batch(self, batch):
+        finished = []
+        failed = skipped = 0
+        for folder, name in batch:
+            path = self.layout.path(folder, name)
+            try:
+                if self.action == "delete":
+                    remove_entry(path)
+                else:
+                    new_path = self.layout.target(self.target, name)
+                    if os.path.lexists(new_path):
+                        skipped += 1
+                        continue
+                    os.rename(path, new_path)
+                finished.append((folder, name))
+            except FileNotFoundError:
+                if self.action == "delete":
+                    finished.append((folder, name))  # Already gone; still drop it from the index
+                else:
+                    failed += 1
+            except OSError:
+                failed += 1
+        if self.action == "delete":
+            self.store.release(finished)
+        else:
+            self.store.index.rename_many([(folder, name, self.target, name) for folder, name in finished])
+        self.record.add("files", len(finished))
+        return len(finished), failed, skipped
+
+
+class RescanJob:
+    # du-style verification of the analytics: counts files and bytes in every directory of the given
+    # folders (shards included) with os.scandir on a thread pool and compares them with the index.
+    record = UNTRACKED
+
+    def __init__(self, job_id, folders, layout, index, concurrency, emit):
+        self.job_id = job_id
+        self.folders = folders
+        self.layout = layout
+        self.index = index
+        self.concurrency = concurrency
+        self.emit = emit
+        self.cancel_event = threading.Event()
+
+    def describe(self):
+        return f"filer chart du in fold {', '.join(self.folders)}"
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    def scan_directory(self, folder, path):
+        with self.record.phase("scan"):
+            return self.count_directory(folder, path)
+
+    def count_directory(self, folder, path):
+        count = size = 0
+        try:
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    if self.cancel_event.is_set():
+                        break
+                    if entry.is_file(follow_symlinks=False):
+                        count += 1
+                        size += entry.stat(follow_symlinks=False).st_size
+        except FileNotFoundError:
+            pass
+        return folder, count, size
+
+    def run(self):
+        start = time.monotonic()
+        directories = [(folder, path) for folder in self.folders for path in self.layout.directories(folder)]
+        on_disk = {folder: [0, 0] for folder in self.folders}
+        with ThreadPoolExecutor(max_workers=max(1, min(self.concurrency, len(directories)))) as executor:
+            futures = [executor.submit(self.scan_directory, folder, path) for folder, path in directories]
+            for future in as_completed(futures):
+                folder, count, size = future.result()
+                on_disk[folder][0] += count
+                on_disk[folder][1] += size
+                self.record.add("files", count)
+        if self.cancel_event.is_set():
+            self.emit(f"[#{self.job_id}] Canceled: rescan of {', '.join(self.folders)}")
+            return
+        differ = 0
+        for folder in self.folders:
+            count, size = on_disk[folder]
+            indexed = self.index.totals.get(folder, [0, 0])
+            if [count, size] == indexed:
+                self.emit(f"[#{self.job_id}] {folder}: {count} files, {format_size(size)} (matches the index)")
+            else:
+                differ += 1
+                self.emit(f"[#{self.job_id}] {folder}: {count} files, {format_size(size)} on disk, but the index "
+                          f"has {indexed[0]} files, {format_size(indexed[1])} ({count - indexed[0]:+d} files, "
+                          f"{size - indexed[1]:+d} bytes)")
+        files = sum(count for count, _ in on_disk.values())
+        size = sum(size for _, size in on_disk.values())
+        summary = (f"scanned {files} files ({format_size(size)}) in {len(directories)} directories "
+                   f"in {time.monotonic() - start:.2f}s")
+        if differ:
+            summary += f"; {differ} folder(s) differ from the index, which is reconciled on the next start"
+        self.emit(f"[#{self.job_id}] Completed: {summary}")
+
+
+PASSWORD = "mysecret"  # Change this to your desired password
+
+WELCOME = """
+Hello Neo!!! we can take code
+============================================================
+Available commands:
+{commands}
+============================================================
+Type a command below (Tab completes) and hit Enter to begin!
+"""
+
+
+def command_key(text):
+    # Dispatch key: the first word, or everything up to its first "/" (boot/, sear/, look/, del/)
+    word = text.split(" ", 1)[0]
+    return word[:word.index("/") + 1] if "/" in word else word
+
+
+class Command:
+    # One row of the command table: its grammar (compiled once), the handler that receives the
+    # pattern's named groups, and what help, tab completion and batch scheduling need to know.
+    def __init__(self, usage, summary, pattern, handler, access="write", folders=("folder",),
+                 keys=None, brief=None):
+        self.usage = usage
+        self.summary = summary
+        self.pattern = re.compile(pattern)
+        self.handler = handler
+        self.access = access  # "read" or "write"; batch mode runs reads of a folder side by side
+        self.folders = folders  # Groups naming the folders it touches; none matched means every folder
+        self.keys = keys or (command_key(usage),)
+        self.brief = brief or usage  # Form listed in the unknown-command error
+        self.stem = re.split(r'[<\[]|(?<=\(")', usage, maxsplit=1)[0]  # Literal start offered by tab completion
+
+
+class CommandRegistry:
+    # Commands grouped by dispatch key, so a line is only tried against the few patterns sharing its
+    # first word. Registration order is kept for help output and breaks ties within a key.
+    def __init__(self):
+        self.commands = []
+        self.by_key = defaultdict(list)
+
+    def __iter__(self):
+        return iter(self.commands)
+
+    def register(self, command):
+        self.commands.append(command)
+        for key in command.keys:
+            self.by_key[key].append(command)
+        return command
+
+    def lookup(self, text):
+        # (command, match) for the command that accepts text, or (None, commands sharing its key)
+        candidates = self.by_key.get(command_key(text), [])
+        for command in candidates:
+            match = command.pattern.fullmatch(text)
+            if match:
+                return command, match
+        return None, candidates
+
+    def help_text(self):
+        return "\n".join(f"  - {command.usage} : {command.summary}" for command in self.commands)
+
+    def stems(self, prefix):
+        return sorted({command.stem for command in self.commands
+                       if command.stem.startswith(prefix) and command.stem != prefix})
+
+
+class TerminalEngine:
+    # Everything the terminal can do, without Qt: storage, indexes, jobs and command dispatch.
+    # The window and the headless batch runner drive it through execute() and plug in how output,
+    # background jobs, confirmations and file picking work for them.
+    def __init__(self, storage_dir=None, watch_callback=None):
         # Storage directory
-        self.storage_dir = os.path.expanduser("~/Documents/MyFiles")
+        self.storage_dir = storage_dir or os.path.expanduser("~/Documents/MyFiles")
         if not os.path.exists(self.storage_dir):
             os.makedirs(self.storage_dir)
 
-        # Create a, b, c, d folders if they don't exist
-        self.folders = ['a', 'b', 'c', 'd']
+        # Folders come from folders.json (a, b, c, d by default) and are created if they don't exist
+        self.layout = FolderLayout(self.storage_dir)
+        self.folders = self.layout.folders
+
+        # Metadata index answers list/search/chart queries; reconcile picks up changes made while we were closed
+        self.index = MetadataIndex(self.storage_dir, self.layout)
+        _, _, stale_digests = self.index.reconcile(self.folders)
+        # Finish spreading any folder that passed the shard threshold, including interrupted spreads
         for folder in self.folders:
-            folder_path = os.path.join(self.storage_dir, folder)
-            if not os.path.exists(folder_path):
-                os.makedirs(folder_path)
+            if self.layout.needs_spread(folder, self.index.totals.get(folder, [0, 0])[0]):
+                self.layout.spread(folder)
 
-        # History file
-        self.history_file = os.path.join(self.storage_dir, "history.log")
+        # Filename search stays in memory and follows every index change
+        self.search_index = FilenameSearchIndex(self.index.all_files)
+        self.index.listeners.append(self.search_index.apply)
+        self.search_limit = 20  # Matches printed per search
 
-        # Setup UI to look like a terminal
-        self.central_widget = QWidget()
-        self.setCentralWidget(self.central_widget)
-        self.layout = QVBoxLayout()
+        # Analytics for filer chart follow the index the same way, plus periodic growth snapshots
+        self.storage_stats = StorageStats(self.index.all_files)
+        self.index.listeners.append(self.storage_stats.apply)
+        self.snapshot_interval = 3600  # Seconds between growth snapshots
+        self.rescan_concurrency = 8  # Directories scanned at once by filer chart du
+        self.take_snapshot()
+        self.content_index_wait = 0  # Seconds look/ waits for pending indexing; batch mode waits
+        self.content_index_failures_shown = 0  # look/ mentions indexing failures once, until more happen
 
-        # Output area (read-only)
-        self.output = QTextEdit()
-        self.output.setReadOnly(True)
-        self.output.setFont(QFont("Courier New", 12))  # DOS-like font
-        self.output.setStyleSheet("background-color: #000000; color: #00FF00; border: none;")
-        palette = self.output.palette()
-        palette.setColor(QPalette.Text, QColor("#00FF00"))
-        palette.setColor(QPalette.Base, QColor("#000000"))
-        self.output.setPalette(palette)
-        self.layout.addWidget(self.output)
+        # Text files are indexed line by line in the background for look/
+        try:
+            self.content_index = ContentIndex(self.storage_dir, self.index.all_files, self.layout.path)
+        except sqlite3.OperationalError:
+            self.content_index = None  # SQLite built without FTS5
+        else:
+            self.index.listeners.append(self.content_index.apply)
+            self.content_index.start()
 
-        # Input line
-        self.input_line = QLineEdit()
-        self.input_line.setFont(QFont("Courier New", 12))  # DOS-like font
-        self.input_line.setStyleSheet(
-            "background-color: #000000; color: #00FF00; border: 1px solid #555555; padding: 5px;")
-        self.input_line.returnPressed.connect(self.process_command)
-        self.input_line.setFocusPolicy(Qt.StrongFocus)
-        self.layout.addWidget(self.input_line)
+        # Deduplicated blob store backing every folder entry
+        self.store = BlobStore(self.storage_dir, self.index)
+        self.store.collect(stale_digests)
+
+        # Changes made by other programs reach the index through the watcher instead of rescans.
+        # watch_callback receives each batch of events (the window hands them to its GUI thread).
+        self.watcher = None
+        self.watch_callback = watch_callback
+        self.start_watcher()
+
+        self.download_concurrency = 8  # Parallel image fetches per boot/ job
+        self.upload_concurrency = 2  # Files copied at once per add up job
+        self.bulk_concurrency = 8  # Batches deleted or moved at once by del/all, del/fold and pattern commands
+        self.jobs = {}
+        self.job_ids = itertools.count(1)
+        self.jobs_lock = threading.Lock()  # Batch mode starts and finishes jobs on several threads
+
+        # Shared HTTP session: pooled keep-alive connections plus retry with backoff on 429/5xx
+        self.http_pool_size = 16  # Connections kept per host; keep >= download_concurrency
+        self.http_retries = 3
+        self.http_timeout = HTTP_TIMEOUT
+        self.search_url = "https://www.google.com/search?q={}"  # Results page sear/ reads
+        self.http = None  # Created on first use of boot/ or sear/
+        self.network_lock = threading.Lock()  # Batch commands on several threads may create these at once
+        self.crawl_host_concurrency = 4  # Requests in flight per host during boot/ ... depth N
+        self.crawl_host_delay = 0.25  # Seconds between request starts per host
+        self.crawl_max_images = 100  # Default max for crawls
+        self.crawl_max_pages = 1000  # Default pages for crawls; bounds the frontier of large sites
+        self.crawl_limiter = None  # Created on the first crawl
+        self.http_cache_bytes = 256 * 1024 * 1024  # Cap on cached page and image bodies
+        self.http_cache = None  # Created on first use of boot/ or cache
+
+        # Front-end hooks. The defaults suit headless use: print to stdout, run jobs to completion
+        # in the calling thread, refuse confirmations and require explicit paths for add up.
+        self.output = print
+        self.job_output = None  # Thread-safe sink for job progress; defaults to output
+        self.run_job = self.run_job_inline
+        self.confirm = lambda title, question: False
+        self.choose_files = None
+        self.on_clear_history = lambda: self.print_to_output("Error: del/code is only available in the terminal window")
+        self.on_exit = self.request_exit
+        self.exit_requested = False
+
+        # Command table: dispatch, help text and completion all come from here
+        self.commands = CommandRegistry()
+        self.register_builtin_commands()
+
+        # Per-command timings, counters and phases for stats, plus the profile on|off toggle
+        self.instrumentation = Instrumentation()
+
+    def print_to_output(self, text):
+        record = self.instrumentation.current()
+        with record.phase("output"):
+            self.output(text)
+        record.add("lines")
+
+    def start_watcher(self):
+        # Folders added or removed later are handed to the running watcher
+        if self.watch_callback is None:
+            return
+        self.watcher = FolderWatcher(self.layout, self.watch_callback)
+        self.watcher.start()
+
+    def job_emitter(self):
+        # Bound when a job is created, so its progress reaches whoever started it
+        return self.job_output or self.print_to_output
+
+    def run_job_inline(self, job):
+        # Runs inside the command, so a command being profiled already covers it
+        try:
+            job.run()
+        except Exception as e:
+            self.print_to_output(f"Error in job #{job.job_id}: {str(e)}")
+        finally:
+            self.job_finished(job.job_id)
+
+    def request_exit(self):
+        self.exit_requested = True
+
+    def take_snapshot(self):
+        # Called at startup, when jobs finish, on close and by the window's timer; the index rate-limits it
+        self.index.snapshot(self.snapshot_interval)
+
+    def close(self, wait_for_jobs=None):
+        if self.watcher is not None:
+            self.watcher.stop()
+            self.watcher.join(1)
+        if self.content_index is not None:
+            self.content_index.stop()
+            self.content_index.join(1)
+        for _, job in self.running_jobs():
+            job.cancel()
+        if wait_for_jobs is not None:
+            wait_for_jobs()
+        if self.http is not None:
+            self.http.close()
+        if self.http_cache is not None:
+            self.http_cache.close()
+        self.take_snapshot()
+        self.index.close()
+
+    def footprint(self, command):
+        # (folders, writes) a command touches, so batch mode can run independent commands at once.
+        # folders is None for every folder, including ones created later in the script. Anything
+        # unrecognised, or with global effects (new fold, drop fold, jobs, stop, cache clear,
+        # del/code, exit), claims every folder for writing and so acts as a barrier.
+        spec, match = self.commands.lookup(command)
+        if spec is None:
+            return None, True
+        folders = {match.group(group) for group in spec.folders if match.group(group)}
+        return folders or None, spec.access == "write"
 
-        self.central_widget.setLayout(self.layout)
+    def register_command(self, usage, summary, pattern, handler, **options):
+        # Entry point for plugins as well as the built-in commands; see Command for the options
+        return self.commands.register(Command(usage, summary, pattern, handler, **options))
 
-        # Load history
-        self.load_history()
+    def register_builtin_commands(self):
+        # Hooks are looked up at call time because front ends replace them after construction
+        register = self.register_command
+        register("sweet fold <folder> in fold <folder>", "List files in a folder",
+                 r"sweet fold (?P<name>.+?) in fold (?P<folder>\S+)",
+                 lambda name, folder: self.list_folder_files(folder), access="read")
+        register("add up [<path> ...] in fold <folder>",
+                 "Upload files to a folder in the background (pick them when no path is given)",
+                 r"add up(?P<paths>(?: .*)?) in fold (?P<folder>\S+)",
+                 lambda paths, folder: self.add_up(folder, shlex.split(paths)))
+        register("add down <filename> in fold <folder>", "Open a file",
+                 r"add down (?P<filename>.+) in fold (?P<folder>\S+)", self.add_down, access="read")
+        register("del <filename|pattern> in fold <folder>", "Delete a file (or every match of e.g. *.tmp)",
+                 r"del (?P<filename>.+) in fold (?P<folder>\S+)", self.del_file)
+        register("move <filename|pattern> to <new_folder> in fold <current_folder>",
+                 "Move a file (or every match of e.g. *.png)",
+                 r"move (?P<filename>.+) to (?P<new_folder>\S+) in fold (?P<current_folder>\S+)",
+                 self.move_file, folders=("current_folder", "new_folder"))
+        register("del/all/in time", "Delete all files in all folders", r"del/all/in time",
+                 self.delete_all_files, folders=())
+        register("del/fold <folder> in time", "Delete all files in a folder",
+                 r"del/fold (?P<folder>\S+) in time", self.delete_folder_files)
+        register("new fold <folder>", "Create a folder (nested like photos/2024)", r"new fold (?P<folder>\S+)",
+                 self.make_folder, folders=())
+        register("drop fold <folder>", "Remove an empty folder", r"drop fold (?P<folder>\S+)", self.remove_folder,
+                 folders=())
+        register("filer chart [types|sizes|top [<N>]|growth|du] [in fold <folder>]",
+                 "Show the folder tree with sizes and file counts, or a breakdown by type, size, largest files, "
+                 "growth over time, or a disk rescan",
+                 r"filer chart(?: (?P<view>types|sizes|top|growth|du))?(?: (?P<limit>[1-9]\d*))?(?: in fold (?P<folder>\S+))?",
+                 self.show_file_chart, access="read", brief="filer chart [view]")
+        register("list", "List all files in all folders", r"list", self.list_files, access="read", folders=())
+        register("search <text|pattern> [size>1MB] [after:YYYY-MM-DD] [ext:png] [in:a]",
+                 "Find files by name or original name", r"search (?P<query>.+)", self.search_file,
+                 access="read", folders=(), brief="search <text|pattern> [filters]")
+        register("boot/<link> [depth <number> [pages <number>]] in fold <folder> [max <number>]",
+                 "Download images from a website",
+                 r"boot/(?P<url>\S+)(?: depth (?P<depth>\d+)(?: pages (?P<max_pages>\d+))?)? in fold (?P<folder>\S+)"
+                 r"(?: max (?P<max_images>\S+))?",
+                 self.boot)
+        register("jobs", "List running uploads and downloads", r"(?:boot/)?jobs", self.list_jobs,
+                 folders=(), keys=("jobs", "boot/"))
+        register("stop <id|all>", "Cancel a running upload or download", r"(?:boot/)?stop(?: (?P<target>.*))?",
+                 lambda target: self.stop_jobs((target or "").strip()), folders=(), keys=("stop", "boot/"))
+        register('sear/("keyword") in fold <folder>', "Search web and save links",
+                 r'sear/\("(?P<keyword>.*)"\) in fold (?P<folder>\S+)', self.search_web)
+        register('look/("words") [in fold <folder>]', "Find lines in saved text files",
+                 r'look/\("(?P<text>.*)"\)(?: in fold (?P<folder>\S+))?', self.look_up, access="read")
+        register("cache stats", "Show HTTP cache hits and misses", r"cache stats",
+                 lambda: self.show_cache("stats"), access="read", folders=())
+        register("cache clear", "Empty the HTTP cache", r"cache clear", lambda: self.show_cache("clear"),
+                 folders=())
+        register("help", "List the available commands", r"help", self.show_help, access="read", folders=())
+        register("stats [<N>]", "Show timings, bytes, files and phases of the last N commands (default 10)",
+                 r"stats(?: (?P<limit>[1-9]\d*))?", self.show_stats, access="read", folders=())
+        register("stats export <path.json|path.csv>", "Save the recorded command stats to a file",
+                 r"stats export (?P<path>.+)", self.export_stats, access="read", folders=())
+        register("stats clear", "Forget the recorded command stats", r"stats clear", self.clear_stats,
+                 folders=())
+        register("profile on", "Run the following commands and their jobs under cProfile", r"profile on",
+                 self.start_profiling, folders=())
+        register("profile off [<path.prof>]", "Stop profiling, show the hottest functions and optionally save them",
+                 r"profile off(?: (?P<path>.+))?", self.stop_profiling, folders=())
+        register("del/code", "Clear command history", r"del/code", lambda: self.on_clear_history(), folders=())
+        register("exit", "Close the terminal", r"exit", lambda: self.on_exit(), folders=())
 
-        # New welcome message
-        self.print_to_output("""
-Hello Neo!!! we can take code
-============================================================
-Available commands:
-  - sweet fold <folder> in fold <folder> : List files in a folder
-  - add up in fold <folder> : Upload a file to a folder
-  - add down <filename> in fold <folder> : Open a file
-  - del <filename> in fold <folder> : Delete a file
-  - move <filename> to <new_folder> in fold <current_folder> : Move a file
-  - del/all/in time : Delete all files in all folders
-  - del/fold <folder> in time : Delete all files in a folder
-  - filer chart : Show file size chart
-  - list : List all files in all folders
-  - search <filename> : Search for a file
-  - boot/<link> in fold <folder> [max <number>] : Download images from a website
-  - sear/("keyword") in fold <folder> : Search web and save links
-  - del/code : Clear command history
-  - exit : Close the terminal
-============================================================
-Type a command below and hit Enter to begin!
-""")
-        self.input_line.setFocus()  # Force focus on input
-        self.activateWindow()  # Ensure window is active
+    def load_plugins(self):
+        # Each <storage>/plugins/*.py defines register(engine) and adds its commands with register_command.
+        # Returns the number of plugins that failed to load.
+        plugin_dir = os.path.join(self.storage_dir, "plugins")
+        failed = 0
+        if not os.path.isdir(plugin_dir):
+            return failed
+        for entry in sorted(os.listdir(plugin_dir)):
+            if not entry.endswith(".py"):
+                continue
+            try:
+                spec = importlib.util.spec_from_file_location(f"neo_terminal_plugin_{entry[:-3]}",
+                                                              os.path.join(plugin_dir, entry))
+                module = importlib.util.module_from_spec(spec)
+                spec.loader.exec_module(module)
+                module.register(self)
+            except Exception as e:
+                failed += 1
+                self.print_to_output(f"Error loading plugin {entry}: {str(e)}")
+        return failed
 
-    def check_password(self):
-        password, ok = QInputDialog.getText(self, "Password", "Enter password:", echo=0)  # Password masking
-        if ok and password == self.password:
-            return True
-        else:
-            QMessageBox.warning(self, "Error", "Incorrect password!")
-            return False
+    def help_text(self):
+        return self.commands.help_text()
 
-    def print_to_output(self, text):
-        try:
-            self.output.append(text)
-            self.output.moveCursor(QTextCursor.End)
-            # Save to history file
-            with open(self.history_file, "a", encoding="utf-8") as f:
-                f.write(text + "\n")
-        except Exception as e:
-            self.output.append(f"Error saving to history: {str(e)}")
+    def show_help(self):
+        self.print_to_output("Available commands:\n" + self.help_text())
 
-    def load_history(self):
-        try:
-            if os.path.exists(self.history_file):
-                with open(self.history_file, "r", encoding="utf-8") as f:
-                    history = f.read()
-                    self.output.append(history.strip())
-                    self.output.moveCursor(QTextCursor.End)
-        except Exception as e:
-            self.output.append(f"Error loading history: {str(e)}")
+    def show_stats(self, limit=None):
+        rows = self.instrumentation.snapshot()
+        if not rows:
+            self.print_to_output("No commands recorded yet.")
+            return
+        lines = [f"Last {min(int(limit or 10), len(rows))} of {len(rows)} command(s):",
+                 f"  {'command':<28} {'time':>9} {'job done':>9} {'in':>9} {'out':>9} {'files':>6}  slowest phase"]
+        for row in rows[-int(limit or 10):]:
+            job = f"{row['job_seconds'] * 1000:.1f}ms" if row["job_seconds"] is not None else "-"
+            slowest = next(iter(row["phases"].items()), None)
+            phase = f"{slowest[0]} {slowest[1] * 1000:.1f}ms" if slowest else "-"
+            lines.append(f"  {row['command'][:28]:<28} {row['seconds'] * 1000:>7.1f}ms {job:>9} "
+                         f"{format_size(row['bytes_in']):>9} {format_size(row['bytes_out']):>9} {row['files']:>6}  {phase}")
+        totals = defaultdict(list)
+        for row in rows:
+            totals[row["name"]].append(max(row["seconds"], row["job_seconds"] or 0))
+        lines.append("By command (including background jobs):")
+        lines.append(f"  {'name':<20} {'runs':>5} {'total':>10} {'mean':>10} {'max':>10}")
+        for name, times in sorted(totals.items(), key=lambda item: -sum(item[1])):
+            lines.append(f"  {name:<20} {len(times):>5} {sum(times) * 1000:>8.1f}ms "
+                         f"{sum(times) / len(times) * 1000:>8.1f}ms {max(times) * 1000:>8.1f}ms")
+        self.print_to_output("\n".join(lines))
 
-    def clear_history(self):
-        reply = QMessageBox.question(self, "Confirm Clear History",
-                                     "Are you sure you want to clear the command history?",
-                                     QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
-        if reply == QMessageBox.Yes:
+    def export_stats(self, path):
+        path = os.path.expanduser(path.strip())
+        count = self.instrumentation.export(path)
+        self.print_to_output(f"Exported stats for {count} command(s) to {path}")
+
+    def clear_stats(self):
+        self.instrumentation.clear()
+        self.print_to_output("Command stats cleared.")
+
+    def start_profiling(self):
+        if self.instrumentation.profiling:
+            self.print_to_output("Profiling is already on.")
+            return
+        self.instrumentation.start_profiling()
+        self.print_to_output("Profiling on: commands and their jobs run under cProfile until 'profile off'.")
+
+    def stop_profiling(self, path=None):
+        # Jobs still running are left out: their profilers are only collected when they finish
+        if not self.instrumentation.profiling:
+            self.print_to_output("Error: Profiling is not on")
+            return
+        stats = self.instrumentation.stop_profiling()
+        if stats is None:
+            self.print_to_output("Profiling off. Nothing ran while it was on.")
+            return
+        if path:
+            path = os.path.expanduser(path.strip())
+            stats.dump_stats(path)
+        report = io.StringIO()
+        stats.stream = report
+        stats.sort_stats("cumulative").print_stats(15)
+        self.print_to_output("Profiling off. Top functions by cumulative time:\n" + report.getvalue().strip())
+        if path:
+            self.print_to_output(f"Saved profile to {path} (open it with python -m pstats or snakeviz)")
+
+    def execute(self, command):
+        # Returns the command's CommandRecord; background jobs keep adding to it after this returns
+        spec, match = self.commands.lookup(command)
+        name = spec.stem.rstrip(" (\"") if spec is not None else "unknown"
+        with self.instrumentation.command(command, name) as record, record.profiled():
             try:
-                # Clear the history file
-                with open(self.history_file, "w", encoding="utf-8") as f:
-                    f.write("")  # Empty the file
-                # Clear the output display
-                self.output.clear()
-                # Reprint welcome message
-                self.print_to_output("""
-Hello Neo!!! we can take code
-============================================================
-Available commands:
-  - sweet fold <folder> in fold <folder> : List files in a folder
-  - add up in fold <folder> : Upload a file to a folder
-  - add down <filename> in fold <folder> : Open a file
-  - del <filename> in fold <folder> : Delete a file
-  - move <filename> to <new_folder> in fold <current_folder> : Move a file
-  - del/all/in time : Delete all files in all folders
-  - del/fold <folder> in time : Delete all files in a folder
-  - filer chart : Show file size chart
-  - list : List all files in all folders
-  - search <filename> : Search for a file
-  - boot/<link> in fold <folder> [max <number>] : Download images from a website
-  - sear/("keyword") in fold <folder> : Search web and save links
-  - del/code : Clear command history
-  - exit : Close the terminal
-============================================================
-Type a command below and hit Enter to begin!
-""")
-                self.print_to_output("Command history cleared successfully.")
-            except PermissionError:
-                self.print_to_output("Error: Permission denied while trying to clear history file. Check file permissions.")
+                if spec is not None:
+                    with record.phase("command"):
+                        spec.handler(**match.groupdict())
+                elif match:
+                    self.print_to_output("Error: Usage: " + " or ".join(candidate.usage for candidate in match))
+                else:
+                    self.print_to_output("Error: Unknown command. Try: " + ", ".join(c.brief for c in self.commands))
             except Exception as e:
-                self.print_to_output(f"Error clearing history: {str(e)}")
-        else:
-            self.print_to_output("Clear history canceled.")
+                self.print_to_output(f"Error: {str(e)}")
+        return record
+
+    def complete(self, text):
+        # Tab completion: (position where the completed word starts, candidates). Command stems come
+        # first, then the word being typed as a folder (after "in fold", "to", "in:") or a stored filename.
+        stems = self.commands.stems(text)
+        if stems:
+            return 0, stems
+        head, _, word = text.rpartition(" ")
+        start = len(head) + 1 if head else 0
+        if not head:
+            return start, []
+        if word.startswith("in:") and text.startswith("search "):
+            return start + 3, [folder + " " for folder in self.folders if folder.startswith(word[3:])]
+        if re.search(r"(?:^sweet fold| in fold|^move .+ to|^del/fold|^new fold|^drop fold)$", head):
+            return start, [folder + " " for folder in self.folders if folder.startswith(word)]
+        if " in fold " in head or head.startswith(("boot/", "sear/", "look/")):
+            return start, []
+        return start, [name + " " for name in self.search_index.complete(word)]
+
+    def http_session(self):
+        with self.network_lock:
+            if self.http is None:
+                self.http = create_http_session(self.http_pool_size, self.http_retries)
+            return self.http
+
+    def host_limiter(self):
+        # One for all crawls, so concurrent crawls of a host share its concurrency and delay
+        with self.network_lock:
+            if self.crawl_limiter is None:
+                self.crawl_limiter = HostLimiter(self.crawl_host_concurrency, self.crawl_host_delay)
+            return self.crawl_limiter
+
+    def response_cache(self):
+        # One for all jobs, so the size cap and cache stats cover every download
+        with self.network_lock:
+            if self.http_cache is None:
+                self.http_cache = HttpCache(os.path.join(self.storage_dir, ".http_cache"), self.http_cache_bytes)
+            return self.http_cache
+
+    def show_cache(self, action):
+        cache = self.response_cache()
+        if action == "clear":
+            cache.clear()
+            self.print_to_output("HTTP cache cleared.")
+            return
+        entries, total, stats = cache.summary()
+        requests_made = stats["hits"] + stats["revalidated"] + stats["misses"] + stats["uncached"]
+        served = stats["hits"] + stats["revalidated"]
+        rate = f"{served / requests_made:.0%}" if requests_made else "n/a"
+        self.print_to_output(f"HTTP cache: {entries} entries, {format_size(total)} of {format_size(cache.max_bytes)}")
+        self.print_to_output(f"This session: {stats['hits']} fresh hits, {stats['revalidated']} revalidated (304), "
+                             f"{stats['misses']} misses, {stats['uncached']} not cacheable (hit rate {rate})")
+        self.print_to_output(f"Downloaded {format_size(stats['bytes_downloaded'])}, "
+                             f"served {format_size(stats['bytes_from_cache'])} from cache")
 
     def search_web(self, keyword, folder):
         if folder not in self.folders:
             self.print_to_output(f"Error: Folder must be one of: {', '.join(self.folders)}")
             return
-        folder_path = os.path.join(self.storage_dir, folder)
         self.print_to_output(f"Searching for \"{keyword}\" and saving links to a text file in '{folder}'...")
         try:
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-            }
             # Use Google search with the keyword
-            search_url = f"https://www.google.com/search?q={quote(keyword)}"
-            response = requests.get(search_url, headers=headers, timeout=10)
-            if response.status_code != 200:
-                self.print_to_output(f"Error: Failed to perform search (Status code: {response.status_code})")
-                return
-
-            soup = BeautifulSoup(response.text, 'html.parser')
+            search_url = self.search_url.format(quote(keyword))
             links = []
-            # Find all links in search results (limit to 10)
-            for a_tag in soup.find_all('a', href=True)[:10]:
-                href = a_tag['href']
-                if href.startswith('/url?q='):
-                    # Extract the actual URL from Google's redirect
-                    link = href.replace('/url?q=', '').split('&')[0]
+
+            def found_link(href):
+                # Extract the actual URL from Google's redirect
+                if href.startswith(google_redirect) and len(links) < 10:
+                    link = href[len(google_redirect):].split('&')[0]
                     if link.startswith('http') and 'google.com' not in link:
                         links.append(link)
 
+            google_redirect = urljoin(search_url, '/url?q=')
+            with self.http_session().get(search_url, stream=True, timeout=self.http_timeout) as response:
+                if response.status_code != 200:
+                    self.print_to_output(f"Error: Failed to perform search (Status code: {response.status_code})")
+                    return
+                # Stops reading as soon as 10 result links have been seen
+                scan_page(response, search_url, on_link=found_link, stop=lambda: len(links) >= 10,
+                          record=self.instrumentation.current())
+
             if not links:
                 self.print_to_output("No relevant links found for the keyword.")
                 return
 
             # Save links to a text file
             filename = f"search_results_{uuid.uuid4()}.txt"
-            file_path = os.path.join(folder_path, filename)
-            with open(file_path, 'w', encoding='utf-8') as f:
+            file_path = self.layout.target(folder, filename)
+            record = self.instrumentation.current()
+            with record.phase("disk"), open(file_path, 'w', encoding='utf-8') as f:
                 f.write(f"Search results for keyword: \"{keyword}\"\n\n")
                 for i, link in enumerate(links, 1):
                     f.write(f"{i}. {link}\n")
+            self.index.add(folder, filename)
+            record.add("files")
+            self.check_layout({folder})
             self.print_to_output(f"Saved {len(links)} links to '{filename}' in '{folder}'")
         except Exception as e:
             self.print_to_output(f"Error during web search: {str(e)}")
 
-    def download_images(self, url, folder, max_images=5):
+    def boot(self, url, folder, depth=None, max_pages=None, max_images=None):
+        depth = int(depth) if depth is not None else None
+        pages = int(max_pages) if max_pages is not None else self.crawl_max_pages
+        if pages <= 0:
+            self.print_to_output("Error: pages <number> must be a positive integer")
+            return
+        limit = 5 if depth is None else self.crawl_max_images  # Default max images
+        if max_images is not None:
+            try:
+                limit = int(max_images)
+            except ValueError:
+                self.print_to_output("Error: max <number> must be a valid integer")
+                return
+            if limit <= 0:
+                self.print_to_output("Error: max <number> must be a positive integer")
+                return
+        if not url.startswith(('http://', 'https://')):
+            url = 'https://' + url
+        self.download_images(url, folder, limit, depth, pages)
+
+    def download_images(self, url, folder, max_images=5, depth=None, max_pages=None):
         if folder not in self.folders:
             self.print_to_output(f"Error: Folder must be one of: {', '.join(self.folders)}")
             return
-        folder_path = os.path.join(self.storage_dir, folder)
-        self.print_to_output(f"Downloading up to {max_images} images from {url} to '{folder}' in the background...")
-        try:
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-            }
-            response = requests.get(url, headers=headers, timeout=10)
-            if response.status_code != 200:
-                self.print_to_output(f"Error: Failed to access {url} (Status code: {response.status_code})")
-                return
+        job_id = self.next_job_id()
+        if depth is None:
+            job = ImageDownloadJob(job_id, url, folder, self.store, max_images, self.download_concurrency,
+                                   self.job_emitter(), self.http_session(), self.http_timeout,
+                                   self.response_cache())
+            self.start_job(job, f"Downloading up to {max_images} images from {url} to '{folder}' in the background...")
+            return
+        job = CrawlJob(job_id, url, folder, self.store, max_images, self.download_concurrency,
+                       self.job_emitter(), self.http_session(), self.http_timeout, self.response_cache(),
+                       depth, self.storage_dir, self.host_limiter(), max_pages or self.crawl_max_pages)
+        self.start_job(job, f"Crawling {url} ({depth} link(s) deep, up to {job.max_pages} pages) for up to "
+                            f"{max_images} images into '{folder}'...")
 
-            soup = BeautifulSoup(response.text, 'html.parser')
-            img_tags = soup.find_all('img')
-            img_urls = []
-            for img in img_tags:
-                src = img.get('src') or img.get('data-src') or img.get('data-srcset') or img.get('data-fallback-src')
-                if src:
-                    # Convert relative URLs to absolute
-                    full_url = urljoin(url, src)
-                    if full_url.endswith(('.jpg', '.jpeg', '.png', '.gif')):
-                        img_urls.append(full_url)
-
-            if not img_urls:
-                self.print_to_output("No supported images (jpg, jpeg, png, gif) found on the website.")
-                return
+    def next_job_id(self):
+        with self.jobs_lock:
+            return next(self.job_ids)
 
-            count = 0
-            for i, img_url in enumerate(img_urls[:max_images], 1):
-                try:
-                    img_response = requests.get(img_url, headers=headers, stream=True, timeout=10)
-                    if img_response.status_code == 200:
-                        filename = f"image_{uuid.uuid4()}{os.path.splitext(img_url)[1]}"
-                        file_path = os.path.join(folder_path, filename)
-                        with open(file_path, 'wb') as f:
-                            for chunk in img_response.iter_content(chunk_size=8192):
-                                f.write(chunk)
-                        self.print_to_output(f"Downloaded '{filename}' to '{folder}'")
-                        count += 1
-                    else:
-                        self.print_to_output(f"Failed to download {img_url} (Status code: {img_response.status_code})")
-                except Exception as e:
-                    self.print_to_output(f"Error downloading {img_url}: {str(e)}")
-            self.print_to_output(f"Completed: {count} images downloaded to '{folder}' without opening the website.")
-        except Exception as e:
-            self.print_to_output(f"Error accessing {url}: {str(e)}")
+    def running_jobs(self):
+        # Snapshot of (job_id, job), safe to walk while other threads start and finish jobs
+        with self.jobs_lock:
+            return list(self.jobs.items())
 
-    def process_command(self):
+    def start_job(self, job, message):
+        with self.jobs_lock:
+            self.jobs[job.job_id] = job
+        job.record = self.instrumentation.current()
+        self.print_to_output(f"[#{job.job_id}] {message}")
+        self.run_job(job)
+
+    def start_bulk_job(self, action, folders, pattern, target=None):
+        job = BulkJob(self.next_job_id(), action, folders, pattern, self.store, self.bulk_concurrency,
+                      self.job_emitter(), target)
+        self.start_job(job, f"Started: {job.describe()}")
+
+    def job_finished(self, job_id):
+        with self.jobs_lock:
+            job = self.jobs.pop(job_id, None)
+        if job is not None:
+            job.record.job_seconds = time.perf_counter() - job.record.clock
+            self.check_layout(self.job_folders(job))
+            self.take_snapshot()
+
+    @staticmethod
+    def job_folders(job):
+        folders = set(getattr(job, "folders", ())) | {getattr(job, "folder", None), getattr(job, "target", None)}
+        folders.discard(None)
+        return folders
+
+    def check_layout(self, folders):
+        # Spread folders that grew past the shard threshold, once no running job is writing to them
+        busy = set()
+        for _, job in self.running_jobs():
+            busy |= self.job_folders(job)
+        for folder in sorted(folders - busy):
+            count = self.index.totals.get(folder, [0, 0])[0]
+            if folder in self.folders and folder not in self.layout.sharded and count > self.layout.shard_threshold:
+                started = time.perf_counter()
+                moved = self.layout.spread(folder)
+                self.print_to_output(f"Folder '{folder}' passed {self.layout.shard_threshold} files; moved {moved} "
+                                     f"into hash-prefix subdirectories in {time.perf_counter() - started:.2f}s")
+
+    def make_folder(self, folder):
+        error = self.layout.check_name(folder)
+        if error:
+            self.print_to_output(f"Error: {error}")
+            return
+        created = self.layout.add(folder)
+        if self.watcher is not None:
+            for path in created:
+                self.watcher.add_folder(path)
+        self.print_to_output(f"Created folder(s): {', '.join(created)}")
+
+    def remove_folder(self, folder):
+        if folder not in self.folders:
+            self.print_to_output(f"Error: Folder must be one of: {', '.join(self.folders)}")
+            return
+        children = self.layout.children(folder)
+        if children:
+            self.print_to_output(f"Error: Folder '{folder}' has subfolders: {', '.join(children)}")
+            return
+        if self.index.totals.get(folder, [0, 0])[0]:
+            self.print_to_output(f"Error: Folder '{folder}' is not empty")
+            return
+        self.layout.remove(folder)
+        if self.watcher is not None:
+            self.watcher.remove_folder(folder)
+        self.print_to_output(f"Removed folder '{folder}'")
+
+    def list_jobs(self):
+        jobs = self.running_jobs()
+        if not jobs:
+            self.print_to_output("No running jobs.")
+            return
+        self.print_to_output("Running jobs:")
+        for job_id, job in jobs:
+            state = " (canceling)" if job.cancel_event.is_set() else ""
+            self.print_to_output(f"  #{job_id}: {job.describe()}{state}")
+
+    def stop_jobs(self, target):
+        if target == "all":
+            jobs = self.running_jobs()
+            if not jobs:
+                self.print_to_output("No running jobs.")
+            for job_id, job in jobs:
+                job.cancel()
+                self.print_to_output(f"Canceling job #{job_id}...")
+            return
         try:
-            command = self.input_line.text().strip()
-            if command:
-                self.print_to_output(f"> {command}")
-                self.input_line.clear()
-                self.input_line.setFocus()  # Ensure focus returns to input
-
-                if command.startswith("sweet fold "):
-                    parts = command.split(" in fold ")
-                    if len(parts) == 2:
-                        folder = parts[1].strip()
-                        self.list_folder_files(folder)
-                    else:
-                        self.print_to_output("Error: Usage: sweet fold <folder> in fold <folder>")
-                elif command.startswith("add up in fold "):
-                    folder = command.split(" in fold ")[1].strip()
-                    self.add_up(folder)
-                elif command.startswith("add down "):
-                    parts = command.split(" in fold ")
-                    if len(parts) == 2:
-                        filename, folder = parts[0].split(" ", 2)[2].strip(), parts[1].strip()
-                        self.add_down(filename, folder)
-                    else:
-                        self.print_to_output("Error: Usage: add down <filename> in fold <folder>")
-                elif command.startswith("del "):
-                    if command.startswith("del/fold "):
-                        parts = command.split(" in time")
-                        if len(parts) == 2:
-                            folder = parts[0].split(" ", 1)[1].strip()
-                            self.delete_folder_files(folder)
-                        else:
-                            self.print_to_output("Error: Usage: del/fold <folder> in time")
-                    elif command == "del/all/in time":
-                        self.delete_all_files()
-                    elif command == "del/code":
-                        self.clear_history()
-                    else:
-                        parts = command.split(" in fold ")
-                        if len(parts) == 2:
-                            filename, folder = parts[0].split(" ", 1)[1].strip(), parts[1].strip()
-                            self.del_file(filename, folder)
-                        else:
-                            self.print_to_output("Error: Usage: del <filename> in fold <folder>")
-                elif command.startswith("move "):
-                    parts = command.split(" in fold ")
-                    if len(parts) == 2:
-                        move_parts = parts[0].split(" to ")
-                        if len(move_parts) == 2:
-                            filename, new_folder = move_parts[0].split(" ", 1)[1].strip(), move_parts[1].strip()
-                            current_folder = parts[1].strip()
-                            self.move_file(filename, current_folder, new_folder)
-                        else:
-                            self.print_to_output(
-                                "Error: Usage: move <filename> to <new_folder> in fold <current_folder>")
-                    else:
-                        self.print_to_output("Error: Usage: move <filename> to <new_folder> in fold <current_folder>")
-                elif command == "filer chart":
-                    self.show_file_chart()
-                elif command == "list":
-                    self.list_files()
-                elif command.startswith("search "):
-                    filename = command.split(" ", 1)[1].strip()
-                    self.search_file(filename)
-                elif command.startswith("boot/") and " in fold " in command:
-                    parts = command.split(" in fold ")
-                    if len(parts) == 2:
-                        boot_parts = parts[1].split(" max ")
-                        folder = boot_parts[0].strip()
-                        max_images = 5  # Default max images
-                        if len(boot_parts) == 2:
-                            try:
-                                max_images = int(boot_parts[1].strip())
-                                if max_images <= 0:
-                                    self.print_to_output("Error: max <number> must be a positive integer")
-                                    return
-                            except ValueError:
-                                self.print_to_output("Error: max <number> must be a valid integer")
-                                return
-                        url = parts[0].replace("boot/", "").strip()
-                        if not url.startswith(('http://', 'https://')):
-                            url = 'https://' + url
-                        self.download_images(url, folder, max_images)
-                    else:
-                        self.print_to_output("Error: Usage: boot/<link> in fold <folder> [max <number>]")
-                elif command.startswith("sear/(\"") and " in fold " in command:
-                    parts = command.split(" in fold ")
-                    if len(parts) == 2:
-                        folder = parts[1].strip()
-                        # Extract keyword between quotes
-                        keyword_part = parts[0].replace("sear/(\"", "").strip()
-                        if keyword_part.endswith("\")"):
-                            keyword = keyword_part[:-2]
-                            self.search_web(keyword, folder)
-                        else:
-                            self.print_to_output("Error: Keyword must be enclosed in quotes, e.g., sear/(\"keyword\")")
-                    else:
-                        self.print_to_output("Error: Usage: sear/(\"keyword\") in fold <folder>")
-                elif command == "exit":
-                    sys.exit()
+            job_id = int(target.lstrip("#"))
+        except ValueError:
+            self.print_to_output("Error: Usage: stop <id|all>")
+            return
+        job = self.jobs.get(job_id)
+        if job is None:
+            self.print_to_output(f"Error: No running job #{job_id}")
+            return
+        job.cancel()
+        self.print_to_output(f"Canceling job #{job_id}...")
+
+    def apply_fs_events(self, events):
+        stale = set()
+        for event in events:
+            if event[0] == "rescan":
+                stale |= self.index.reconcile(self.folders)[2]
+            elif event[0] == "moved" and event[1:3] != event[3:5]:
+                replaced = self.index.rename(*event[1:])
+                if replaced is None:
+                    stale |= self.index.touch(event[3], event[4])
                 else:
-                    self.print_to_output(
-                        "Error: Unknown command. Try: sweet fold <folder> in fold <folder>, add up in fold <folder>, "
-                        "add down <filename> in fold <folder>, del <filename> in fold <folder>, "
-                        "move <filename> to <new_folder> in fold <current_folder>, del/all/in time, "
-                        "del/fold <folder> in time, filer chart, list, search <filename>, boot/<link> in fold <folder> [max <number>], "
-                        "sear/(\"keyword\") in fold <folder>, del/code, exit")
-        except Exception as e:
-            self.print_to_output(f"Error: {str(e)}")
+                    stale |= replaced
+            else:
+                # Also covers deletions, which may just be a file moving into its shard directory
+                self.layout.settle(event[-2], event[-1])
+                stale |= self.index.touch(event[-2], event[-1])
+        self.store.collect(stale)
 
     def list_folder_files(self, folder):
         if folder not in self.folders:
             self.print_to_output(f"Error: Folder must be one of: {', '.join(self.folders)}")
             return
-        folder_path = os.path.join(self.storage_dir, folder)
-        files = os.listdir(folder_path)
+        files = self.index.files(folder)
         if files:
             self.print_to_output(f"Files in {folder}:")
-            for file in files:
+            for _, file, _ in files:
                 self.print_to_output(f"  {file}")
         else:
             self.print_to_output(f"No files in {folder}.")
 
-    def add_up(self, folder):
+    def add_up(self, folder, file_paths=None):
         if folder not in self.folders:
             self.print_to_output(f"Error: Folder must be one of: {', '.join(self.folders)}")
             return
-        file_path, _ = QFileDialog.getOpenFileName(self, "Select File")
-        if file_path:
-            original_ext = os.path.splitext(file_path)[1]
-            random_name = str(uuid.uuid4()) + original_ext
-            dest_path = os.path.join(self.storage_dir, folder, random_name)
-            shutil.copy(file_path, dest_path)
-            self.print_to_output(f"Uploaded file as '{random_name}' to '{folder}'")
+        if not file_paths:
+            if self.choose_files is None:
+                self.print_to_output("Error: Usage: add up <path> [<path> ...] in fold <folder>")
+                return
+            file_paths = self.choose_files()
+        missing = [path for path in file_paths if not os.path.isfile(path)]
+        if missing:
+            self.print_to_output(f"Error: '{missing[0]}' is not a file")
+            return
+        if file_paths:
+            job = UploadJob(self.next_job_id(), file_paths, folder, self.store, self.upload_concurrency,
+                            self.job_emitter())
+            self.start_job(job, f"Uploading {len(file_paths)} file(s) to '{folder}' in the background...")
 
     def add_down(self, filename, folder):
         if folder not in self.folders:
             self.print_to_output(f"Error: Folder must be one of: {', '.join(self.folders)}")
             return
-        file_path = os.path.join(self.storage_dir, folder, filename)
+        file_path = self.layout.path(folder, filename)
         if os.path.exists(file_path):
             try:
                 if platform.system() == "Windows":
@@ -414,25 +3642,28 @@ Type a command below and hit Enter to begin!
         if folder not in self.folders:
             self.print_to_output(f"Error: Folder must be one of: {', '.join(self.folders)}")
             return
-        file_path = os.path.join(self.storage_dir, folder, filename)
+        file_path = self.layout.path(folder, filename)
+        # A name with *, ? or [ in it is a pattern unless a file of exactly that name exists
+        if is_pattern(filename) and not os.path.exists(file_path):
+            if self.confirm("Confirm Delete",
+                            f"Are you sure you want to delete all files matching '{filename}' in folder '{folder}'?"):
+                self.start_bulk_job("delete", [folder], filename)
+            else:
+                self.print_to_output(f"Delete '{filename}' in folder '{folder}' canceled.")
+            return
         if os.path.exists(file_path):
-            os.remove(file_path)
+            record = self.instrumentation.current()
+            with record.phase("disk"):
+                remove_entry(file_path)
+            self.store.release([(folder, filename)])
+            record.add("files")
             self.print_to_output(f"Deleted '{filename}' from '{folder}'")
         else:
             self.print_to_output(f"Error: '{filename}' not found in '{folder}'")
 
     def delete_all_files(self):
-        reply = QMessageBox.question(self, "Confirm Delete",
-                                     "Are you sure you want to delete all files in all folders?",
-                                     QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
-        if reply == QMessageBox.Yes:
-            for folder in self.folders:
-                folder_path = os.path.join(self.storage_dir, folder)
-                for file in os.listdir(folder_path):
-                    file_path = os.path.join(folder_path, file)
-                    if os.path.isfile(file_path):
-                        os.remove(file_path)
-            self.print_to_output("All files deleted from all folders.")
+        if self.confirm("Confirm Delete", "Are you sure you want to delete all files in all folders?"):
+            self.start_bulk_job("delete", list(self.folders), "*")
         else:
             self.print_to_output("Delete all files canceled.")
 
@@ -440,16 +3671,8 @@ Type a command below and hit Enter to begin!
         if folder not in self.folders:
             self.print_to_output(f"Error: Folder must be one of: {', '.join(self.folders)}")
             return
-        reply = QMessageBox.question(self, "Confirm Delete",
-                                     f"Are you sure you want to delete all files in folder '{folder}'?",
-                                     QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
-        if reply == QMessageBox.Yes:
-            folder_path = os.path.join(self.storage_dir, folder)
-            for file in os.listdir(folder_path):
-                file_path = os.path.join(folder_path, file)
-                if os.path.isfile(file_path):
-                    os.remove(file_path)
-            self.print_to_output(f"All files deleted from folder '{folder}'.")
+        if self.confirm("Confirm Delete", f"Are you sure you want to delete all files in folder '{folder}'?"):
+            self.start_bulk_job("delete", [folder], "*")
         else:
             self.print_to_output(f"Delete files in folder '{folder}' canceled.")
 
@@ -457,66 +3680,582 @@ Type a command below and hit Enter to begin!
         if current_folder not in self.folders or new_folder not in self.folders:
             self.print_to_output(f"Error: Folders must be one of: {', '.join(self.folders)}")
             return
-        current_path = os.path.join(self.storage_dir, current_folder, filename)
-        new_path = os.path.join(self.storage_dir, new_folder, filename)
+        current_path = self.layout.path(current_folder, filename)
+        if is_pattern(filename) and not os.path.exists(current_path):
+            if current_folder == new_folder:
+                self.print_to_output("Error: Source and destination folders are the same")
+                return
+            self.start_bulk_job("move", [current_folder], filename, new_folder)
+            return
+        new_path = self.layout.path(new_folder, filename)
         if os.path.exists(current_path):
             if os.path.exists(new_path):
                 self.print_to_output(f"Error: '{filename}' already exists in '{new_folder}'")
                 return
-            shutil.move(current_path, new_path)
+            record = self.instrumentation.current()
+            with record.phase("disk"):
+                shutil.move(current_path, self.layout.target(new_folder, filename))
+            self.index.move(filename, current_folder, new_folder)
+            record.add("files")
             self.print_to_output(f"Moved '{filename}' from '{current_folder}' to '{new_folder}'")
         else:
             self.print_to_output(f"Error: '{filename}' not found in '{current_folder}'")
 
     def list_files(self):
         files_found = False
-        for folder in self.folders:
-            folder_path = os.path.join(self.storage_dir, folder)
-            files = os.listdir(folder_path)
-            if files:
+        current = None
+        record = self.instrumentation.current()
+        with record.phase("index"):
+            rows = self.index.files()
+        record.add("files", len(rows))
+        for folder, file, size in rows:
+            if folder not in self.folders:
+                continue
+            if folder != current:
+                current = folder
                 files_found = True
                 self.print_to_output(f"Files in {folder}:")
-                for file in files:
-                    size = os.path.getsize(os.path.join(folder_path, file)) / 1024  # KB
-                    self.print_to_output(f"  {file} ({size:.2f} KB)")
+            self.print_to_output(f"  {file} ({size / 1024:.2f} KB)")
         if not files_found:
             self.print_to_output("No files found in any folder.")
 
-    def search_file(self, filename):
-        found = False
-        for folder in self.folders:
-            folder_path = os.path.join(self.storage_dir, folder)
-            if filename in os.listdir(folder_path):
-                found = True
-                self.print_to_output(f"Found '{filename}' in folder '{folder}'")
-        if not found:
-            self.print_to_output(f"Error: '{filename}' not found in any folder.")
+    def parse_search(self, query):
+        # Splits "report size>1MB ext:pdf" into the search text and its filters
+        filters = {}
+        words = []
+        units = {"b": 1, "kb": 1024, "mb": 1024 ** 2, "gb": 1024 ** 3}
+        for word in query.split():
+            size = re.fullmatch(r"size([<>])(\d+(?:\.\d+)?)([kmg]?b)?", word, re.IGNORECASE)
+            if size:
+                limit = int(float(size.group(2)) * units[(size.group(3) or "b").lower()])
+                filters["min_size" if size.group(1) == ">" else "max_size"] = limit
+            elif word.startswith(("after:", "before:")):
+                key, value = word.split(":", 1)
+                filters[key] = datetime.strptime(value, "%Y-%m-%d").timestamp()
+            elif word.startswith("ext:"):
+                filters["ext"] = word[4:].lstrip(".").lower()
+            elif word.startswith("in:"):
+                if word[3:] not in self.folders:
+                    raise ValueError(f"Folder '{word[3:]}' does not exist")
+                filters["folder"] = word[3:]
+            else:
+                words.append(word)
+        return " ".join(words), filters
 
-    def show_file_chart(self):
-        total_size = 0
-        folder_sizes = {f: 0 for f in self.folders}
+    def search_file(self, query):
+        try:
+            term, filters = self.parse_search(query)
+        except ValueError as e:
+            self.print_to_output(f"Error: {e}")
+            return
+        started = time.perf_counter()
+        with self.instrumentation.current().phase("search"):
+            matches, total = self.search_index.search(term, filters, self.search_limit)
+        elapsed = (time.perf_counter() - started) * 1000
+        if not matches:
+            self.print_to_output(f"Error: '{query}' not found in any folder.")
+            return
+        for kind, folder, name, original, size, _ in matches:
+            label = f" (original: {original}, {format_size(size)})" if original else f" ({format_size(size)})"
+            if kind != "all":
+                label += f" [{kind}]"
+            self.print_to_output(f"Found '{name}' in folder '{folder}'{label}")
+        if total > len(matches):
+            self.print_to_output(f"... and {total - len(matches)} more")
+        self.print_to_output(f"{total} match(es) in {elapsed:.1f} ms")
 
-        for folder in self.folders:
-            folder_path = os.path.join(self.storage_dir, folder)
-            for root, _, files in os.walk(folder_path):
-                for file in files:
-                    file_path = os.path.join(root, file)
-                    size = os.path.getsize(file_path) / 1024  # KB
-                    folder_sizes[folder] += size
-                    total_size += size
-
-        chart = f"""File Tree:
-mother ({total_size:.2f} KB)
-├── a ({folder_sizes['a']:.2f} KB)
-├── b ({folder_sizes['b']:.2f} KB)
-├── c ({folder_sizes['c']:.2f} KB)
-└── d ({folder_sizes['d']:.2f} KB)
-"""
-        self.print_to_output(chart)
+    def look_up(self, text, folder=None):
+        if self.content_index is None:
+            self.print_to_output("Error: Content search needs SQLite with FTS5 support")
+            return
+        if folder is not None and folder not in self.folders:
+            self.print_to_output(f"Error: Folder must be one of: {', '.join(self.folders)}")
+            return
+        words = text.split()
+        if not words:
+            self.print_to_output("Error: Nothing to look for")
+            return
+        # Scripts wait for pending indexing instead of getting partial results
+        record = self.instrumentation.current()
+        with record.phase("index wait"):
+            self.content_index.idle.wait(self.content_index_wait)
+        started = time.perf_counter()
+        with record.phase("search"):
+            rows, total = self.content_index.search(words, folder, self.search_limit)
+        elapsed = (time.perf_counter() - started) * 1000
+        if self.content_index.busy:
+            self.print_to_output("(Text files are still being indexed; results may be incomplete)")
+        if self.content_index.failures > self.content_index_failures_shown:
+            self.content_index_failures_shown = self.content_index.failures
+            self.print_to_output(f"(Indexing failed for {self.content_index.failures} change(s), results may be "
+                                 f"incomplete; last error: {self.content_index.last_error})")
+        if not rows:
+            self.print_to_output(f"Error: '{text}' not found in any text file.")
+            return
+        for row_folder, name, line, content in rows:
+            self.print_to_output(f"{row_folder}/{name}:{line}: {content.strip()[:200]}")
+        if total > len(rows):
+            self.print_to_output(f"... and {total - len(rows)} more")
+        self.print_to_output(f"{total} matching line(s) in {elapsed:.1f} ms")
+
+    def show_file_chart(self, view=None, limit=None, folder=None):
+        if folder is not None and folder not in self.folders:
+            self.print_to_output(f"Error: Folder must be one of: {', '.join(self.folders)}")
+            return
+        # A folder's views include its subfolders, like du
+        folders = [f for f in self.folders if folder is None or f == folder or f.startswith(folder + "/")]
+        where = f"'{folder}'" if folder else "all folders"
+        with self.instrumentation.current().phase("analytics"):
+            self.show_chart_view(view, limit, folder, folders, where)
+
+    def show_chart_view(self, view, limit, folder, folders, where):
+        if view == "du":
+            job = RescanJob(self.next_job_id(), folders, self.layout, self.index, self.rescan_concurrency,
+                            self.job_emitter())
+            self.start_job(job, f"Rescanning {where} on disk in the background...")
+        elif view == "sizes":
+            self.chart_sizes(folders, where)
+        elif view == "types":
+            self.chart_types(folders, where)
+        elif view == "top":
+            self.chart_top(folders, where, int(limit) if limit else 10)
+        elif view == "growth":
+            self.chart_growth(folders, where, int(limit) if limit else 10)
+        else:
+            self.chart_tree(folders, folder)
+
+    def chart_tree(self, folders, root):
+        counts, sizes = self.storage_stats.counts, self.storage_stats.bytes
+        tree_sizes, tree_counts = Counter(), Counter()
+        for folder in folders:
+            parts = folder.split("/")
+            for depth in range(1, len(parts) + 1):
+                tree_sizes["/".join(parts[:depth])] += sizes[folder]
+                tree_counts["/".join(parts[:depth])] += counts[folder]
+        children = defaultdict(list)
+        for folder in folders:
+            parent = folder.rpartition("/")[0]
+            if folder != root:
+                children[parent if parent in folders else ""].append(folder)
+
+        def label(folder, name):
+            sharded = ", sharded" if folder in self.layout.sharded else ""
+            return f"{name} ({tree_sizes[folder] / 1024:.2f} KB, {tree_counts[folder]} files{sharded})"
+
+        def add_branch(parent, indent):
+            for position, folder in enumerate(children[parent]):
+                last = position == len(children[parent]) - 1
+                lines.append(f"{indent}{'└── ' if last else '├── '}{label(folder, folder[len(parent) + 1:])}")
+                add_branch(folder, indent + ("    " if last else "│   "))
+
+        if root is None:
+            total = f"{sum(sizes[f] for f in folders) / 1024:.2f} KB, {sum(counts[f] for f in folders)} files"
+            lines = ["File Tree:", f"mother ({total})"]
+            # Top-level folders (and folders whose parent isn't configured) keep their full name
+            for position, folder in enumerate(children[""]):
+                last = position == len(children[""]) - 1
+                lines.append(f"{'└── ' if last else '├── '}{label(folder, folder)}")
+                add_branch(folder, "    " if last else "│   ")
+        else:
+            lines = ["File Tree:", label(root, root)]
+            add_branch(root, "")
+        self.print_to_output("\n".join(lines) + "\n")
+
+    def chart_sizes(self, folders, where):
+        histogram = self.storage_stats.histogram(folders)
+        limits = [0] + StorageStats.BUCKET_LIMITS
+        labels = [f"{format_size(low)} - {format_size(high)}" for low, high in zip(limits, limits[1:])]
+        labels.append(f"{format_size(limits[-1])} and up")
+        widest = max(histogram) or 1
+        self.print_to_output(f"File sizes in {where} ({sum(histogram)} files):")
+        for label, count in zip(labels, histogram):
+            self.print_to_output(f"  {label:<22} {count:>8} {'█' * round(30 * count / widest)}")
+
+    def chart_types(self, folders, where):
+        rows = self.storage_stats.breakdown(folders)
+        if not rows:
+            self.print_to_output(f"No files in {where}.")
+            return
+        total = sum(size for _, _, size in rows) or 1
+        self.print_to_output(f"File types in {where}:")
+        for extension, count, size in rows[:self.search_limit]:
+            self.print_to_output(f"  {extension:<10} {count:>8} files {format_size(size):>12} {size * 100 / total:5.1f}%")
+        if len(rows) > self.search_limit:
+            rest = rows[self.search_limit:]
+            self.print_to_output(f"  ... and {len(rest)} more types ({sum(count for _, count, _ in rest)} files)")
+
+    def chart_top(self, folders, where, limit):
+        rows = self.storage_stats.largest(limit, folders)
+        if not rows:
+            self.print_to_output(f"No files in {where}.")
+            return
+        self.print_to_output(f"Largest {len(rows)} file(s) in {where}:")
+        for size, folder, name in rows:
+            self.print_to_output(f"  {format_size(size):>12}  {folder}/{name}")
+
+    def chart_growth(self, folders, where, limit):
+        rows = self.index.snapshots(folders, limit)
+        self.print_to_output(f"Growth of {where} (a snapshot at most every {self.snapshot_interval // 60} minutes):")
+        rows.append((None, sum(self.storage_stats.counts[f] for f in folders),
+                     sum(self.storage_stats.bytes[f] for f in folders)))
+        previous = None
+        for taken, count, size in rows:
+            when = datetime.fromtimestamp(taken).strftime("%Y-%m-%d %H:%M") if taken else "now"
+            change = ""
+            if previous is not None:
+                sign = "+" if size >= previous[1] else "-"
+                change = f"  ({count - previous[0]:+d} files, {sign}{format_size(abs(size - previous[1]))})"
+            self.print_to_output(f"  {when:<16}  {count:>8} files {format_size(size):>12}{change}")
+            previous = (count, size)
+
+
+class BatchRunner:
+    # Runs a script of commands headless. With parallel > 1, commands whose footprints don't
+    # conflict run at the same time; output is still printed in script order, as plain text
+    # ("> command" then its lines, like the window) or as one JSON object per command.
+    JOB_PREFIX = re.compile(r"\[#\d+\] ")
+
+    def __init__(self, engine, parallel=1, json_lines=False, stream=None):
+        self.engine = engine
+        self.parallel = max(1, parallel)
+        self.json_lines = json_lines
+        self.stream = stream or sys.stdout
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.outputs = []  # Lines printed by each command
+        self.records = []  # JSON line per finished command
+        self.done = []  # Per command: None while running, then whether it finished without errors
+        self.next_index = 0  # First command whose output hasn't been printed in full
+        engine.output = self.emit
+        engine.job_output = None
+        engine.job_emitter = lambda: functools.partial(self.emit_for, self.local.index)
+
+    def emit(self, text):
+        self.emit_for(self.local.index, text)
+
+    def emit_for(self, index, text):
+        with self.lock:
+            self.outputs[index].append(text)
+            if index == self.next_index and not self.json_lines:
+                # The oldest unfinished command streams straight through
+                self.stream.write(text + "\n")
+                self.stream.flush()
+
+    def run(self, lines):
+        # Returns a process exit status: 0 when no command reported an error
+        commands = [line.strip() for line in lines]
+        commands = [command for command in commands if command and not command.startswith("#")]
+        self.outputs = [[] for _ in commands]
+        self.records = [None] * len(commands)
+        self.done = [None] * len(commands)
+        barrier = None  # Future of the last command writing every folder; everything after waits for it
+        last_write = {}  # folder -> future of the last command writing it since the barrier
+        reads = defaultdict(list)  # folder -> futures reading it since that write
+        reads_all = []  # Futures reading every folder since the barrier
+        with ThreadPoolExecutor(max_workers=self.parallel) as executor:
+            for index, command in enumerate(commands):
+                folders, writes = self.engine.footprint(command)
+                after = [barrier] if barrier is not None else []
+                if folders is None:
+                    after += last_write.values()
+                    if writes:
+                        after += [future for futures in reads.values() for future in futures] + reads_all
+                else:
+                    after += [last_write[folder] for folder in folders if folder in last_write]
+                    if writes:
+                        after += [future for folder in folders for future in reads.pop(folder, ())] + reads_all
+                future = executor.submit(self.run_command, index, command, after)
+                if folders is None and writes:
+                    barrier = future
+                    last_write, reads, reads_all = {}, defaultdict(list), []
+                elif folders is None:
+                    reads_all.append(future)
+                else:
+                    for folder in folders:
+                        if writes:
+                            last_write[folder] = future
+                        else:
+                            reads[folder].append(future)
+        return 0 if all(self.done) else 1
+
+    def run_command(self, index, command, after):
+        for future in after:
+            try:
+                future.result()
+            except Exception:
+                pass  # Its own command already reported the failure; this one still runs
+        self.local.index = index
+        if not self.json_lines:
+            self.emit(f"> {command}")
+        started = time.perf_counter()
+        record = None
+        try:
+            if self.engine.exit_requested:
+                self.emit("Skipped: exit was requested earlier in the script")
+            else:
+                record = self.engine.execute(command)
+        except Exception as e:
+            self.emit(f"Error: {str(e)}")
+        finally:
+            # Always mark the command done, or ordered output would stall behind it
+            self.finish(index, command, record, time.perf_counter() - started)
+
+    def finish(self, index, command, record, elapsed):
+        with self.lock:
+            output = self.outputs[index] if self.json_lines else self.outputs[index][1:]
+            # Jobs prefix their lines with "[#n] ", errors included
+            ok = not any(self.JOB_PREFIX.sub("", line, count=1).startswith("Error") for line in output)
+            counters = record.as_dict() if record is not None else {}
+            self.records[index] = json.dumps({"line": index + 1, "command": command, "ok": ok,
+                                              "seconds": round(elapsed, 3), "output": output,
+                                              **{key: counters[key] for key in ("bytes_in", "bytes_out", "files",
+                                                                                "phases") if key in counters}})
+            self.done[index] = ok
+            # Move the head past every finished command, printing what they buffered meanwhile
+            while self.next_index < len(self.done) and self.done[self.next_index] is not None:
+                if self.json_lines:
+                    self.stream.write(self.records[self.next_index] + "\n")
+                self.next_index += 1
+                if not self.json_lines and self.next_index < len(self.done) and self.outputs[self.next_index]:
+                    self.stream.write("\n".join(self.outputs[self.next_index]) + "\n")
+            self.stream.flush()
+
+
+class CommandLine(QLineEdit):
+    # Input line that hands Tab to the completer instead of moving focus
+    tab_pressed = pyqtSignal()
+
+    def event(self, event):
+        if event.type() == QEvent.KeyPress and event.key() == Qt.Key_Tab:
+            self.tab_pressed.emit()
+            return True
+        return super().event(event)
+
+
+class TerminalFileApp(QMainWindow):
+    def __init__(self, storage_dir=None):
+        super().__init__()
+        self.setWindowTitle("File Storage Terminal")
+        self.setGeometry(100, 100, 800, 600)
+
+        # Password check
+        self.password = PASSWORD
+        if not self.check_password():
+            sys.exit()
+
+        # Command logic lives in the engine; this window is its terminal front end.
+        # Watcher events are handed to the GUI thread before they touch the index.
+        self.watch_signals = WorkerSignals()
+        self.engine = TerminalEngine(storage_dir, watch_callback=self.watch_signals.fs_events.emit)
+        self.watch_signals.fs_events.connect(self.engine.apply_fs_events)
+        self.storage_dir = self.engine.storage_dir
+
+        # History file
+        self.history_file = os.path.join(self.storage_dir, "history.log")
+        self.history = HistoryWriter(self.history_file)
+        self.history_reader = HistoryReader(self.history)
+        self.history_load_bytes = 256 * 1024  # How much of the log is shown at startup
+        self.history_page_bytes = 64 * 1024  # Read per scroll-up once the top is reached
+        self.history_loaded = False
+        self.history_mark = None  # Reader position before the history currently scrolled in
+        self.scrollback_lines = 10000  # Older lines drop off the top of the output
+
+        # Background jobs run on a thread pool and report back through signals
+        self.thread_pool = QThreadPool()
+        self.job_signals = WorkerSignals()
+        self.job_signals.message.connect(self.print_to_output)
+        self.job_signals.finished.connect(self.engine.job_finished)
+        self.engine.output = self.print_to_output
+        self.engine.job_output = self.job_signals.message.emit
+        self.engine.run_job = lambda job: self.thread_pool.start(JobRunnable(job, self.job_signals))
+        self.engine.confirm = self.confirm
+        self.engine.choose_files = lambda: QFileDialog.getOpenFileNames(self, "Select Files")[0]
+        self.engine.on_clear_history = self.clear_history
+        self.engine.on_exit = self.exit_terminal
+
+        # Setup UI to look like a terminal
+        self.central_widget = QWidget()
+        self.setCentralWidget(self.central_widget)
+        self.layout = QVBoxLayout()
+
+        # Output area (read-only)
+        self.output = OutputConsole(self.scrollback_lines)
+        self.output.setFont(QFont("Courier New", 12))  # DOS-like font
+        self.output.setStyleSheet("background-color: #000000; color: #00FF00; border: none;")
+        palette = self.output.palette()
+        palette.setColor(QPalette.Text, QColor("#00FF00"))
+        palette.setColor(QPalette.Base, QColor("#000000"))
+        self.output.setPalette(palette)
+        self.output.scrolled_to_top.connect(self.load_older_history)
+        self.output.history_released.connect(lambda: self.history_reader.restore(self.history_mark))
+        self.layout.addWidget(self.output)
+
+        # Input line
+        self.input_line = CommandLine()
+        self.input_line.setFont(QFont("Courier New", 12))  # DOS-like font
+        self.input_line.setStyleSheet(
+            "background-color: #000000; color: #00FF00; border: 1px solid #555555; padding: 5px;")
+        self.input_line.returnPressed.connect(self.process_command)
+        self.input_line.tab_pressed.connect(self.complete_command)
+        self.input_line.setFocusPolicy(Qt.StrongFocus)
+        self.layout.addWidget(self.input_line)
+
+        self.central_widget.setLayout(self.layout)
+
+        # Load history
+        self.load_history()
+        self.history_timer = QTimer(self)
+        self.history_timer.timeout.connect(self.flush_history)
+        self.history_timer.start(1000)
+        self.snapshot_timer = QTimer(self)
+        self.snapshot_timer.timeout.connect(self.engine.take_snapshot)
+        self.snapshot_timer.start(10 * 60 * 1000)  # Growth snapshots while the window stays open
+
+        # New welcome message, then any plugin commands (their load errors show up below it)
+        self.print_to_output(self.welcome())
+        self.engine.load_plugins()
+        self.input_line.setFocus()  # Force focus on input
+        self.activateWindow()  # Ensure window is active
+
+    def welcome(self):
+        return WELCOME.format(commands=self.engine.help_text())
+
+    def check_password(self):
+        password, ok = QInputDialog.getText(self, "Password", "Enter password:", echo=0)  # Password masking
+        if ok and password == self.password:
+            return True
+        else:
+            QMessageBox.warning(self, "Error", "Incorrect password!")
+            return False
+
+    def print_to_output(self, text):
+        try:
+            self.output.append(text)
+            # Save to history file (buffered, flushed in batches)
+            self.history.write(text)
+        except Exception as e:
+            self.output.append(f"Error saving to history: {str(e)}")
+
+    def flush_history(self):
+        try:
+            self.history.flush()
+        except Exception as e:
+            self.output.append(f"Error saving to history: {str(e)}")
+
+    def load_history(self):
+        try:
+            history = self.history_reader.read_previous(self.history_load_bytes)
+            if history:
+                self.output.append(history.strip())
+        except Exception as e:
+            self.output.append(f"Error loading history: {str(e)}")
+        self.history_loaded = True
+
+    def load_older_history(self):
+        if not self.history_loaded or self.history_reader.exhausted or self.output.output_model.history_full():
+            return
+        if not self.output.output_model.extra:
+            self.history_mark = self.history_reader.mark()
+        try:
+            history = self.history_reader.read_previous(self.history_page_bytes).rstrip("\n")
+        except Exception as e:
+            self.output.append(f"Error loading history: {str(e)}")
+            return
+        if history:
+            self.output.prepend(history)
+
+    def confirm(self, title, question):
+        reply = QMessageBox.question(self, title, question, QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
+        return reply == QMessageBox.Yes
+
+    def exit_terminal(self):
+        self.flush_history()
+        sys.exit()
+
+    def clear_history(self):
+        if self.confirm("Confirm Clear History", "Are you sure you want to clear the command history?"):
+            try:
+                # Clear the history file and its rotated backups
+                self.history.clear()
+                self.history_reader.reset()
+                # Clear the output display
+                self.output.clear()
+                # Reprint welcome message
+                self.print_to_output(self.welcome())
+                self.print_to_output("Command history cleared successfully.")
+            except PermissionError:
+                self.print_to_output("Error: Permission denied while trying to clear history file. Check file permissions.")
+            except Exception as e:
+                self.print_to_output(f"Error clearing history: {str(e)}")
+        else:
+            self.print_to_output("Clear history canceled.")
+
+    def closeEvent(self, event):
+        self.flush_history()
+        self.engine.close(lambda: self.thread_pool.waitForDone(5000))
+        super().closeEvent(event)
+
+    def complete_command(self):
+        text = self.input_line.text()
+        start, candidates = self.engine.complete(text)
+        if not candidates:
+            return
+        common = os.path.commonprefix(candidates)
+        if len(common) > len(text) - start:
+            self.input_line.setText(text[:start] + common)
+        elif len(candidates) > 1:
+            # Nothing left to fill in; show the choices without adding them to the history
+            shown = "  ".join(candidate.strip() for candidate in candidates[:50])
+            more = f"  ... and {len(candidates) - 50} more" if len(candidates) > 50 else ""
+            self.output.append(shown + more)
+
+    def process_command(self):
+        command = self.input_line.text().strip()
+        if command:
+            self.print_to_output(f"> {command}")
+            self.input_line.clear()
+            self.input_line.setFocus()  # Ensure focus returns to input
+            self.engine.execute(command)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="File storage terminal. Without a script it opens the window.")
+    parser.add_argument("script", nargs="?", help="run the commands in this file ('-' for stdin) without the window")
+    parser.add_argument("--parallel", type=int, default=1, metavar="N",
+                        help="run up to N commands at once when they touch different folders")
+    parser.add_argument("--json", action="store_true", help="print one JSON object per command")
+    parser.add_argument("--yes", action="store_true", help="answer yes to delete confirmations")
+    parser.add_argument("--storage", help="storage directory (default ~/Documents/MyFiles)")
+    args, qt_args = parser.parse_known_args(argv)
+
+    if args.script is None:
+        app = QApplication(sys.argv[:1] + qt_args)
+        window = TerminalFileApp(args.storage)
+        window.show()
+        return app.exec_()
+
+    # Headless: no window, no dialogs; the password comes from the environment instead
+    if os.environ.get("NEO_TERMINAL_PASSWORD") != PASSWORD:
+        print("Error: Incorrect password! Set NEO_TERMINAL_PASSWORD to run scripts.", file=sys.stderr)
+        return 2
+    engine = TerminalEngine(args.storage)
+    engine.confirm = lambda title, question: args.yes
+    # Before the runner takes over the output: plugin errors belong to no command, so they go to
+    # stderr rather than into the script's output, and fail the run like a failed command
+    engine.output = lambda text: print(text, file=sys.stderr)
+    plugins_failed = engine.load_plugins()
+    engine.content_index_wait = 60
+    runner = BatchRunner(engine, args.parallel, args.json)
+    try:
+        if args.script == "-":
+            status = runner.run(sys.stdin)
+        else:
+            with open(args.script, encoding="utf-8") as f:
+                status = runner.run(f)
+        return status or int(plugins_failed > 0)
+    finally:
+        engine.close()
 
 
 if __name__ == '__main__':
-    app = QApplication(sys.argv)
-    window = TerminalFileApp()
-    window.show()
-    sys.exit(app.exec_())
\ No newline at end of file
+    sys.exit(main())
@@ -0,0 +1,123 @@
+# Per-command timings from the engine's own instrumentation (the data behind the stats command).
+# Builds a synthetic storage tree from a fixed seed (files of random sizes and types spread over the
+# folders, plus text files for look/), starts a local stand-in HTTP server for boot/ and sear/, runs a
+# fixed command mix through a headless TerminalEngine and reports wall time, bytes, files and the
+# phase breakdown per command. Pass a .json or .csv path to also export every command's record.
+#
+#   python benchmarks/bench_commands.py [files] [repeats] [export.json|export.csv]
+import os
+import sys
+import random
+import tempfile
+import threading
+from collections import defaultdict
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+from Neo_Trm import TerminalEngine, format_size
+
+SEED = 20240501
+EXTENSIONS = ["png", "jpg", "pdf", "txt", "zip", "mp3", "tmp"]
+WORDS = ["alpha", "bravo", "charlie", "delta", "echo", "foxtrot", "golf", "hotel", "india", "juliet"]
+IMAGES = 40
+IMAGE = b"\x89PNG" + bytes(range(256)) * 64  # 16 KB
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        if self.path.startswith("/gallery"):
+            body = ("<html><body>" + "".join(f"<a href='/photo/{i}'><img src='/img/{i}.png' alt='{i}'></a>"
+                                             for i in range(IMAGES)) + "</body></html>").encode()
+            content_type = "text/html; charset=utf-8"
+        elif self.path.startswith("/search"):
+            body = ("<html><body>" + "".join(f"<a href='/url?q=https://example{i}.com/&sa=U'>Result {i}</a>"
+                                             for i in range(20)) + "</body></html>").encode()
+            content_type = "text/html; charset=utf-8"
+        elif self.path.startswith("/img/"):
+            body = IMAGE + self.path.encode()  # Distinct bytes per image, so deduplication doesn't skip them
+            content_type = "image/png"
+        else:
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Cache-Control", "no-store")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def build_tree(storage_dir, count, rng):
+    # Random sizes skewed small, like a real archive: mostly KBs with a few MB-sized files
+    for folder in ["a", "b", "c", "d"]:
+        os.makedirs(os.path.join(storage_dir, folder), exist_ok=True)
+    for i in range(count):
+        folder = rng.choice("abcd")
+        extension = rng.choice(EXTENSIONS)
+        path = os.path.join(storage_dir, folder, f"file_{i:06d}.{extension}")
+        with open(path, "w" if extension == "txt" else "wb") as f:
+            if extension == "txt":
+                f.write("\n".join(" ".join(rng.choices(WORDS, k=8)) for _ in range(rng.randint(5, 50))) + "\n")
+            else:
+                f.write(b"\0" * min(int(rng.lognormvariate(8, 2)), 4 * 1024 * 1024))
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    export = sys.argv[3] if len(sys.argv) > 3 else None
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StandInHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+
+    storage_dir = tempfile.mkdtemp()
+    build_tree(storage_dir, count, random.Random(SEED))
+    engine = TerminalEngine(storage_dir)
+    engine.output = lambda text: None
+    engine.confirm = lambda title, question: True
+    engine.content_index_wait = 600
+    engine.search_url = base + "/search?q={}"
+    print(f"{count} synthetic files in {storage_dir}, {len(engine.index.files())} indexed")
+
+    commands = ["list", "search file_0012", "search *.pdf size>10KB", "search fil_00123",
+                'look/("alpha bravo")', 'look/("golf") in fold c',
+                "filer chart", "filer chart types", "filer chart sizes", "filer chart top 20", "filer chart du",
+                f"boot/{base}/gallery in fold d max {IMAGES}", 'sear/("benchmark") in fold d',
+                "move *.tmp to b in fold a", "move *.tmp to a in fold b"]
+    for _ in range(repeats):
+        for command in commands:
+            engine.execute(command)
+
+    runs = defaultdict(list)
+    for row in engine.instrumentation.snapshot():
+        runs[row["command"]].append(row)
+    # Counters are the largest over the repeats: repeated boot/ runs are deduplicated and store nothing
+    print(f"{'command':<44} {'mean':>9} {'max':>9} {'in':>9} {'out':>9} {'files':>7}  phases (mean)")
+    for command, rows in runs.items():
+        times = [max(row["seconds"], row["job_seconds"] or 0) for row in rows]
+        phases = defaultdict(float)
+        for row in rows:
+            for phase, seconds in row["phases"].items():
+                phases[phase] += seconds / len(rows)
+        top = ", ".join(f"{phase} {seconds * 1000:.1f}ms"
+                        for phase, seconds in sorted(phases.items(), key=lambda item: -item[1])[:3])
+        print(f"{command[:44]:<44} {sum(times) / len(times) * 1000:>7.1f}ms {max(times) * 1000:>7.1f}ms "
+              f"{format_size(max(row['bytes_in'] for row in rows)):>9} "
+              f"{format_size(max(row['bytes_out'] for row in rows)):>9} {max(row['files'] for row in rows):>7}  {top}")
+    if export:
+        print(f"Exported {engine.instrumentation.export(export)} records to {export}")
+    engine.close()
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+# Image/link extraction from large gallery pages: the old full BeautifulSoup parse of response.text
+# against the streaming PageScanner used by boot/ and sear/ (html.parser, and lxml when installed).
+# Writes HTML fixtures of the given sizes to a temp dir and runs each parser in a fresh interpreter,
+# reporting total time, time until the first image URL is known, and peak RSS growth over the baseline.
+#
+#   python benchmarks/bench_html_extract.py [fixture MB ...]
+import os
+import sys
+import tempfile
+import subprocess
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = r"""
+import sys
+import time
+import resource
+sys.path.insert(0, sys.argv[1])
+method, path = sys.argv[2], sys.argv[3]
+if method == "stream-html.parser":
+    sys.modules["lxml"] = None  # Force the stdlib fallback
+import Neo_Trm
+if method == "bs4":
+    from bs4 import BeautifulSoup
+elif method == "stream-lxml":
+    import lxml.etree
+
+
+class FileResponse:
+    # Stands in for a streamed requests response
+    headers = {"Content-Type": "text/html; charset=utf-8"}
+
+    def __init__(self, path):
+        self.path = path
+
+    def iter_content(self, chunk_size):
+        with open(self.path, "rb") as f:
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+
+    @property
+    def text(self):
+        with open(self.path, "rb") as f:
+            return f.read().decode("utf-8")
+
+
+baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+first = []
+start = time.perf_counter()
+if method == "bs4":
+    # The old path: whole body as text, full document tree, then find_all
+    soup = BeautifulSoup(FileResponse(path).text, "html.parser")
+    images = dict.fromkeys(img.get("src") for img in soup.find_all("img") if img.get("src"))
+    links = dict.fromkeys(a["href"] for a in soup.find_all("a", href=True))
+    first.append(time.perf_counter())
+else:
+    scanner = Neo_Trm.scan_page(FileResponse(path), "https://example.com/gallery/",
+                                on_image=lambda url: first or first.append(time.perf_counter()))
+    images, links = scanner.images, scanner.links
+elapsed = time.perf_counter() - start
+peak = (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - baseline) / 1024
+print(f"{method:<20} {elapsed:7.2f}s  first image {first[0] - start:7.3f}s  "
+      f"peak +{peak:7.1f} MB  {len(images)} images, {len(links)} links")
+"""
+
+
+def write_fixture(path, megabytes):
+    # A gallery page: thumbnails with srcset, <picture> blocks and links to full-size images and other pages
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("<!DOCTYPE html><html><head><title>Gallery</title></head><body><div class='grid'>\n")
+        item = 0
+        while f.tell() < megabytes * 1024 * 1024:
+            f.write(f"<div class='card' data-id='{item}'><a href='/photo/{item}'>"
+                    f"<img src='/thumbs/{item}.jpg' srcset='/thumbs/{item}.jpg 1x, /thumbs/{item}@2x.jpg 2x' "
+                    f"alt='Photo number {item} from the archive' loading='lazy'></a>"
+                    f"<picture><source srcset='/full/{item}.webp 1600w, /mid/{item}.webp 800w'>"
+                    f"<img src='/full/{item}.jpg'></picture>"
+                    f"<p class='caption'>Caption text for photo {item}, with a <a href='/tag/{item % 97}'>tag</a>."
+                    f"</p></div>\n")
+            item += 1
+        f.write("</div></body></html>\n")
+
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or [5, 25]
+    methods = []
+    try:
+        import bs4  # noqa: F401
+        methods.append("bs4")
+    except ImportError:
+        print("bs4 not installed; skipping bs4")
+    methods.append("stream-html.parser")
+    try:
+        import lxml  # noqa: F401
+        methods.append("stream-lxml")
+    except ImportError:
+        print("lxml not installed; skipping stream-lxml")
+    fixtures = tempfile.mkdtemp()
+    for megabytes in sizes:
+        path = os.path.join(fixtures, f"gallery_{megabytes}mb.html")
+        write_fixture(path, megabytes)
+        print(f"{os.path.basename(path)}: {os.path.getsize(path) / (1024 * 1024):.1f} MB")
+        for method in methods:
+            result = subprocess.run([sys.executable, "-c", CHILD, REPO, method, path], capture_output=True, text=True,
+                                    env=dict(os.environ, QT_QPA_PLATFORM=os.environ.get("QT_QPA_PLATFORM", "offscreen")))
+            print(f"  {result.stdout.strip() or result.stderr.strip()}")
+
+
+if __name__ == '__main__':
+    main()
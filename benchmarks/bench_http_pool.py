@@ -0,0 +1,72 @@
+# Compares bare requests.get calls against the shared pooled session used by boot/ and sear/.
+# Runs against a local keep-alive HTTP server, so it measures connection setup overhead only.
+#
+#   python benchmarks/bench_http_pool.py [requests] [threads]
+import os
+import sys
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from Neo_Trm import create_http_session, HEADERS, HTTP_TIMEOUT
+
+PAYLOAD = b"\x89PNG" + os.urandom(16 * 1024)
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-alive, like a real CDN
+    disable_nagle_algorithm = True  # Otherwise delayed ACKs dominate keep-alive timings
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "image/png")
+        self.send_header("Content-Length", str(len(PAYLOAD)))
+        self.end_headers()
+        self.wfile.write(PAYLOAD)
+
+    def log_message(self, *args):
+        pass
+
+
+def run(fetch, urls, threads):
+    start = time.perf_counter()
+    if threads == 1:
+        for url in urls:
+            fetch(url)
+    else:
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            list(executor.map(fetch, urls))
+    return time.perf_counter() - start
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    threads = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StandInHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    urls = [f"{base}/img/{i}.png" for i in range(count)]
+
+    def unpooled(url):
+        return requests.get(url, headers=HEADERS, timeout=HTTP_TIMEOUT).content
+
+    session = create_http_session(pool_size=max(threads, 16))
+
+    def pooled(url):
+        return session.get(url, timeout=HTTP_TIMEOUT).content
+
+    print(f"{count} requests of {len(PAYLOAD) // 1024} KB against {base}")
+    for workers in (1, threads):
+        for name, fetch in (("unpooled", unpooled), ("pooled", pooled)):
+            elapsed = run(fetch, urls, workers)
+            print(f"  {name:<9} threads={workers:<3} {elapsed:7.3f}s  {count / elapsed:8.1f} req/s")
+    session.close()
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+# Time-to-first-prompt with a large history.log.
+# Builds a throwaway HOME with a history file of the given size, starts the app in a fresh interpreter
+# (offscreen, password check bypassed) and reports the time until the event loop is idle with the prompt shown.
+# For comparison it also times the old behaviour of appending the whole log to a QTextEdit.
+#
+#   python benchmarks/bench_startup.py [history MB]
+import os
+import sys
+import tempfile
+import subprocess
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = r"""
+import time
+start = time.perf_counter()
+import sys
+sys.path.insert(0, sys.argv[1])
+import Neo_Trm
+from PyQt5.QtWidgets import QApplication
+from PyQt5.QtCore import QTimer
+imported = time.perf_counter()
+Neo_Trm.TerminalFileApp.check_password = lambda self: True
+app = QApplication(sys.argv)
+window = Neo_Trm.TerminalFileApp()
+window.show()
+
+def ready():
+    done = time.perf_counter()
+    heavy = [name for name in ("requests", "bs4", "urllib3") if name in sys.modules]
+    print(f"imports {imported - start:.3f}s  first prompt {done - start:.3f}s  "
+          f"network modules loaded: {', '.join(heavy) or 'none'}")
+    window.close()
+    app.quit()
+
+QTimer.singleShot(0, ready)
+app.exec_()
+"""
+
+FULL_LOAD = r"""
+import sys
+import time
+from PyQt5.QtWidgets import QApplication, QTextEdit
+app = QApplication(sys.argv)
+output = QTextEdit()
+start = time.perf_counter()
+with open(sys.argv[1], "r", encoding="utf-8") as f:
+    output.append(f.read().strip())
+print(f"old full-history load {time.perf_counter() - start:.3f}s")
+"""
+
+
+def write_history(path, megabytes):
+    line = "> list\n  image_12345678-1234-1234-1234-1234567890ab.png (12.34 KB)\n"
+    block = line * 2048
+    with open(path, "w", encoding="utf-8") as f:
+        written = 0
+        while written < megabytes * 1024 * 1024:
+            f.write(block)
+            written += len(block)
+
+
+def main():
+    megabytes = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    home = tempfile.mkdtemp()
+    storage = os.path.join(home, "Documents", "MyFiles")
+    os.makedirs(storage)
+    history = os.path.join(storage, "history.log")
+    env = dict(os.environ, HOME=home, QT_QPA_PLATFORM=os.environ.get("QT_QPA_PLATFORM", "offscreen"))
+    write_history(history, megabytes)
+    print(f"history.log: {os.path.getsize(history) / (1024 * 1024):.1f} MB")
+    result = subprocess.run([sys.executable, "-c", FULL_LOAD, history], env=env, capture_output=True, text=True)
+    print(f"  {result.stdout.strip() or result.stderr.strip()}")
+    for run in range(3):
+        # The app rotates an oversized log on its first flush, so start every run from a fresh file
+        write_history(history, megabytes)
+        result = subprocess.run([sys.executable, "-c", CHILD, REPO], env=env, capture_output=True, text=True)
+        print(f"  run {run + 1}: {result.stdout.strip() or result.stderr.strip()}")
+
+
+if __name__ == '__main__':
+    main()
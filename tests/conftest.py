@@ -0,0 +1,33 @@
+import os
+import sys
+
+import pytest
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import Neo_Trm  # noqa: E402
+
+
+@pytest.fixture
+def engine(tmp_path):
+    # Headless engine over a fresh storage directory; output lines are collected in engine.lines
+    engine = Neo_Trm.TerminalEngine(str(tmp_path / "storage"))
+    engine.lines = []
+    engine.output = engine.lines.append
+    engine.confirm = lambda title, question: True
+    yield engine
+    engine.close()
+
+
+@pytest.fixture
+def make_file(tmp_path):
+    # Writes a source file outside the storage directory and returns its path
+    source_dir = tmp_path / "source"
+    source_dir.mkdir()
+
+    def make(name, content):
+        path = source_dir / name
+        path.write_bytes(content)
+        return str(path)
+    return make
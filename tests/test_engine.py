@@ -0,0 +1,472 @@
+import io
+import json
+import os
+import stat
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import Neo_Trm
+
+
+def upload(engine, folder, *paths):
+    engine.execute(f"add up {' '.join(paths)} in fold {folder}")
+    return engine.index.files(folder)
+
+
+# Deduplication
+
+def test_same_content_is_stored_once(engine, make_file):
+    path = make_file("photo.png", b"pixels" * 1000)
+    (_, name_a, _), = upload(engine, "a", path)
+    (_, name_b, _), = upload(engine, "b", path)
+    digest = engine.store.hash_file(path)
+    blobs = [name for _, _, names in os.walk(engine.store.root) for name in names if name == digest]
+    assert blobs == [digest]
+    assert engine.index.find_by_hash(digest, "a") == name_a
+    assert engine.index.find_by_hash(digest, "b") == name_b
+
+
+def test_duplicate_in_the_same_folder_is_skipped(engine, make_file):
+    path = make_file("photo.png", b"pixels")
+    upload(engine, "a", path)
+    assert len(upload(engine, "a", path)) == 1
+    assert any("Skipped 'photo.png'" in line for line in engine.lines)
+
+
+def test_blobs_are_read_only(engine, make_file):
+    path = make_file("photo.png", b"pixels")
+    upload(engine, "a", path)
+    blob = engine.store.blob_path(engine.store.hash_file(path))
+    assert stat.S_IMODE(os.stat(blob).st_mode) == Neo_Trm.BlobStore.BLOB_MODE
+
+
+def test_blob_changed_through_an_entry_is_not_reused(engine, make_file):
+    path = make_file("notes.txt", b"original")
+    (_, name, _), = upload(engine, "a", path)
+    digest = engine.store.hash_file(path)
+    os.chmod(engine.layout.path("a", name), 0o644)
+    with open(engine.layout.path("a", name), "ab") as f:
+        f.write(b" edited")  # Through a hardlink this would also change the blob
+    (_, copy, _), = upload(engine, "b", path)
+    with open(engine.layout.path("b", copy), "rb") as f:
+        assert f.read() == b"original"
+    with open(engine.store.blob_path(digest), "rb") as f:
+        assert f.read() == b"original"
+
+
+def test_blob_is_collected_with_its_last_entry(engine, make_file):
+    path = make_file("photo.png", b"pixels")
+    (_, name_a, _), = upload(engine, "a", path)
+    (_, name_b, _), = upload(engine, "b", path)
+    blob = engine.store.blob_path(engine.store.hash_file(path))
+    engine.execute(f"del {name_a} in fold a")
+    assert os.path.exists(blob)
+    engine.execute(f"del {name_b} in fold b")
+    assert not os.path.exists(blob)
+
+
+def test_move_over_an_entry_outside_the_app_releases_its_blob(engine, make_file):
+    path = make_file("replaced.png", b"replaced")
+    upload(engine, "a", make_file("kept.png", b"kept"), path)
+    kept = engine.search_index.search("kept.png")[0][0][2]
+    replaced = engine.search_index.search("replaced.png")[0][0][2]
+    blob = engine.store.blob_path(engine.store.hash_file(path))
+    os.replace(engine.layout.path("a", kept), engine.layout.path("a", replaced))
+    engine.apply_fs_events([("moved", "a", kept, "a", replaced)])
+    assert [name for _, name, _ in engine.index.files("a")] == [replaced]
+    assert not os.path.exists(blob)
+
+
+# Pattern moves and deletes
+
+def test_pattern_move_moves_only_matches(engine, make_file):
+    paths = [make_file(f"doc{i}.txt", f"text {i}".encode()) for i in range(5)]
+    paths.append(make_file("picture.png", b"image"))
+    upload(engine, "a", *paths)
+    engine.execute("move *.txt to b in fold a")
+    assert [os.path.splitext(name)[1] for _, name, _ in engine.index.files("a")] == [".png"]
+    moved = engine.index.files("b")
+    assert len(moved) == 5
+    assert all(os.path.exists(engine.layout.path("b", name)) for _, name, _ in moved)
+
+
+def test_pattern_delete_releases_blobs(engine, make_file):
+    paths = [make_file(f"tmp{i}.tmp", f"scratch {i}".encode()) for i in range(4)]
+    keep = make_file("keep.txt", b"keep")
+    upload(engine, "a", *paths, keep)
+    digests = [engine.store.hash_file(path) for path in paths]
+    engine.execute("del *.tmp in fold a")
+    assert [name.endswith(".txt") for _, name, _ in engine.index.files("a")] == [True]
+    assert not any(os.path.exists(engine.store.blob_path(digest)) for digest in digests)
+
+
+def test_pattern_delete_needs_confirmation(engine, make_file):
+    upload(engine, "a", make_file("x.tmp", b"x"))
+    engine.confirm = lambda title, question: False
+    engine.execute("del *.tmp in fold a")
+    assert len(engine.index.files("a")) == 1
+
+
+def test_existing_name_with_pattern_characters_is_not_a_pattern(engine):
+    engine.execute("new fold a")
+    engine.execute("new fold b")
+    for name in ("report[1].txt", "report1.txt", "draft*.txt", "draft2.txt"):
+        with open(os.path.join(engine.layout.folder_path("a"), name), "w") as f:
+            f.write(name)
+        engine.apply_fs_events([("changed", "a", name)])
+    engine.confirm = lambda title, question: False  # A pattern would ask first
+    engine.execute("del report[1].txt in fold a")
+    engine.execute("move draft*.txt to b in fold a")
+    assert [name for _, name, _ in engine.index.files("a")] == ["draft2.txt", "report1.txt"]
+    assert [name for _, name, _ in engine.index.files("b")] == ["draft*.txt"]
+
+
+# Folders and sharding
+
+def test_folder_is_spread_into_shards_past_the_threshold(engine, make_file):
+    engine.layout.shard_threshold = 3
+    paths = [make_file(f"file{i}.bin", os.urandom(64)) for i in range(6)]
+    files = upload(engine, "a", *paths)
+    assert len(files) == 6
+    assert "a" in engine.layout.sharded
+    assert engine.layout.flat_files("a") == []
+    for _, name, _ in files:
+        path = engine.layout.path("a", name)
+        assert os.path.basename(os.path.dirname(path)) == Neo_Trm.FolderLayout.shard(name)
+        assert os.path.exists(path)
+    # Later uploads go straight to their shard
+    upload(engine, "a", make_file("late.bin", b"late"))
+    assert engine.layout.flat_files("a") == []
+    assert len(engine.index.files("a")) == 7
+
+
+def test_nested_folders_create_their_parents(engine):
+    engine.execute("new fold photos/2024")
+    assert {"photos", "photos/2024"} <= set(engine.folders)
+    assert os.path.isdir(engine.layout.folder_path("photos/2024"))
+
+
+def test_top_level_names_in_use_are_reserved(engine):
+    for name in ("history.log", "folders.json", "plugins"):
+        engine.execute(f"new fold {name}")
+        assert name not in engine.folders
+    assert all(line.startswith("Error") for line in engine.lines)
+
+
+def test_chart_top_needs_a_positive_count(engine, make_file):
+    upload(engine, "a", *[make_file(f"f{i}.bin", b"x" * (i + 1)) for i in range(3)])
+    engine.lines.clear()
+    engine.execute("filer chart top 0")
+    assert not any("f0.bin" in line or "f2.bin" in line for line in engine.lines)
+    assert any("filer chart" in line for line in engine.lines)
+    assert engine.storage_stats.largest(0, ["a"]) == []
+    assert len(engine.storage_stats.largest(2, ["a"])) == 2
+
+
+def test_stats_needs_a_positive_count(engine):
+    for command in ("help", "list", "stats 1"):
+        engine.execute(command)
+    assert engine.lines[-1].startswith("Last 1 of 2 command(s):")
+    engine.execute("stats 0")
+    assert "Last" not in engine.lines[-1]
+    assert "stats [<N>]" in engine.lines[-1]
+
+
+# Batch runner
+
+def run_batch(engine, lines, parallel=1, json_lines=False):
+    stream = io.StringIO()
+    status = Neo_Trm.BatchRunner(engine, parallel, json_lines, stream).run(lines)
+    return status, stream.getvalue()
+
+
+def test_parallel_batch_keeps_script_order(engine, make_file):
+    commands = []
+    for i, folder in enumerate("abcd" * 3):
+        commands.append(f"add up {make_file(f'f{i}.bin', os.urandom(2048))} in fold {folder}")
+    commands += ["list", "jobs"]
+    status, output = run_batch(engine, commands, parallel=4, json_lines=True)
+    records = [json.loads(line) for line in output.splitlines()]
+    assert status == 0
+    assert [record["line"] for record in records] == list(range(1, len(commands) + 1))
+    assert all(record["ok"] for record in records)
+    assert sum(engine.index.totals[folder][0] for folder in "abcd") == 12
+
+
+def test_batch_reports_job_errors(engine, make_file, monkeypatch):
+    def fail(*args, **kwargs):
+        raise OSError("disk on fire")
+    monkeypatch.setattr(engine.store, "hash_file", fail)
+    status, output = run_batch(engine, [f"add up {make_file('x.bin', b'x')} in fold a"], json_lines=True)
+    record = json.loads(output)
+    assert status == 1
+    assert not record["ok"]
+    assert any(line.startswith("[#") and "Error uploading" in line for line in record["output"])
+
+
+def test_batch_finishes_commands_that_raise(engine, monkeypatch):
+    execute = engine.execute
+
+    def flaky(command):
+        if command == "list":
+            raise RuntimeError("boom")
+        return execute(command)
+    monkeypatch.setattr(engine, "execute", flaky)
+    status, output = run_batch(engine, ["help", "list", "stats"], parallel=2)
+    assert status == 1
+    assert output.index("> list") < output.index("Error: boom") < output.index("> stats")
+
+
+def test_plugin_errors_go_to_stderr_and_fail_the_script(tmp_path, monkeypatch, capsys):
+    storage = tmp_path / "storage"
+    (storage / "plugins").mkdir(parents=True)
+    (storage / "plugins" / "broken.py").write_text("raise ImportError('missing dependency')\n")
+    script = tmp_path / "script.txt"
+    script.write_text("help\n")
+    monkeypatch.setenv("NEO_TERMINAL_PASSWORD", Neo_Trm.PASSWORD)
+    status = Neo_Trm.main([str(script), "--json", "--storage", str(storage)])
+    out, err = capsys.readouterr()
+    assert status == 1
+    assert "Error loading plugin broken.py" in err
+    assert [json.loads(line)["ok"] for line in out.splitlines()] == [True]
+
+
+# HTTP cache
+
+class FakeResponse:
+    def __init__(self, status_code, headers, body):
+        self.status_code = status_code
+        self.headers = headers
+        self.body = body
+
+    def iter_content(self, chunk_size):
+        for start in range(0, len(self.body), chunk_size):
+            yield self.body[start:start + chunk_size]
+
+    def close(self):
+        pass
+
+
+class FakeSession:
+    # Serves each URL's responses in turn and records the headers of every request
+    def __init__(self, **responses):
+        self.responses = {f"https://example.com/{name}": list(queue) for name, queue in responses.items()}
+        self.requests = []
+
+    def get(self, url, headers=None, stream=False, timeout=None):
+        self.requests.append((url, headers))
+        return FakeResponse(*self.responses[url].pop(0))
+
+
+def test_cache_serves_fresh_entries_without_a_request(tmp_path):
+    cache = Neo_Trm.HttpCache(str(tmp_path))
+    session = FakeSession(page=[(200, {"Cache-Control": "max-age=60"}, b"<html>")])
+    for _ in range(2):
+        with cache.get(session, "https://example.com/page") as response:
+            assert response.content == b"<html>"
+    assert len(session.requests) == 1
+    assert cache.summary()[2]["hits"] == 1
+
+
+def test_cache_revalidates_no_cache_entries_with_a_304(tmp_path):
+    cache = Neo_Trm.HttpCache(str(tmp_path))
+    session = FakeSession(page=[(200, {"Cache-Control": "no-cache", "ETag": '"v1"'}, b"<html>"),
+                                (304, {"ETag": '"v1"'}, b"")])
+    for _ in range(2):
+        with cache.get(session, "https://example.com/page") as response:
+            assert response.content == b"<html>"
+    assert session.requests[1][1] == {"If-None-Match": '"v1"'}
+    assert cache.summary()[2]["revalidated"] == 1
+
+
+def test_cache_does_not_store_no_store_responses(tmp_path):
+    cache = Neo_Trm.HttpCache(str(tmp_path))
+    session = FakeSession(page=[(200, {"Cache-Control": "no-store", "ETag": '"v1"'}, b"<html>")] * 2)
+    for _ in range(2):
+        with cache.get(session, "https://example.com/page") as response:
+            assert response.content == b"<html>"
+    assert session.requests[1][1] == {}
+    assert cache.summary()[:2] == (0, 0)
+
+
+def test_cache_evicts_the_least_recently_used_entry(tmp_path, monkeypatch):
+    clock = iter(range(1000, 2000))
+    monkeypatch.setattr(Neo_Trm.time, "time", lambda: next(clock))
+    cache = Neo_Trm.HttpCache(str(tmp_path), max_bytes=10)
+    fresh = {"Cache-Control": "max-age=3600"}
+    session = FakeSession(a=[(200, fresh, b"aaaa")], b=[(200, fresh, b"bbbb")], c=[(200, fresh, b"cccc")])
+    for name in "aba":  # The second a is a hit, which makes b the least recently used
+        with cache.get(session, f"https://example.com/{name}") as response:
+            response.content
+    with cache.get(session, "https://example.com/c") as response:
+        response.content
+    assert cache.summary()[:2] == (2, 8)
+    assert not os.path.exists(cache.body_path("https://example.com/b"))
+    with cache.get(session, "https://example.com/a") as response:
+        assert response.content == b"aaaa"
+    assert [url for url, _ in session.requests] == [f"https://example.com/{name}" for name in "abc"]
+
+
+# Copying and watching
+
+def test_stream_copy_falls_back_when_copy_file_range_copies_nothing(tmp_path, monkeypatch):
+    source, target = tmp_path / "source", tmp_path / "target"
+    source.write_bytes(os.urandom(100000))
+    monkeypatch.setattr(os, "copy_file_range", lambda *args: 0, raising=False)
+    assert Neo_Trm.stream_copy(str(source), str(target))
+    assert target.read_bytes() == source.read_bytes()
+
+
+def test_move_split_across_reads_stays_a_move(tmp_path):
+    watcher = Neo_Trm.FolderWatcher(Neo_Trm.FolderLayout(str(tmp_path)), lambda events: None)
+    watcher.watches = {1: "a", 2: "b"}
+
+    def event(wd, mask, cookie, name):
+        data = name.encode() + b"\0" * 4
+        return Neo_Trm.FolderWatcher.EVENT_HEADER.pack(wd, mask, cookie, len(data)) + data
+    assert watcher.parse_events(event(1, watcher.IN_MOVED_FROM, 7, "x.png")) == []
+    assert watcher.parse_events(event(2, watcher.IN_MOVED_TO, 7, "y.png")) == [("moved", "a", "x.png", "b", "y.png")]
+
+
+def test_network_helpers_are_created_once_across_threads(engine):
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        sessions = set(map(id, executor.map(lambda _: engine.http_session(), range(32))))
+        caches = set(map(id, executor.map(lambda _: engine.response_cache(), range(32))))
+    assert len(sessions) == len(caches) == 1
+
+
+def test_new_folder_is_a_barrier_for_later_commands(engine, make_file, monkeypatch):
+    add = engine.layout.add
+
+    def slow_add(folder):
+        time.sleep(0.2)
+        return add(folder)
+    monkeypatch.setattr(engine.layout, "add", slow_add)
+    status, output = run_batch(engine, ["new fold x", f"add up {make_file('f.bin', b'f')} in fold x", "list"],
+                               parallel=4, json_lines=True)
+    assert status == 0
+    assert len(engine.index.files("x")) == 1
+    assert any(line.startswith("Files in x") for line in json.loads(output.splitlines()[2])["output"])
+
+
+def test_new_folder_is_watched_without_a_restart(tmp_path):
+    events = []
+    engine = Neo_Trm.TerminalEngine(str(tmp_path / "storage"), watch_callback=events.extend)
+    engine.output = lambda text: None
+    try:
+        watcher = engine.watcher
+        started = time.perf_counter()
+        engine.execute("new fold photos/2024")
+        assert time.perf_counter() - started < 0.2
+        assert engine.watcher is watcher
+        time.sleep(0.1)  # Let the watcher finish setting up before writing
+        with open(os.path.join(engine.layout.folder_path("photos/2024"), "x.png"), "wb") as f:
+            f.write(b"x")
+        deadline = time.monotonic() + (5 if watcher.mode == "scandir" else 2)
+        while ("changed", "photos/2024", "x.png") not in events and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert ("changed", "photos/2024", "x.png") in events
+    finally:
+        engine.close()
+
+
+# Filename search
+
+def search_index(*names):
+    rows = [("a", name, 100 * i, 1700000000 + i, original) for i, (name, original) in enumerate(names)]
+    return Neo_Trm.FilenameSearchIndex(lambda: rows)
+
+
+def test_search_ranks_exact_before_prefix_before_substring():
+    index = search_index(("old_report.pdf", None), ("report_2024.pdf", None), ("report", None))
+    matches, total = index.search("Report")
+    assert [(kind, name) for kind, _, name, *_ in matches] == [
+        ("exact", "report"), ("prefix", "report_2024.pdf"), ("substring", "old_report.pdf")]
+    assert total == 3
+
+
+def test_search_falls_back_to_fuzzy_matches_behind_common_trigrams():
+    index = search_index(*[(f"invoice_{i}.pdf", None) for i in range(50)], ("holiday.png", None))
+    matches, total = index.search("invoce")
+    assert total == 50
+    assert {kind for kind, *_ in matches} == {"fuzzy"}
+    assert matches[0][2] == "invoice_0.pdf"
+
+
+def test_search_finds_stored_names_by_uuid_and_glob():
+    stored = "image_0f8fad5b-d9cb-469f-a165-70867728950e.png"
+    index = search_index((stored, "cat.png"), ("notes.txt", None), ("scan_123.pdf", None))
+    assert index.search(stored)[0][0][0] == "exact"
+    assert index.search("0f8fad5b")[0][0][:3] == ("prefix", "a", stored)
+    assert [name for _, _, name, *_ in index.search("image_*")[0]] == [stored]
+    assert [name for _, _, name, *_ in index.search("*.png")[0]] == [stored]
+    assert [name for _, _, name, *_ in index.search("*_123.*")[0]] == ["scan_123.pdf"]
+
+
+def test_search_applies_filters_and_counts_every_match():
+    index = search_index(*[(f"file{i}.{'pdf' if i % 2 else 'txt'}", None) for i in range(40)])
+    matches, total = index.search("", {"ext": "pdf", "min_size": 1000, "before": 1700000031}, limit=5)
+    assert total == 10  # The odd ones from file11.pdf to file29.pdf
+    assert [name for _, _, name, *_ in matches] == ["file11.pdf", "file13.pdf", "file15.pdf", "file17.pdf",
+                                                    "file19.pdf"]
+    index.apply(("remove", "a", "file13.pdf"))
+    assert index.search("file1", {"ext": "pdf"}, limit=5)[1] == 5
+
+
+def test_parse_search_splits_filters_from_the_text(engine):
+    engine.execute("new fold docs")
+    term, filters = engine.parse_search("annual report size>1.5MB size<2gb ext:.PDF after:2024-01-01 in:docs")
+    assert term == "annual report"
+    assert filters == {"min_size": int(1.5 * 1024 ** 2), "max_size": 2 * 1024 ** 3, "ext": "pdf",
+                       "after": time.mktime((2024, 1, 1, 0, 0, 0, 0, 0, -1)), "folder": "docs"}
+    with pytest.raises(ValueError):
+        engine.parse_search("report in:missing")
+
+
+class PageResponse:
+    # Streamed page whose reads are logged; entry is set like a CachedResponse that is being cached
+    status_code = 200
+    headers = {"Content-Type": "text/html"}
+
+    def __init__(self, log, entry):
+        self.log = log
+        self.entry = entry
+
+    def iter_content(self, chunk_size):
+        yield b"<html><body>" + b"".join(b"<img src='/%d.png'>" % i for i in range(3))
+        for i in range(3):
+            self.log.append(f"read {i}")
+            yield b"<p>filler</p>" * 100
+        self.log.append("read to the end")
+
+    def close(self):
+        self.log.append("closed")
+
+
+def test_image_download_reads_a_cached_page_to_the_end_after_reporting(monkeypatch):
+    for entry, reads in ((("etag", None, None), ["read 0", "read 1", "read 2", "read to the end"]), (None, [])):
+        log = []
+        job = Neo_Trm.ImageDownloadJob(1, "https://example.com/", "a", None, 1, 2, log.append, None)
+        monkeypatch.setattr(job, "fetch", lambda url: PageResponse(log, entry))
+        monkeypatch.setattr(job, "fetch_image", lambda url: ("image_x.png", False))
+        job.run()
+        assert log[0].startswith("[#1] Downloaded")
+        assert log[1:-2] == reads
+        assert log[-2] == "closed" and log[-1].startswith("[#1] Completed")
+
+
+def test_crawl_stops_queueing_pages_at_the_limit(tmp_path, monkeypatch):
+    lines, fetched = [], []
+    job = Neo_Trm.CrawlJob(1, "https://example.com/", "a", None, 10, 2, lines.append, None, 1, None,
+                           5, str(tmp_path), None, 3)
+
+    def fetch_page(url):
+        fetched.append(url)
+        return [], [f"{url}p{i}" for i in range(10)]
+    monkeypatch.setattr(job, "fetch_page", fetch_page)
+    job.run()
+    assert len(fetched) == 3
+    assert sum("limit of 3 pages" in line for line in lines) == 1
+    assert "from 3 pages" in lines[-1]